@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import numpy as np
 import pandas as pd
+import xarray as xr
 from scipy.interpolate import griddata
 from scipy import interpolate
-import os, re, glob
-from typing import TYPE_CHECKING, Tuple, List, Union
+import os, re, glob, json, time, shutil, hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from typing import TYPE_CHECKING, Tuple, List, Union, Callable, Iterable, Iterator
 from . import file_module
+from . import msg
 if TYPE_CHECKING:
     from .grd.grd_mod import Grid
     from .bnd.bnd_mod import Boundary
@@ -34,11 +38,23 @@ def min_distance(lon, lat, lon_vec , lat_vec) -> Tuple[float, int]:
     Also returns index of the found minimum.
     """
 
-    dx = []
-    for n, __ in enumerate(lat_vec):
-        dx.append(distance_2points(lat, lon, lat_vec[n], lon_vec[n]))
+    dx = distance_2points(lat, lon, np.asarray(lat_vec), np.asarray(lon_vec))
 
-    return np.array(dx).min(), np.array(dx).argmin()
+    return dx.min(), dx.argmin()
+
+def lon_lat_to_unit_sphere(lon, lat) -> np.ndarray:
+    """Converts longitudes and latitudes to cartesian coordinates on the unit
+    sphere.
+
+    Returns an array of shape (len(lon), 3). Euclidian nearest neighbours on
+    the unit sphere are also the nearest neighbours in great circle distance.
+    """
+
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat = np.radians(np.asarray(lat, dtype=float))
+    return np.column_stack((np.cos(lat)*np.cos(lon),
+                            np.cos(lat)*np.sin(lon),
+                            np.sin(lat)))
 
 def lon_in_km(lat: float) -> float:
     """Converts one longitude degree to km for a given latitude."""
@@ -70,6 +86,60 @@ def force_to_xyz(data: np.ndarray, lon: np.ndarray, lat: np.ndarray) -> Tuple[np
 
     return z, x, y
 
+def xyz_to_matrix(data: np.ndarray, lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """If the xyz data cover a rectilinear grid, convert them to a matrix
+    (lat, lon) with sorted lon, lat vectors.
+
+    Returns None, None, None if the data are not rectilinear. Does nothing if
+    the data is already in a matrix.
+    """
+    if len(data.shape) > 1:
+        return data, lon, lat
+
+    x, ix = np.unique(lon, return_inverse=True)
+    y, iy = np.unique(lat, return_inverse=True)
+    if len(x)*len(y) != len(data):
+        return None, None, None
+
+    # Every grid point needs to be given exactly once
+    flat_inds = iy*len(x) + ix
+    if np.any(np.bincount(flat_inds, minlength=len(data)) != 1):
+        return None, None, None
+
+    z = np.empty(len(data), dtype=data.dtype)
+    z[flat_inds] = data
+    return z.reshape(len(y), len(x)), x, y
+
+def point_list(lon: np.ndarray, lat: np.ndarray, mask: np.ndarray=None) -> np.ndarray:
+    """Lon, lat list (N, 2) of the points in a (lat, lon) mask.
+
+    The coordinates are picked from the 1D vectors by index, so memory scales
+    with the number of selected points and not with the size of the grid.
+    All points are given if mask is None.
+    """
+    if mask is None:
+        inds = np.arange(len(lon)*len(lat))
+    else:
+        inds = np.flatnonzero(mask)
+    ilat, ilon = np.divmod(inds, len(lon))
+    return np.column_stack((lon[ilon], lat[ilat]))
+
+def iterate_point_list(lon: np.ndarray, lat: np.ndarray, mask: np.ndarray=None, chunksize: int=100000) -> Iterable[np.ndarray]:
+    """Like point_list, but yields the points in blocks of at most chunksize
+    points. Only one block of the grid is considered at a time."""
+    npoints = len(lon)*len(lat)
+    flat_mask = None if mask is None else np.ravel(mask)
+    for start in range(0, npoints, chunksize):
+        stop = min(start + chunksize, npoints)
+        if flat_mask is None:
+            inds = np.arange(start, stop)
+        else:
+            inds = start + np.flatnonzero(flat_mask[start:stop])
+        if inds.size == 0:
+            continue
+        ilat, ilon = np.divmod(inds, len(lon))
+        yield np.column_stack((lon[ilon], lat[ilat]))
+
 def set_spacing_dlon_dlat_fixed_edges(dlon: float, dlat:float, lon: Tuple[float, float], lat: Tuple[float, float]) -> Tuple[float, float, float, float, np.ndarray, np.ndarray]:
     """Given dlon, dlat and lon,lat edges, set other spacing varialbles.
 
@@ -329,6 +399,133 @@ def expand_area(lon_min: float, lon_max:float , lat_min:float , lat_max:float, e
 
 
 
+def map_concurrently(function: Callable, *iterables: Iterable, max_workers: int=1, processes: bool=False) -> list:
+    """Applies the function to the elements of the iterables (as map does)
+    and returns the results in the same order as the elements.
+
+    A pool of max_workers threads is used if max_workers > 1. Set
+    processes=True to use a pool of processes instead, e.g. when the function
+    uses netCDF4/HDF5, which is not thread safe. The function, arguments and
+    results then need to be picklable.
+    """
+    if max_workers is None or max_workers < 2:
+        return list(map(function, *iterables))
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    with executor:
+        return list(executor.map(function, *iterables))
+
+def iterate_concurrently(function: Callable, *iterables: Iterable, max_workers: int=1, processes: bool=False) -> Iterator:
+    """Same as map_concurrently, but yields the results one by one in order.
+
+    At most max_workers elements are submitted ahead of the result that is
+    being waited for, so the caller can handle (and drop) each result while
+    the next ones are being processed.
+    """
+    if max_workers is None or max_workers < 2:
+        yield from map(function, *iterables)
+        return
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    with executor:
+        futures = deque()
+        for args in zip(*iterables):
+            futures.append(executor.submit(function, *args))
+            if len(futures) >= max_workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+def plan_index_reads(inds: np.ndarray, max_gap: int=0) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """Plans reading scattered indices as a few contiguous blocks.
+
+    The sorted unique indices are grouped into contiguous runs. Two runs are
+    read as one block if fewer than max_gap unwanted indices lie between them,
+    i.e. max_gap is the number of extra points that cost less to read than
+    making a separate request. max_gap=0 reads every run separately and a
+    large max_gap reads one bounding block.
+
+    Returns the blocks as (start, stop) tuples and the positions of the
+    original indices (in their original order, duplicates allowed) in the
+    concatenation of the blocks.
+    """
+    inds = np.asarray(inds, dtype=int)
+    if inds.size == 0:
+        return [], np.array([], dtype=int)
+    unique_inds = np.unique(inds)
+
+    # Start a new block where the gap to the previous index is too large
+    gaps = np.diff(unique_inds) - 1
+    new_block = np.flatnonzero(gaps > max_gap) + 1
+    starts = unique_inds[np.concatenate(([0], new_block))]
+    stops = unique_inds[np.concatenate((new_block - 1, [len(unique_inds) - 1]))] + 1
+    blocks = list(zip(starts.tolist(), stops.tolist()))
+
+    # Position of the first element of each block in the concatenated blocks
+    offsets = np.concatenate(([0], np.cumsum(stops - starts)[:-1]))
+    block_of_ind = np.searchsorted(starts, inds, side='right') - 1
+    positions = offsets[block_of_ind] + inds - starts[block_of_ind]
+
+    return blocks, positions
+
+def month_periods(start_time, end_time) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Splits a period into whole calendar months.
+
+    Returns the first and last day of every month that overlaps the period.
+    """
+    months = pd.period_range(pd.Timestamp(start_time).to_period('M'), pd.Timestamp(end_time).to_period('M'), freq='M')
+    return [(month.start_time.normalize(), month.end_time.normalize()) for month in months]
+
+def cds_request_file(folder: str, dataset: str, request: dict) -> str:
+    """Name of the cached file of a CDS request.
+
+    The name contains a hash of the dataset and the request, so that an
+    identical request always maps to the same file.
+    """
+    request_hash = hashlib.sha1(json.dumps({'dataset': dataset, 'request': request}, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f'{folder}/{dataset}_{request_hash}.nc'
+
+def download_from_cds(dataset: str, requests: List[dict], folder: str, client=None, max_workers: int=1) -> List[str]:
+    """Retrieves a list of requests from the Copernicus Climate Data Store.
+
+    Every request is stored in its own file named by a hash of the request
+    (see cds_request_file). Requests that have already been downloaded to the
+    folder are not retrieved again. The requests are retrieved in max_workers
+    threads.
+
+    client is anything with a retrieve(dataset, request, target) method, by
+    default a cdsapi.Client. Returns the filenames in the order of the
+    requests.
+    """
+    check_if_folder(folder, create=True)
+    filenames = [cds_request_file(folder, dataset, request) for request in requests]
+    missing = [(request, filename) for request, filename in zip(requests, filenames) if not os.path.isfile(filename)]
+
+    if len(missing) < len(requests):
+        msg.plain(f"Using {len(requests)-len(missing)} of {len(requests)} requests from earlier downloads in {folder}")
+
+    if missing and client is None:
+        import cdsapi
+        client = cdsapi.Client()
+
+    def retrieve(request: dict, filename: str) -> None:
+        # Download to a temporary file so that an interrupted download is not taken as cached
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        client.retrieve(dataset, request, tmp_filename)
+        os.replace(tmp_filename, filename)
+
+    map_concurrently(retrieve, [m[0] for m in missing], [m[1] for m in missing], max_workers=max_workers)
+
+    return filenames
+
 def check_if_folder(folder: str, create: bool=True) -> bool:
     """Creates a folder if it does not exist, and returns True if it
     already existed."""
@@ -397,6 +594,20 @@ def interp_spec(f, D, S, fi, Di):
     Si = Finterpolator(fi,Di)
 
     return Si
+
+def direction_interpolation_weights(D, Di) -> np.ndarray:
+    """Weights for periodic linear interpolation of spectra from directions D
+    to directions Di.
+
+    Returns a matrix of shape (len(D), len(Di)), so that a spectrum (or any
+    array with directions as the last dimension) is interpolated by
+    S @ weights. The weights only depend on the directional vectors, so they
+    can be applied to all spectra at once.
+    """
+    unit_vectors = np.eye(len(D))
+    weights = np.array([np.interp(Di, D, e, period=360) for e in unit_vectors])
+
+    return weights
 # -----------------------------------------------------------------------------
 
 def flip_spec(spec, D):
@@ -411,7 +622,6 @@ def flip_spec(spec, D):
         spec = np.array([spec])
     else:
         flipping_dir = False
-    spec_flip = np.zeros(spec.shape)
 
     ind = np.arange(0,len(D), dtype='int')
     #dD = np.diff(D).mean()
@@ -441,7 +651,6 @@ def shift_spec(spec, D, shift=0):
         spec = np.array([spec])
     else:
         shifting_dir = False
-    spec_shift = np.zeros(spec.shape)
 
     ind = np.arange(0,len(D), dtype='int')
     dD = 360/len(D)
@@ -457,8 +666,73 @@ def shift_spec(spec, D, shift=0):
 
     return spec_shift
 
+def integrate_directions(efth: np.ndarray, dirs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Integrates directional spectra [..., freq, dirs] over the directions.
+
+    The omnidirectional spectrum and the cos/sin weighted sums needed for the
+    mean direction and the directional spreading are calculated with one
+    matrix product, without any full size temporary arrays.
 
-def setup_cache(obj_type: str, reader_name: str, cache_name: str, grid):
+    Returns ef, mdir [deg] and spr [deg], all with shape [..., freq] and
+    the same float type as efth. As when summing with xarray, NaN's are
+    skipped in the sum over the directions.
+    """
+    efth = np.asarray(efth)
+    dtype = efth.dtype if np.issubdtype(efth.dtype, np.floating) else float
+    nan_mask = np.isnan(efth)
+    if nan_mask.any():
+        efth = np.where(nan_mask, 0, efth)
+
+    theta = np.deg2rad(dirs)
+    dD = 360/len(dirs)
+    # Normalizing here so that integration over direction becomes summing
+    weights = dD*np.pi/180*np.column_stack((np.ones(len(theta)), np.sin(theta), np.cos(theta)))
+    integrated = efth @ weights.astype(dtype)
+    ef = integrated[..., 0]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b1 = integrated[..., 1]/ef
+        a1 = integrated[..., 2]/ef
+    thetam = np.arctan2(b1,a1)
+    m1 = np.sqrt(b1**2+a1**2)
+    spr = np.sqrt(2-2*(m1))*180/np.pi
+    mdir = np.mod(thetam*180/np.pi, 360)
+
+    return ef, mdir, spr
+
+def permute_dirs_inplace(spec: np.ndarray, perm: np.ndarray) -> np.ndarray:
+    """Reorders the last (directional) axis of spec in place so that the
+    result equals spec[..., perm].
+
+    The permutation is followed cycle by cycle, so only one directional slice
+    is kept in a temporary array.
+    """
+    perm = np.asarray(perm, dtype=int)
+    done = np.zeros(len(perm), dtype=bool)
+    for start in range(len(perm)):
+        if done[start] or perm[start] == start:
+            done[start] = True
+            continue
+        tmp = spec[..., start].copy()
+        k = start
+        while perm[k] != start:
+            spec[..., k] = spec[..., perm[k]]
+            done[k] = True
+            k = perm[k]
+        spec[..., k] = tmp
+        done[k] = True
+
+    return spec
+
+
+def setup_cache(obj_type: str, reader_name: str, cache_name: str, grid, cache_format: str='nc'):
+    """Creates the cache folder and determines the name of the cache.
+
+    cache_format 'nc' uses monthly netcdf-files (cache_name_YYYY-MM.nc) and
+    'zarr' a single appendable zarr store (cache_name.zarr).
+    """
+    if cache_format not in ['nc', 'zarr']:
+        raise ValueError(f"cache_format must be 'nc' or 'zarr', not '{cache_format}'")
     main_folder = f'{obj_type}_cache'
     check_if_folder(main_folder)
     cache_folder = f'{main_folder}/{reader_name}'
@@ -468,43 +742,398 @@ def setup_cache(obj_type: str, reader_name: str, cache_name: str, grid):
                                                         'Lon1': f'{max(grid.lon()):.2f}',
                                                         'Lat0': f'{min(grid.lat()):.2f}',
                                                         'Lat1': f'{max(grid.lat()):.2f}'})
-    cache_empty = not glob.glob(f'{cache_folder}/{cache_name}*')
+    cache_empty = not cache_files(cache_folder, cache_name, cache_format)
+    if cache_empty:
+        # The cache has been deleted, so its old coverage is no longer valid
+        coverage = _read_coverage_file(cache_folder)
+        if coverage.get(cache_name, {}).pop(cache_format, None) is not None:
+            _write_coverage_file(cache_folder, coverage)
 
     return cache_folder, cache_name, cache_empty
 
+def append_to_zarr_cache(data: xr.Dataset, store: str, time_chunk: int=None) -> int:
+    """Writes the data to a zarr store and returns the number of time steps
+    written.
 
-def determine_patch_periods(times, start_time, end_time):
-    """Determines if there is some periods that we need to patch from thredds
-    adter reading cached data"""
+    If the store already exists, only the time steps not yet in the store are
+    appended. The data is chunked along time in blocks of time_chunk time
+    steps (default one day). Appending only completes the last (partial)
+    chunk and adds new ones, and the consolidated metadata that the readers
+    use is only updated after the new data have been written. Readers can
+    therefore use the store while data are being appended.
 
-    # This is not optimal, but seems to work
-    dt = times[1]-times[0]
-    wanted_times = pd.date_range(start=start_time, end=end_time, freq=dt)
-    wanted_times.isin(times)
+    The variables that don't depend on time (e.g. lon, lat, freq, dirs) have
+    to be the same as in the store.
+    """
+    for var in data.variables:
+        data[var].encoding = {}
+
+    if not os.path.isdir(store):
+        time_chunk = time_chunk or _steps_per_day(data.time.values)
+        data.chunk({'time': time_chunk}).to_zarr(store, mode='w', consolidated=True)
+        return len(data.time)
+
+    with xr.open_zarr(store, consolidated=True) as cached:
+        cached_times = cached.time.values
+        differing = [var for var in data.variables if 'time' not in data[var].dims
+                        and (var not in cached.variables or not np.array_equal(data[var].values, cached[var].values))]
+        time_chunk = [cached[var].encoding['chunks'][cached[var].dims.index('time')]
+                        for var in cached.data_vars if 'time' in cached[var].dims][0]
+    if differing:
+        raise ValueError(f"Can't append to {store}, since {differing} differ from the cached data!")
+
+    new_inds = np.flatnonzero(np.logical_not(np.isin(data.time.values, cached_times)))
+    if len(new_inds) > 0:
+        # The first dask chunk fills up the last chunk of the store
+        nt = len(new_inds)
+        first = min(nt, time_chunk - len(cached_times) % time_chunk)
+        chunks = (first,) + (time_chunk,)*((nt - first)//time_chunk)
+        if sum(chunks) < nt:
+            chunks += (nt - sum(chunks),)
+        data.isel(time=new_inds).chunk({'time': chunks}).to_zarr(store, append_dim='time', consolidated=True)
+    return len(new_inds)
+
+def _steps_per_day(times) -> int:
+    """Number of time steps in a day (at least 1)."""
+    if len(times) < 2:
+        return 1
+    dt = pd.Timedelta(np.median(np.diff(times)))
+    return max(1, int(pd.Timedelta(days=1)/dt))
+
+
+def cache_files(cache_folder: str, cache_name: str, cache_format: str='nc') -> List[str]:
+    """Lists the files (or the zarr store) of a cache."""
+    if cache_format == 'zarr':
+        return glob.glob(f'{cache_folder}/{cache_name}.zarr')
+    return sorted(glob.glob(f'{cache_folder}/{cache_name}_*.nc'))
+
+def _coverage_file(cache_folder: str) -> str:
+    return f'{cache_folder}/coverage.json'
+
+def _read_coverage_file(cache_folder: str) -> dict:
+    filename = _coverage_file(cache_folder)
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+def _write_coverage_file(cache_folder: str, coverage: dict) -> None:
+    """Writes the coverage file atomically."""
+    filename = _coverage_file(cache_folder)
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(coverage, f, indent=1)
+    os.replace(tmpfile, filename)
+
+def time_intervals(times, dt: pd.Timedelta=None) -> Tuple[List, pd.Timedelta]:
+    """Splits the time stamps into intervals [t0, t1] where the time step is
+    at most dt. The time step is determined from the times if not given."""
+    times = pd.to_datetime(np.sort(np.asarray(times)))
+    if len(times) == 0:
+        return [], dt
+    if dt is None:
+        dt = pd.Timedelta(np.median(np.diff(times.values))) if len(times) > 1 else pd.Timedelta(hours=1)
+
+    breaks = np.flatnonzero(np.diff(times.values) > dt)
+    starts = np.concatenate(([0], breaks+1))
+    ends = np.concatenate((breaks, [len(times)-1]))
+    return [[times[a], times[b]] for a, b in zip(starts, ends)], dt
+
+def merge_time_intervals(intervals: List, dt: pd.Timedelta) -> List:
+    """Merges overlapping intervals and intervals that are at most dt apart."""
+    merged = []
+    for t0, t1 in sorted(intervals):
+        if merged and t0 - merged[-1][1] <= dt:
+            merged[-1][1] = max(merged[-1][1], t1)
+        else:
+            merged.append([t0, t1])
+    return merged
+
+def remove_time_interval(intervals: List, dt: pd.Timedelta, start_time, end_time) -> List:
+    """Removes the time stamps between start_time and end_time from the
+    intervals, assuming a constant time step dt within every interval."""
+    start_time, end_time = pd.Timestamp(start_time), pd.Timestamp(end_time)
+    kept = []
+    for t0, t1 in intervals:
+        if t1 < start_time or t0 > end_time:
+            kept.append([t0, t1])
+            continue
+        if t0 < start_time:
+            kept.append([t0, t0 + ((start_time - t0 - pd.Timedelta(1, 'ns'))//dt)*dt])
+        if t1 > end_time:
+            kept.append([t0 + ((end_time - t0)//dt + 1)*dt, t1])
+    return kept
+
+def cache_coverage(cache_folder: str, cache_name: str, cache_format: str='nc') -> Tuple[List, pd.Timedelta]:
+    """Returns the cached time intervals and the time step of a cache.
+
+    The coverage is read from the coverage.json file of the cache folder. A
+    cache written before the coverage file existed is registered by reading
+    the time stamps of the cached data. Periods whose cache file (or zarr
+    store) no longer exists are removed from the coverage.
+    """
+    entry = _read_coverage_file(cache_folder).get(cache_name, {}).get(cache_format)
+    if entry is None:
+        files = cache_files(cache_folder, cache_name, cache_format)
+        if not files:
+            return [], None
+        if cache_format == 'zarr':
+            with xr.open_zarr(files[0], consolidated=True) as ds:
+                times = ds.time.values
+        else:
+            times = []
+            for f in files:
+                # Closing the files so that they can be replaced later
+                with xr.open_dataset(f) as ds:
+                    times.append(ds.time.values)
+            times = np.concatenate(times)
+        return update_cache_coverage(cache_folder, cache_name, times, cache_format)
+
+    intervals = [[pd.Timestamp(t0), pd.Timestamp(t1)] for t0, t1 in entry['intervals']]
+    dt = pd.Timedelta(entry['dt'])
+    return _drop_deleted_cache_files(cache_folder, cache_name, cache_format, intervals, dt), dt
+
+def _drop_deleted_cache_files(cache_folder: str, cache_name: str, cache_format: str,
+                            intervals: List, dt: pd.Timedelta) -> List:
+    """Removes the periods of cache files that have been deleted from the
+    intervals, and updates the coverage file if anything was removed."""
+    if not intervals:
+        return intervals
+
+    files = cache_files(cache_folder, cache_name, cache_format)
+    if cache_format == 'zarr':
+        deleted = [] if files else [(intervals[0][0], intervals[-1][1])]
+    else:
+        cached_months = [os.path.basename(f)[len(cache_name)+1:-3] for f in files]
+        deleted = [(t0, t1 + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns'))
+                    for t0, t1 in month_periods(intervals[0][0], intervals[-1][1])
+                    if t0.strftime('%Y-%m') not in cached_months]
 
-    if np.all(wanted_times.isin(times)):
-        return [], []
-    wt=wanted_times.isin(times)
+    if not deleted:
+        return intervals
 
-    was_found = ''.join([str((w*1)) for w in wt]) # string of '0001110111110000'
-    #was_found = '000011111111111100011111111111111111111111100011111111111111011111111111110000' # Testing
-    inds = list(range(len(was_found)))
-    was_found = re.sub('01', '0.1', was_found)
-    was_found = re.sub('10', '1.0', was_found)
+    for t0, t1 in deleted:
+        msg.warning(f"Cache file for {t0.strftime('%Y-%m-%d')} - {t1.strftime('%Y-%m-%d')} not found in {cache_folder}. Removing it from the coverage.")
+        intervals = remove_time_interval(intervals, dt, t0, t1)
 
-    list_of_blocks = was_found.split('.')
+    coverage = _read_coverage_file(cache_folder)
+    coverage[cache_name][cache_format]['intervals'] = [[t0.isoformat(), t1.isoformat()] for t0, t1 in intervals]
+    _write_coverage_file(cache_folder, coverage)
+    return intervals
 
-    patch_start = []
-    patch_end = []
-    for block in list_of_blocks:
-        if block[0] == '0': # These need to be patched
-            ind_subset = inds[0:len(block)]
-            patch_start.append(wanted_times[ind_subset[0]])
-            patch_end.append(wanted_times[ind_subset[-1]])
-        inds[0:len(block)] = []
+def update_cache_coverage(cache_folder: str, cache_name: str, times,
+                        cache_format: str='nc', replaced_periods: List=[]) -> Tuple[List, pd.Timedelta]:
+    """Adds the time stamps to the coverage of a cache.
+
+    Periods [t0, t1] given in replaced_periods were overwritten, and are
+    removed from the old coverage before the new times are added.
+    """
+    coverage = _read_coverage_file(cache_folder)
+    entry = coverage.get(cache_name, {}).get(cache_format)
+    old_dt = None if entry is None else pd.Timedelta(entry['dt'])
+
+    new_intervals, dt = time_intervals(times, old_dt)
+    if entry is None:
+        intervals = []
+    else:
+        intervals = [[pd.Timestamp(t0), pd.Timestamp(t1)] for t0, t1 in entry['intervals']]
+        for t0, t1 in replaced_periods:
+            intervals = remove_time_interval(intervals, dt, t0, t1)
+
+    intervals = merge_time_intervals(intervals + new_intervals, dt)
+    if dt is not None:
+        coverage.setdefault(cache_name, {})[cache_format] = {'dt': str(dt),
+            'intervals': [[t0.isoformat(), t1.isoformat()] for t0, t1 in intervals]}
+        _write_coverage_file(cache_folder, coverage)
+    return intervals, dt
+
+def missing_periods(intervals: List, dt: pd.Timedelta, start_time, end_time) -> Tuple[List, List]:
+    """Determines the periods between start_time and end_time that are not
+    covered by the cached intervals.
+
+    Returns lists of start and end times of the missing periods.
+    """
+    start_time, end_time = pd.Timestamp(start_time), pd.Timestamp(end_time)
+    patch_start, patch_end = [], []
+    t = start_time
+    for t0, t1 in merge_time_intervals(intervals, dt):
+        if t1 < t or t0 > end_time:
+            continue
+        if t0 - dt >= t:
+            patch_start.append(t)
+            patch_end.append(t0 - dt)
+        t = max(t, t1 + dt)
+    if t <= end_time:
+        patch_start.append(t)
+        patch_end.append(end_time)
 
     return patch_start, patch_end
 
+TOPO_CACHE_MAX_BYTES = 5*1024**3
+
+def setup_topo_cache(reader_name: str) -> str:
+    """Creates the cache folder for raw topography from a certain reader."""
+    check_if_folder('topo_cache')
+    cache_folder = f'topo_cache/{reader_name}'
+    check_if_folder(cache_folder)
+    return cache_folder
+
+def _topo_cache_entries(cache_folder: str) -> List[Tuple[str, dict]]:
+    entries = []
+    for meta_file in glob.glob(f'{cache_folder}/*/meta.json'):
+        with open(meta_file, 'r') as f:
+            entries.append((os.path.dirname(meta_file), json.load(f)))
+    return entries
+
+def _write_json(filename: str, content: dict) -> None:
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(content, f)
+    os.replace(tmpfile, filename)
+
+def read_topo_cache(cache_folder: str, reader_key: str, bbox: Tuple[float, float, float, float],
+                    expansion_factor: float=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reads cached raw topography for the area bbox (lon_min, lon_max,
+    lat_min, lat_max) read by the reader identified by reader_key.
+
+    An entry for the same area is used as such. If the expansion_factor of
+    the reader is known, an entry covering a larger area can also be used,
+    and is then cropped to the expanded area. The arrays are memory mapped,
+    so only the cropped part is read from disk.
+
+    Returns None, None, None if no suitable entry is found.
+    """
+    bbox = list(bbox)
+    if expansion_factor is not None:
+        area = expand_area(*bbox, expansion_factor)
+
+    for entry, meta in _topo_cache_entries(cache_folder):
+        if meta['key'] != reader_key:
+            continue
+
+        if np.allclose(meta['bbox'], bbox):
+            crop = None
+        elif expansion_factor is not None and meta['area'] is not None and \
+            meta['area'][0] <= area[0] and area[1] <= meta['area'][1] and \
+            meta['area'][2] <= area[2] and area[3] <= meta['area'][3]:
+            crop = area
+        else:
+            continue
+
+        topo = np.load(f'{entry}/topo.npy', mmap_mode='r')
+        lon = np.load(f'{entry}/lon.npy', mmap_mode='r')
+        lat = np.load(f'{entry}/lat.npy', mmap_mode='r')
+
+        if crop is not None:
+            lon0, lon1, lat0, lat1 = crop
+            lon_mask = np.logical_and(lon >= lon0, lon <= lon1)
+            lat_mask = np.logical_and(lat >= lat0, lat <= lat1)
+            if len(topo.shape) > 1:
+                # Coordinates are sorted, so the area is a block of the matrix
+                cols, rows = np.flatnonzero(lon_mask), np.flatnonzero(lat_mask)
+                cols = slice(cols[0], cols[-1]+1) if len(cols) else slice(0, 0)
+                rows = slice(rows[0], rows[-1]+1) if len(rows) else slice(0, 0)
+                topo, lon, lat = topo[rows, cols], lon[cols], lat[rows]
+            else:
+                mask = np.logical_and(lon_mask, lat_mask)
+                topo, lon, lat = topo[mask], lon[mask], lat[mask]
+
+        meta['last_access'] = time.time()
+        _write_json(f'{entry}/meta.json', meta)
+
+        return np.array(topo), np.array(lon), np.array(lat)
+
+    return None, None, None
+
+def write_topo_cache(cache_folder: str, reader_key: str, bbox: Tuple[float, float, float, float],
+                    topo: np.ndarray, lon: np.ndarray, lat: np.ndarray,
+                    expansion_factor: float=None, max_bytes: int=None) -> str:
+    """Writes raw topography to the cache as .npy-files and returns the folder
+    of the cache entry.
+
+    The least recently used entries are removed if the cache folder grows
+    larger than max_bytes (default TOPO_CACHE_MAX_BYTES).
+    """
+    bbox = [float(b) for b in bbox]
+    name = hashlib.sha1(repr((reader_key, np.round(bbox, 6).tolist())).encode()).hexdigest()[:20]
+    entry = f'{cache_folder}/{name}'
+    tmp_entry = f'{entry}.{os.getpid()}.tmp'
+    if os.path.isdir(tmp_entry):
+        shutil.rmtree(tmp_entry)
+    os.mkdir(tmp_entry)
+
+    size = 0
+    for var, values in [('topo', topo), ('lon', lon), ('lat', lat)]:
+        values = np.asarray(values)
+        np.save(f'{tmp_entry}/{var}.npy', values)
+        size += values.nbytes
+
+    area = None
+    if expansion_factor is not None:
+        area = list(expand_area(*bbox, expansion_factor))
+    meta = {'key': reader_key, 'bbox': bbox, 'area': area, 'bytes': size, 'last_access': time.time()}
+    _write_json(f'{tmp_entry}/meta.json', meta)
+
+    # Only replace a complete entry
+    if os.path.isdir(entry):
+        shutil.rmtree(entry)
+    os.replace(tmp_entry, entry)
+
+    evict_topo_cache(cache_folder, max_bytes, keep=entry)
+
+    return entry
+
+def evict_topo_cache(cache_folder: str, max_bytes: int=None, keep: str=None) -> None:
+    """Removes the least recently used entries until the cache is smaller
+    than max_bytes (default TOPO_CACHE_MAX_BYTES)."""
+    if max_bytes is None:
+        max_bytes = TOPO_CACHE_MAX_BYTES
+
+    entries = sorted(_topo_cache_entries(cache_folder), key=lambda e: e[1]['last_access'])
+    total = sum([meta['bytes'] for __, meta in entries])
+    for entry, meta in entries:
+        if total <= max_bytes:
+            break
+        if entry == keep:
+            continue
+        shutil.rmtree(entry)
+        total -= meta['bytes']
+
+def setup_coordinate_cache(reader_name: str) -> str:
+    """Creates the folder for the coordinate index of a certain reader."""
+    check_if_folder('coordinate_cache')
+    cache_folder = f'coordinate_cache/{reader_name}'
+    check_if_folder(cache_folder)
+    return cache_folder
+
+def coordinate_cache_key(layout: dict) -> str:
+    """Key of a coordinate index. The layout identifies the product and how
+    its files are organized, e.g. the url with the time stamp masked out."""
+    return hashlib.sha1(json.dumps(layout, sort_keys=True, default=str).encode()).hexdigest()
+
+def read_coordinate_cache(cache_folder: str, key: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reads lon, lat and the mask of valid points from the coordinate index.
+
+    Returns None, None, None if the index doesn't exist.
+    """
+    filename = f'{cache_folder}/{key}.npz'
+    if not os.path.isfile(filename):
+        return None, None, None
+    with np.load(filename) as data:
+        return data['lon'], data['lat'], data['mask']
+
+def write_coordinate_cache(cache_folder: str, key: str, lon: np.ndarray, lat: np.ndarray, mask: np.ndarray=None) -> str:
+    """Writes lon, lat and the mask of valid points to the coordinate index.
+    All points are valid if no mask is given."""
+    if mask is None:
+        mask = np.full(len(lon), True)
+    filename = f'{cache_folder}/{key}.npz'
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    with open(tmpfile, 'wb') as f:
+        np.savez(f, lon=lon, lat=lat, mask=mask)
+    os.replace(tmpfile, filename)
+    return filename
+
 def identify_boundary_edges(boundary_mask: np.ndarray) -> list[str]:
     """Identifies which edges has some boundary points
 
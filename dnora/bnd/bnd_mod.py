@@ -5,7 +5,7 @@ import xarray as xr
 import numpy as np
 from copy import copy
 import pandas as pd
-from typing import List
+from typing import List, Tuple
 import sys
 import re
 from calendar import monthrange
@@ -14,9 +14,9 @@ import glob, os
 from ..grd.grd_mod import Grid
 
 # Import abstract classes and needed instances of them
-from .process import BoundaryProcessor, Multiply
+from .process import BoundaryProcessor, Multiply, ConventionChange
 from .pick import PointPicker, TrivialPicker
-from .read import BoundaryReader, DnoraNc
+from .read import BoundaryReader, DnoraNc, DnoraZarr
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .write import BoundaryWriter # Abstract class
@@ -32,6 +32,7 @@ class Boundary:
         self._name = copy(name)
         self._convention = None
         self._history = []
+        self._lazy = False
         return
 
     def import_boundary(self, start_time: str, end_time: str,
@@ -39,13 +40,23 @@ class Boundary:
                         point_picker: PointPicker = TrivialPicker(),
                         write_cache: bool=False,
                         read_cache: bool=False,
-                        cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1'):
+                        cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1',
+                        cache_format: str='nc',
+                        lazy: bool=False):
         """Imports boundary spectra from a certain source.
 
         Spectra are import between start_time and end_time from the source
         defined in the boundary_reader. Which spectra to choose spatically
         are determined by the point_picker.
+
+        The cache is written as monthly netcdf files (cache_format='nc') or
+        to a single appendable zarr store (cache_format='zarr').
+
+        Set lazy=True to keep the spectra as a dask array if the reader
+        supports it. The spectra are then only read when they are needed, e.g.
+        one day at a time when written to file.
         """
+        self._lazy = copy(lazy)
 
         ### Some boundary readers may need to define an area and grid when
         ### reading the database. This is set to make that possible.
@@ -59,14 +70,27 @@ class Boundary:
         boundary_reader.set_restricted_area(boundary_point_grid)
 
         if write_cache or read_cache:
-            cache_folder, cache_name, cache_empty = aux_funcs.setup_cache('bnd', boundary_reader.name(), cache_name, self.grid)
+            cache_folder, cache_name, cache_empty = aux_funcs.setup_cache('bnd', boundary_reader.name(), cache_name, self.grid, cache_format)
+            cache_store = f'{cache_folder}/{cache_name}.zarr'
+
+        if read_cache and not cache_empty:
+            # Check the coverage of the cache before reading any data
+            cache_intervals, cache_dt = aux_funcs.cache_coverage(cache_folder, cache_name, cache_format)
+            patch_start, patch_end = aux_funcs.missing_periods(cache_intervals, cache_dt, start_time, end_time)
+            if patch_start == [pd.Timestamp(start_time)] and patch_end == [pd.Timestamp(end_time)]:
+                msg.info('No data found in cache for the requested period.')
+                cache_empty = True
 
         if read_cache and not cache_empty:
             msg.info('Reading boundary data from cache!!!')
             original_boundary_reader = copy(boundary_reader)
-            boundary_reader = DnoraNc(files=glob.glob(f'{cache_folder}/{cache_name}*'), convention = boundary_reader.convention())
+            if cache_format == 'zarr':
+                boundary_reader = DnoraZarr(store=cache_store, convention = boundary_reader.convention())
+            else:
+                boundary_reader = DnoraNc(files=aux_funcs.cache_files(cache_folder, cache_name), convention = boundary_reader.convention())
 
         self._history.append(copy(boundary_reader))
+        boundary_reader.set_lazy(lazy)
 
         msg.header(boundary_reader, "Reading coordinates of spectra...")
         lon_all, lat_all = boundary_reader.get_coordinates(start_time)
@@ -80,21 +104,21 @@ class Boundary:
 
         ### Main reading happens here
         msg.header(boundary_reader, "Loading boundary spectra...")
-        time, freq, dirs, spec, lon, lat, source = boundary_reader(start_time, end_time, inds)
+        time, freq, dirs, spec, lon, lat, source = self._read_unique_points(boundary_reader, start_time, end_time, inds)
         self.data = self.compile_to_xr(time, freq, dirs, spec, lon, lat, source)
 
 
         ### Patch data if read from cache and all data not found
         if read_cache and not cache_empty:
-            patch_start, patch_end = aux_funcs.determine_patch_periods(self.time(), start_time, end_time)
             if patch_start:
                 msg.info('Not all data found in cache. Patching from original source...')
 
+                original_boundary_reader.set_lazy(lazy)
                 lon_all, lat_all = original_boundary_reader.get_coordinates(start_time)
                 inds = point_picker(self.grid, lon_all, lat_all)
                 bnd_list = [self.data]
                 for t0, t1 in zip(patch_start, patch_end):
-                    time, freq, dirs, spec, lon, lat, source = original_boundary_reader(t0, t1, inds)
+                    time, freq, dirs, spec, lon, lat, source = self._read_unique_points(original_boundary_reader, t0, t1, inds)
                     bnd_list.append(self.compile_to_xr(time, freq, dirs, spec, lon, lat, source))
 
                 self.data = xr.concat(bnd_list, dim="time").sortby('time')
@@ -102,16 +126,37 @@ class Boundary:
 
         if write_cache:
             msg.info('Caching data:')
-            for month in self.months():
-                cache_file = f"{cache_name}_{month.strftime('%Y-%m')}.nc"
-                t0 = f"{month.strftime('%Y-%m-01')}"
-                d1 = monthrange(int(month.strftime('%Y')), int(month.strftime('%m')))[1]
-                t1 = f"{month.strftime(f'%Y-%m-{d1}')}"
-                outfile = f'{cache_folder}/{cache_file}'
-                if os.path.exists(outfile):
-                    os.remove(outfile)
-                self.data.sel(time=slice(t0, t1)).to_netcdf(outfile)
-                msg.to_file(outfile)
+            replaced_periods = []
+            if cache_format == 'zarr':
+                nt = aux_funcs.append_to_zarr_cache(self.data, cache_store)
+                msg.plain(f"Appended {nt} new time steps")
+                msg.to_file(cache_store)
+            else:
+                cache_files = []
+                for month in self.months():
+                    cache_file = f"{cache_name}_{month.strftime('%Y-%m')}.nc"
+                    t0 = f"{month.strftime('%Y-%m-01')}"
+                    d1 = monthrange(int(month.strftime('%Y')), int(month.strftime('%m')))[1]
+                    t1 = f"{month.strftime(f'%Y-%m-{d1}')}"
+                    outfile = f'{cache_folder}/{cache_file}'
+                    month_data = self.data.sel(time=slice(t0, t1))
+                    if self.is_lazy():
+                        # Lazy data might be read from the file we are replacing
+                        month_data = month_data.load()
+                    # Write to a temporary file first so that the cache is never incomplete
+                    tmpfile = f'{outfile}.{os.getpid()}.tmp'
+                    month_data.to_netcdf(tmpfile)
+                    os.replace(tmpfile, outfile)
+                    cache_files.append(outfile)
+                    replaced_periods.append([pd.Timestamp(t0), pd.Timestamp(t1) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')])
+                    msg.to_file(outfile)
+
+                if self.is_lazy():
+                    # Point the lazy data to the new cache files
+                    self.data = xr.open_mfdataset(cache_files).sel(time=slice(self.time()[0], self.time()[-1]))
+
+            aux_funcs.update_cache_coverage(cache_folder, cache_name, self.time(), cache_format,
+                                            replaced_periods=replaced_periods)
 
         #self.mask = [True]*len(self.x())
 
@@ -121,6 +166,28 @@ class Boundary:
         return
 
 
+    def _read_unique_points(self, boundary_reader: BoundaryReader, start_time, end_time, inds) -> Tuple:
+        """Reads the spectra with the boundary reader, but every spectrum only
+        once even if several boundary points use the same one.
+
+        The spectra are then expanded to all the points. For lazy (dask)
+        spectra this is only done when the spectra are computed. Eager
+        spectra are copied to every point, so the result then takes as much
+        memory as reading all the points would (only the reading is saved).
+        """
+        unique_inds, inverse = np.unique(inds, return_inverse=True)
+        if len(unique_inds) == len(inds) or not boundary_reader.reads_given_points():
+            return boundary_reader(start_time, end_time, inds)
+
+        msg.plain(f"Reading {len(unique_inds)} unique spectra for {len(inds)} boundary points")
+        time, freq, dirs, spec, lon, lat, source = boundary_reader(start_time, end_time, unique_inds)
+
+        if spec.shape[1] != len(unique_inds):
+            msg.warning(f"Reader returned {spec.shape[1]} spectra for {len(unique_inds)} points. Reading all {len(inds)} points instead!")
+            return boundary_reader(start_time, end_time, inds)
+
+        return time, freq, dirs, spec[:, inverse], np.asarray(lon)[inverse], np.asarray(lat)[inverse], source
+
     def process_boundary(self, boundary_processors: List[BoundaryProcessor]=[Multiply(calib_spec = 1)]):
         """Process all the individual spectra of the boundary object.
 
@@ -144,10 +211,20 @@ class Boundary:
                     convention_warning=True
 
 
-            new_spec, new_dirs, new_freq = processor(self.spec(), self.dirs(), self.freq())
+            if self.is_lazy() and isinstance(processor, ConventionChange):
+                # Only reorders directions, which dask can do without rechunking
+                new_spec, new_dirs, new_freq = processor(self.data.spec.data, self.dirs(), self.freq())
+                self.data['spec'] = (self.data.spec.dims, new_spec)
+            elif self.is_lazy():
+                new_spec, new_dirs, new_freq = self._process_lazy(processor)
+                self.data['spec'] = (self.data.spec.dims, new_spec)
+            elif getattr(processor, 'inplace', False):
+                new_spec, new_dirs, new_freq = processor(self.data.spec.values, self.dirs(), self.freq())
+                self.data.spec.values = new_spec
+            else:
+                new_spec, new_dirs, new_freq = processor(self.spec(), self.dirs(), self.freq())
+                self.data.spec.values = new_spec
 
-
-            self.data.spec.values = new_spec
             self.data = self.data.assign_coords(dirs=new_dirs)
             self.data = self.data.assign_coords(freq=new_freq)
 
@@ -165,6 +242,21 @@ class Boundary:
         return
 
 
+    def _process_lazy(self, processor: BoundaryProcessor) -> Tuple:
+        """Applies the processor to the dask array of spectra block by block.
+
+        The new directions and frequencies are determined by processing the
+        first spectrum.
+        """
+        spec = self.data.spec.data.rechunk({2: -1, 3: -1})
+        dirs, freq = self.dirs(), self.freq()
+        first_spec, new_dirs, new_freq = processor(spec[:1,:1].compute(), dirs, freq)
+
+        new_spec = spec.map_blocks(lambda block: processor(block, dirs, freq)[0],
+                                chunks=spec.chunks[:2]+((len(new_freq),), (len(new_dirs),)),
+                                dtype=first_spec.dtype, meta=np.empty((0,0,0,0), dtype=first_spec.dtype))
+        return new_spec, new_dirs, new_freq
+
     def compile_to_xr(self, time, freq, dirs, spec, lon, lat, source):
         """Data from .import_boundary() is stored as an xarray Dataset."""
 
@@ -204,12 +296,23 @@ class Boundary:
         return sliced_data
 
     def spec(self, start_time: str='', end_time: str='', x: List[int]=None) -> np.ndarray:
-        """Slice spectra in space (x) and time."""
+        """Slice spectra in space (x) and time.
+
+        Returns a dask array if the boundary was imported with lazy=True.
+        """
         spec = self.slice_data(start_time, end_time, x)
         if spec is None:
             return None
+        if self.is_lazy():
+            return spec.spec.data
         return spec.spec.values
 
+    def is_lazy(self) -> bool:
+        """True if the spectra are kept as a dask array."""
+        if not hasattr(self, 'data'):
+            return False
+        return self._lazy and self.data.spec.chunks is not None
+
     def time(self):
         if not hasattr(self, 'data'):
             return pd.to_datetime([])
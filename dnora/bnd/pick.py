@@ -1,12 +1,37 @@
 import numpy as np
 from abc import ABC, abstractmethod
+from scipy.spatial import cKDTree
+import hashlib
 
 # Import objects
 from ..grd.grd_mod import Grid
 
 # Import aux_funcsiliry functions
 from .. import msg
-from ..aux_funcs import min_distance, expand_area
+from ..aux_funcs import expand_area, distance_2points, lon_lat_to_unit_sphere
+
+# Spatial indeces of source coordinates, shared between all pickers so that
+# repeated imports against the same database don't rebuild the tree
+_tree_cache = {}
+_MAX_CACHED_TREES = 4
+
+def _coordinate_key(lon, lat) -> str:
+    lon = np.ascontiguousarray(lon, dtype=float)
+    lat = np.ascontiguousarray(lat, dtype=float)
+    return hashlib.sha1(lon.tobytes() + lat.tobytes()).hexdigest()
+
+def spatial_index(lon, lat) -> cKDTree:
+    """Returns a KD-tree of the points on the unit sphere.
+
+    The tree is cached based on the coordinates, so it is only built once
+    for a given set of source points.
+    """
+    key = _coordinate_key(lon, lat)
+    if key not in _tree_cache:
+        if len(_tree_cache) >= _MAX_CACHED_TREES:
+            del _tree_cache[next(iter(_tree_cache))]
+        _tree_cache[key] = cKDTree(lon_lat_to_unit_sphere(lon, lat))
+    return _tree_cache[key]
 
 class PointPicker(ABC):
     """PointPickers take in longitude and latitude values, and returns indeces
@@ -30,6 +55,9 @@ class TrivialPicker(PointPicker):
 class NearestGridPoint(PointPicker):
     """Choose the nearest grid point to each boundary point in the grid.
     Set a maximum allowed distance using `max_dist` (in km) at instantiation time.
+
+    The nearest points are found with a KD-tree of the source coordinates,
+    which is reused as long as the source coordinates don't change.
     """
     def __init__(self, max_dist=None):
         self.max_dist = max_dist
@@ -40,18 +68,27 @@ class NearestGridPoint(PointPicker):
         lon = bnd_points[:,0]
         lat = bnd_points[:,1]
 
-        # Go through all points where we want output and find the nearest available point
-        inds = []
-        for n in range(len(lat)):
-            dx, ind = min_distance(lon[n], lat[n], bnd_lon, bnd_lat)
-            ms = f"Point {n}: lat: {lat[n]:10.7f}, lon: {lon[n]:10.7f} <<< ({bnd_lat[ind]: .7f}, {bnd_lon[ind]: .7f}). Distance: {dx:.1f} km"
-            if self.max_dist is None or dx <= self.max_dist:
+        # ForceFeed gives the coordinates as lists
+        bnd_lon, bnd_lat = np.asarray(bnd_lon), np.asarray(bnd_lat)
+
+        # Find the nearest available point for all points where we want output
+        tree = spatial_index(bnd_lon, bnd_lat)
+        __, nearest = tree.query(lon_lat_to_unit_sphere(lon, lat))
+        dx = distance_2points(lat, lon, bnd_lat[nearest], bnd_lon[nearest])
+
+        if self.max_dist is None:
+            within_range = np.full(len(nearest), True)
+        else:
+            within_range = dx <= self.max_dist
+
+        for n, ind in enumerate(nearest):
+            ms = f"Point {n}: lat: {lat[n]:10.7f}, lon: {lon[n]:10.7f} <<< ({bnd_lat[ind]: .7f}, {bnd_lon[ind]: .7f}). Distance: {dx[n]:.1f} km"
+            if within_range[n]:
                 msg.plain(ms)
-                inds.append(ind)
             else:
                 msg.plain('DISCARDED, too far: '+ms)
 
-        inds = np.array(inds)
+        inds = nearest[within_range]
         return inds
 
 class Area(PointPicker):
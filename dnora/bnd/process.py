@@ -5,7 +5,7 @@ from typing import Tuple
 
 # Import aux_funcsiliry functions
 from .. import msg
-from ..aux_funcs import interp_spec, shift_spec, flip_spec
+from ..aux_funcs import interp_spec, shift_spec, flip_spec, direction_interpolation_weights, permute_dirs_inplace
 
 class BoundaryProcessor(ABC):
     def __init__(self):
@@ -104,37 +104,35 @@ class Multiply(BoundaryProcessor):
 
 class ReGridDirs(BoundaryProcessor):
     """Interpolates the spectra to have the same resoltuon but to start from
-    a certain values, e.g. 0."""
-    def __init__(self, first_dir = 0) -> None:
+    a certain values, e.g. 0.
+
+    The interpolation weights are computed once and applied to all spectra
+    at the same time. Set chunk_size to interpolate only that many time steps
+    at once to limit the memory needed for temporary arrays.
+    """
+    def __init__(self, first_dir = 0, chunk_size: int=None) -> None:
         self.first_dir = copy(first_dir)
+        self.chunk_size = copy(chunk_size)
 
         return
 
     def __call__(self, spec, dirs, freq) -> Tuple:
 
-        if dirs[0] > 0:
-            nbins = len(dirs)
-            dD=int(360/nbins)
-
-            new_dirs = np.array(range(0,360,dD), dtype='float32') + self.first_dir
-
-
-            if len(spec.shape) == 2:
-                new_spec = interp_spec(freq, dirs, spec, freq, new_dirs)
-            elif len(spec.shape) == 3:
-                new_spec = copy(spec)
-                N = spec.shape[0]
-                for n in range(N):
-                    temp_spec = interp_spec(freq, dirs, spec[n,:,:], freq, new_dirs)
-                    new_spec[n,:,:] = temp_spec
-            elif len(spec.shape) == 4:
-                new_spec = copy(spec)
-                N1 = spec.shape[0]
-                N2 = spec.shape[1]
-                for n1 in range(N1):
-                    for n2 in range(N2):
-                        temp_spec = interp_spec(freq, dirs, spec[n1,n2,:], freq, new_dirs)
-                        new_spec[n1,n2,:,:] = temp_spec
+        if not dirs[0] > 0:
+            return spec, dirs, freq
+
+        nbins = len(dirs)
+        dD=int(360/nbins)
+
+        new_dirs = np.array(range(0,360,dD), dtype='float32') + self.first_dir
+        weights = direction_interpolation_weights(dirs, new_dirs)
+
+        if self.chunk_size is None or len(spec.shape) < 3:
+            new_spec = (spec @ weights).astype(spec.dtype)
+        else:
+            new_spec = np.empty(spec.shape[:-1] + (len(new_dirs),), dtype=spec.dtype)
+            for n in range(0, spec.shape[0], self.chunk_size):
+                new_spec[n:n+self.chunk_size] = spec[n:n+self.chunk_size] @ weights
 
         return new_spec, new_dirs, freq
 
@@ -450,6 +448,65 @@ class OceanToMet(BoundaryProcessor):
     def __str__(self):
         return("Shifting spectrum 180 degrees.")
 
+class ConventionChange(BoundaryProcessor):
+    """Changes the convention of all spectra in one step.
+
+    The chain of processors given by processor_for_convention_change (e.g.
+    [MetToOcean(), OceanToWW3()]) only reorders the directional bins, so it
+    is applied once to the bin indices. The result is a single permutation
+    of the directions that is then applied to the spectra.
+
+    Set inplace=True to reorder the given numpy array in place instead of
+    making a copy. Dask arrays are always indexed lazily.
+    """
+
+    def __init__(self, current_convention: str, wanted_convention: str, inplace: bool=False):
+        self.current_convention = copy(current_convention)
+        self.wanted_convention = copy(wanted_convention)
+        self.inplace = copy(inplace)
+
+        processors = processor_for_convention_change(current_convention, wanted_convention)
+        if processors is None:
+            processors = []
+        if not isinstance(processors, list):
+            processors = [processors]
+        self.processors = processors
+        return
+
+    def _convention_in(self) -> str:
+        return self.current_convention
+
+    def _convention_out(self) -> str:
+        return self.wanted_convention
+
+    def permutation(self, dirs) -> Tuple[np.ndarray, np.ndarray]:
+        """Index permutation and new directional vector so that the new
+        spectra are spec[..., perm]."""
+        perm = np.array([np.arange(len(dirs))])
+        new_dirs = copy(dirs)
+        for processor in self.processors:
+            perm, new_dirs = processor(perm, new_dirs)
+
+        return perm[0], new_dirs
+
+    def __call__(self, spec, dirs, freq = None) -> Tuple:
+        perm, new_dirs = self.permutation(dirs)
+
+        if np.all(perm == np.arange(len(perm))):
+            new_spec = spec
+        elif self.inplace and isinstance(spec, np.ndarray):
+            new_spec = permute_dirs_inplace(spec, perm)
+        else:
+            new_spec = spec[..., perm]
+
+        if freq is not None:
+            return new_spec, new_dirs, freq
+        else:
+            return new_spec, new_dirs
+
+    def __str__(self):
+        return(f"Changing convention {self.current_convention} >> {self.wanted_convention} with a single reordering of the directions.")
+
 
 def processor_for_convention_change(current_convention: str, wanted_convention: str) -> BoundaryProcessor:
         """Provides a BoundaryProcessor object for the .change_convention()
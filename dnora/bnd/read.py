@@ -1,3 +1,4 @@
+import os
 import xarray as xr
 import numpy as np
 from copy import copy
@@ -29,6 +30,62 @@ class BoundaryReader(ABC):
             return None
         return self._restricted_area
 
+    def set_lazy(self, lazy: bool) -> None:
+        """This is set automatically by the .import_boundary() method.
+
+        Readers that support it should then return the spectra as a dask
+        array instead of reading them into memory.
+        """
+        self._lazy = lazy
+
+    def is_lazy(self) -> bool:
+        if not hasattr(self, '_lazy'):
+            return False
+        return self._lazy
+
+    def set_max_gap(self, max_gap: int=None) -> None:
+        """Read scattered points as contiguous blocks of points.
+
+        Points less than max_gap points apart are read as one block, since
+        reading a few extra points is cheaper than making a new request (e.g.
+        over OPeNDAP). Set max_gap=0 to read every contiguous run separately.
+        The default (None) reads all points with a single fancy index.
+
+        Used by readers that read the points with _select_points().
+        """
+        self._max_gap = max_gap
+
+    def get_max_gap(self) -> int:
+        if not hasattr(self, '_max_gap'):
+            return None
+        return self._max_gap
+
+    def reads_given_points(self) -> bool:
+        """Return False if the reader doesn't return exactly the points given
+        by inds (in that order). Duplicate points are then not deduplicated."""
+        return True
+
+    def _select_points(self, ds: xr.Dataset, x) -> xr.Dataset:
+        """Selects the points with the x-values given by x (in that order).
+
+        The points are read in contiguous blocks if max_gap is set.
+        """
+        max_gap = self.get_max_gap()
+        if max_gap is None:
+            return ds.sel(x=x)
+
+        inds = ds.indexes['x'].get_indexer(np.atleast_1d(x))
+        if np.any(inds < 0):
+            raise KeyError(f"Not all x-values found in the dataset: {x}")
+
+        blocks, positions = aux_funcs.plan_index_reads(inds, max_gap)
+        blocks = [ds.isel(x=slice(start, stop)) for start, stop in blocks]
+        if len(blocks) > 1:
+            ds = xr.concat(blocks, dim='x', data_vars='minimal', coords='minimal', compat='override')
+        else:
+            ds = blocks[0]
+        return ds.isel(x=positions)
+
     @abstractmethod
     def get_coordinates(self, start_time):
         """Return a list of all the available coordinated in the source.
@@ -89,16 +146,30 @@ class BoundaryReader(ABC):
 
 
 class DnoraNc(BoundaryReader):
-    def __init__(self, files: str, convention: str) -> None:
+    def __init__(self, files: str, convention: str, coordinate_cache: bool=False) -> None:
+        """Set coordinate_cache=True to store the coordinates locally (in
+        coordinate_cache/DnoraNc). The index is renewed if the file changes."""
         self._convention = convention
         self.files = files
+        self.coordinate_cache = coordinate_cache
 
 
     def convention(self) -> str:
         return copy(self._convention)
 
     def get_coordinates(self, start_time) -> Tuple:
+        if self.coordinate_cache:
+            cache_folder = aux_funcs.setup_coordinate_cache(type(self).__name__)
+            stat = os.stat(self.files[0])
+            cache_key = aux_funcs.coordinate_cache_key({'file': os.path.abspath(self.files[0]), 'mtime': stat.st_mtime, 'size': stat.st_size})
+            lon, lat, __ = aux_funcs.read_coordinate_cache(cache_folder, cache_key)
+            if lon is not None:
+                return lon, lat
+
         data = xr.open_dataset(self.files[0]).isel(time = [0])
+
+        if self.coordinate_cache:
+            msg.to_file(aux_funcs.write_coordinate_cache(cache_folder, cache_key, data.lon.values, data.lat.values))
         return data.lon.values, data.lat.values
 
 
@@ -109,7 +180,34 @@ class DnoraNc(BoundaryReader):
         msg.info(f"Getting boundary spectra from cached netcdf (e.g. {self.files[0]}) from {start_time} to {end_time}")
         ds = xr.open_mfdataset(self.files, preprocess=_crop)
         ds = ds.sel(x=inds)
-        return ds.time.values, ds.freq.values, ds.dirs.values, ds.spec.values, ds.lon.values, ds.lat.values, ds.source
+        if self.is_lazy():
+            spec = ds.spec.data
+        else:
+            spec = ds.spec.values
+        return ds.time.values, ds.freq.values, ds.dirs.values, spec, ds.lon.values, ds.lat.values, ds.source
+
+class DnoraZarr(BoundaryReader):
+    def __init__(self, store: str, convention: str) -> None:
+        self._convention = convention
+        self.store = store
+
+    def convention(self) -> str:
+        return copy(self._convention)
+
+    def get_coordinates(self, start_time) -> Tuple:
+        data = xr.open_zarr(self.store, consolidated=True)
+        return data.lon.values, data.lat.values
+
+    def __call__(self, start_time, end_time, inds) -> Tuple:
+        msg.info(f"Getting boundary spectra from cached zarr store {self.store} from {start_time} to {end_time}")
+        ds = xr.open_zarr(self.store, consolidated=True)
+        # Time steps are appended in the order they were cached
+        ds = ds.sortby('time').sel(time=slice(start_time, end_time), x=inds)
+        if self.is_lazy():
+            spec = ds.spec.data
+        else:
+            spec = ds.spec.values
+        return ds.time.values, ds.freq.values, ds.dirs.values, spec, ds.lon.values, ds.lat.values, ds.source
 
 class ForceFeed(BoundaryReader):
     def __init__(self, time, freq, dirs, spec, lon, lat, convention) -> None:
@@ -128,6 +226,9 @@ class ForceFeed(BoundaryReader):
     def get_coordinates(self, start_time) -> Tuple:
         return copy(self.lon), copy(self.lat)
 
+    def reads_given_points(self) -> bool:
+        return False
+
     def __call__(self, start_time, end_time, inds) -> Tuple:
         #return  copy(self.time), copy(self.freq), copy(self.dirs), np.reshape(self.spec, (len(self.time), len(self.lon), self.spec.shape[0], self.spec.shape[1])), copy(self.lon), copy(self.lat), ''
         return  copy(self.time), copy(self.freq), copy(self.dirs), copy(self.spec), copy(self.lon), copy(self.lat), ''
@@ -179,7 +280,11 @@ class File_WW3Nc(BoundaryReader):
             msg.from_file(filename)
             msg.plain(f"Reading boundary spectra: {start_times[n]}-{end_times[n]}")
 
-            bnd_list.append(xr.open_dataset(filename).sel(time = slice(start_times[n], end_times[n]), station = (inds+1)))
+            if self.is_lazy():
+                ds = xr.open_dataset(filename, chunks={})
+            else:
+                ds = xr.open_dataset(filename)
+            bnd_list.append(ds.sel(time = slice(start_times[n], end_times[n]), station = (inds+1)))
 
         bnd=xr.concat(bnd_list, dim="time")
 
@@ -192,7 +297,10 @@ class File_WW3Nc(BoundaryReader):
         time = bnd.time.values
         freq = bnd.frequency.values
         dirs = bnd.direction.values
-        spec = bnd.efth.values
+        if self.is_lazy():
+            spec = bnd.efth.data
+        else:
+            spec = bnd.efth.values
         lon = bnd.longitude.values[0,:]
         lat = bnd.latitude.values[0,:]
 
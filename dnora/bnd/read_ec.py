@@ -4,14 +4,13 @@ import glob
 import numpy as np
 from copy import copy
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import Tuple, List
 import pandas as pd
 # Import abstract classes and needed instances of them
 from .read import BoundaryReader
-import cdsapi
 # Import aux_funcsiliry functions
 from .. import msg
-from ..aux_funcs import create_time_stamps, expand_area, int_list_of_days, int_list_of_months, int_list_of_years
+from ..aux_funcs import create_time_stamps, expand_area, month_periods, download_from_cds
 
 
 def renormalize_era5_spec(bnd_spec):
@@ -25,27 +24,10 @@ def reshape_bnd_spec(bnd_spec):
     pass
 
 
-def download_era5_from_cds(start_time, end_time, lon, lat, dlon, dlat, folder='dnora_wnd_temp') -> str:
-    """Downloads ERA5 10 m wind data from the Copernicus Climate Data Store for a
-    given area and time period"""
-    start_time = pd.Timestamp(start_time)
-    end_time = pd.Timestamp(end_time)
-    c = cdsapi.Client()
-
-    filename = f'{folder}/EC_ERA5.nc'
-
-    years = [f'{y:4.0f}' for y in int_list_of_years(start_time, end_time)]
-    months = [f'{m:02.0f}' for m in int_list_of_months(start_time, end_time)]
-    days = [f'{d:02.0f}' for d in int_list_of_days(start_time, end_time)]
-
-    # Create string for dates
-    dates = []
-    for y in years:
-        for m in months:
-            for d in days:
-                dates.append(f'{y}-{m}-{d}')
-    dates = '/'.join(dates)
-
+def era5_cds_request(start_time, end_time, lon, lat, dlon, dlat) -> dict:
+    """CDS request for ERA5 wave spectra for a given area and for all days
+    between start_time and end_time."""
+    dates = '/'.join(pd.date_range(pd.Timestamp(start_time).normalize(), pd.Timestamp(end_time).normalize(), freq='D').strftime('%Y-%m-%d'))
 
     cds_command ={
         'class': 'ea',
@@ -62,10 +44,32 @@ def download_era5_from_cds(start_time, end_time, lon, lat, dlon, dlat, folder='d
         'type': 'an',
         'format': 'netcdf',
         }
+    return cds_command
+
+def download_era5_from_cds(start_time, end_time, lon, lat, dlon, dlat, folder='dnora_bnd_temp', client=None, max_workers: int=1) -> List[str]:
+    """Downloads ERA5 wave spectra from the Copernicus Climate Data Store for a
+    given area and time period.
+
+    The period is split into monthly requests that are cached in the folder,
+    so only months that have not been downloaded before are retrieved.
+    """
+    requests = [era5_cds_request(t0, t1, lon, lat, dlon, dlat) for t0, t1 in month_periods(start_time, end_time)]
+    return download_from_cds('reanalysis-era5-complete', requests, folder, client=client, max_workers=max_workers)
 
-    c.retrieve('reanalysis-era5-complete', cds_command, filename)
-    return filename
 class ERA5(BoundaryReader):
+    """Downloads ERA5 wave spectra from the Copernicus Climate Data Store.
+
+    Downloaded months are kept in the folder and reused. Set max_workers to
+    download several months at the same time. A client with a
+    retrieve(dataset, request, target) method can be given instead of the
+    default cdsapi.Client.
+    """
+    def __init__(self, folder: str='dnora_bnd_temp', max_workers: int=1, client=None) -> None:
+        self.folder = copy(folder)
+        self.max_workers = copy(max_workers)
+        self.client = client
+        return
+
     def convention(self) -> str:
         return 'Ocean'
 
@@ -82,27 +86,18 @@ class ERA5(BoundaryReader):
         msg.info(
             f"Getting ERA5 boundary spectra from {start_time} to {end_time}")
 
-        temp_folder = 'dnora_bnd_temp'
-        if not os.path.isdir(temp_folder):
-            os.mkdir(temp_folder)
-            print("Creating folder %s..." % temp_folder)
-
-        msg.plain("Removing old files from temporary folder...")
-        for f in glob.glob(f"{temp_folder}/EC_ERA5.nc"):
-            os.remove(f)
-
         restricted_area = self.get_restricted_area()
-        breakpoint()
-        nc_file = download_era5_from_cds(start_time, end_time,
+        nc_files = download_era5_from_cds(start_time, end_time,
                                         lon=restricted_area.lon_edges(),
                                         lat=restricted_area.lat_edges(),
                                         dlon=restricted_area.dlon(),
                                         dlat=restricted_area.dlat(),
-                                        folder=temp_folder)
-
-
+                                        folder=self.folder,
+                                        client=self.client,
+                                        max_workers=self.max_workers)
 
-        bnd_spec = xr.open_dataset(nc_file)
+        bnd_spec = xr.concat([xr.open_dataset(nc_file) for nc_file in nc_files], dim='time')
+        bnd_spec = bnd_spec.sel(time=slice(start_time, end_time))
 
         bnd_spec = renormalize_era5_spec(bnd_spec)
 
@@ -1,4 +1,4 @@
-import os
+import os, re
 import xarray as xr
 import glob
 import numpy as np
@@ -11,12 +11,22 @@ from .read import BoundaryReader
 
 # Import aux_funcsiliry functions
 from .. import msg
-from ..aux_funcs import day_list, create_time_stamps
+from ..aux_funcs import day_list, create_time_stamps, map_concurrently, iterate_concurrently, setup_coordinate_cache, coordinate_cache_key, read_coordinate_cache, write_coordinate_cache
 
 class WAM4km(BoundaryReader):
     def __init__(self, ignore_nan: bool=True, stride: int=6,
                  hours_per_file: int=73, last_file: str='', lead_time: int=0,
-                 cache: bool=True, clean_cache: bool=False) -> None:
+                 cache: bool=True, clean_cache: bool=False,
+                 max_workers: int=1, coordinate_cache: bool=False) -> None:
+        """Set max_workers > 1 to read that many files concurrently (in
+        separate processes, since netCDF4 is not thread safe).
+
+        Set coordinate_cache=True to store the coordinates and the mask of
+        points with NaN's locally (in coordinate_cache/WAM4km), so that
+        get_coordinates doesn't need to open a remote file on later runs. The
+        index is checked against the first file that is read, and an error is
+        raised (and the index removed) if the points don't match.
+        """
         self.ignore_nan = copy(ignore_nan)
         self.stride = copy(stride)
         self.hours_per_file = copy(hours_per_file)
@@ -24,6 +34,8 @@ class WAM4km(BoundaryReader):
         self.last_file = copy(last_file)
         self.cache = copy(cache)
         self.clean_cache = copy(clean_cache)
+        self.max_workers = copy(max_workers)
+        self.coordinate_cache = copy(coordinate_cache)
         self.cache_folder = 'dnora_bnd_temp'
         return
 
@@ -37,19 +49,33 @@ class WAM4km(BoundaryReader):
         start_times, end_times, file_times = create_time_stamps(start_time, start_time, stride = self.stride, hours_per_file = self.hours_per_file, last_file = self.last_file, lead_time = self.lead_time)
         url = self.get_url(file_times[0])
 
-        data = xr.open_dataset(url).isel(time = [0])
-
-        lon_all = data.longitude.values[0]
-        lat_all = data.latitude.values[0]
-
+        lon_all, lat_all, mask = None, None, None
+        self._cached_coordinates = None
+        if self.coordinate_cache:
+            cache_folder = setup_coordinate_cache(type(self).__name__)
+            # Time stamps masked out, since the coordinates should be the same in all files
+            cache_key = coordinate_cache_key({'url': re.sub(r'\d', '#', url), 'ignore_nan': self.ignore_nan})
+            lon_all, lat_all, mask = read_coordinate_cache(cache_folder, cache_key)
+            if lon_all is not None:
+                # Checked against the data in __call__
+                self._cached_coordinates = (f'{cache_folder}/{cache_key}.npz', lon_all, lat_all, mask)
+
+        if lon_all is None:
+            data = xr.open_dataset(url).isel(time = [0])
+
+            lon_all = data.longitude.values[0]
+            lat_all = data.latitude.values[0]
+            if self.ignore_nan or self.coordinate_cache:
+                # Points that have NaN's in the first spectra (one reduction over all other dimensions)
+                mask = np.logical_not(data.SPEC.isnull().any(dim=[dim for dim in data.SPEC.dims if dim != 'x']).values)
+
+            if self.coordinate_cache:
+                msg.to_file(write_coordinate_cache(cache_folder, cache_key, lon_all, lat_all, mask))
 
         if self.ignore_nan:
             msg.info('ignore_nan = True. The following points are NOT provided to the point_picker')
-            mask = [True]*len(lon_all)
-            for n in range(len(lon_all)):
-                if np.isnan(data.SPEC.values[:,0,n,:,:]).any():
-                    msg.plain(f"{lon_all[n]:10.7f}, {lat_all[n]:10.7f}")
-                    mask[n] = False
+            for n in np.flatnonzero(np.logical_not(mask)):
+                msg.plain(f"{lon_all[n]:10.7f}, {lat_all[n]:10.7f}")
 
             lon_all = lon_all[mask]
             lat_all = lat_all[mask]
@@ -79,44 +105,36 @@ class WAM4km(BoundaryReader):
 
 
         msg.info(f"Getting boundary spectra from WAM4 from {self.start_time} to {self.end_time}")
-        bnd_list = []
-        for n in range(len(file_times)):
 
+        # The files are read ahead concurrently (max_workers at a time). Missing
+        # or inconsistent files are then replaced by earlier forecasts one by one.
+        urls = [self.get_url(file_time) for file_time in file_times]
+        reads = iterate_concurrently(self._read_file, urls, start_times, end_times, [inds]*len(urls),
+                                    max_workers=self.max_workers, processes=True)
 
+        bnd_list = []
+        missing_urls = set()
+        for n, (this_ds, url_or_cache) in enumerate(reads):
             msg.plain(f"Reading boundary spectra: {start_times[n]}-{end_times[n]}")
 
-            file_time = file_times[n]
+            url = urls[n]
+            if this_ds is None:
+                missing_urls.add(url)
             ct = 1
-            keep_trying = True
-            while keep_trying:
+            while not self.file_is_consistent(this_ds, bnd_list, url):
+                if not self.data_left_to_try_with(n, ct, file_times, end_times):
+                    this_ds = None
+                    break
 
-                url = self.get_url(file_time)
-                url_or_cache, data_from_cache = self.get_filepath_if_cached(url)
-                if data_from_cache and ct == 1:
-                    this_ds = xr.load_dataset(url_or_cache)
+                url = self.get_url(file_times[n-ct])
+                if url in missing_urls:
+                    # Already known not to exist
+                    this_ds, url_or_cache = None, url
                 else:
-                    try:
-                        with xr.open_dataset(url) as f:
-                            this_ds = f.sel(
-                                time=slice(start_times[n], end_times[n]),
-                                x=inds+1,
-                            )[
-                                ['SPEC', 'longitude', 'latitude', 'time', 'freq', 'direction']
-                            ].copy()
-                    except OSError:
-                            this_ds = None
-
-                file_consistent = self.file_is_consistent(this_ds, bnd_list, url)
-
-                if file_consistent:
-                    keep_trying =False
-
-                elif self.data_left_to_try_with(n, ct, file_times, end_times):
-                    file_time = file_times[n-ct]
-                    ct += 1
-                else:
-                    this_ds = None
-                    keep_trying = False
+                    this_ds, url_or_cache = self._read_file(url, start_times[n], end_times[n], inds, use_cache=False)
+                    if this_ds is None:
+                        missing_urls.add(url)
+                ct += 1
 
             # We are now out of the while loop
             if this_ds is not None:
@@ -126,6 +144,9 @@ class WAM4km(BoundaryReader):
                     self.write_to_cache(this_ds, url)
                 this_ds = None
 
+        if bnd_list and getattr(self, '_cached_coordinates', None) is not None:
+            self._check_cached_coordinates(bnd_list[0], inds)
+
         msg.info("Merging dataset together (this might take a while)...")
         bnd = xr.concat(bnd_list, dim="time").squeeze('y')
 
@@ -140,6 +161,41 @@ class WAM4km(BoundaryReader):
 
         return  time, freq, dirs, spec, lon, lat, source
 
+    def _read_file(self, url: str, start_time, end_time, inds, use_cache: bool=True) -> Tuple:
+        """Reads the spectra from one file (or the local cache of the file).
+
+        Returns None as data if the file can't be opened.
+        """
+        url_or_cache, data_from_cache = self.get_filepath_if_cached(url)
+        if data_from_cache and use_cache:
+            return xr.load_dataset(url_or_cache), url_or_cache
+
+        try:
+            with xr.open_dataset(url) as f:
+                this_ds = f[
+                    ['SPEC', 'longitude', 'latitude', 'time', 'freq', 'direction']
+                ].sel(time=slice(start_time, end_time))
+                this_ds = self._select_points(this_ds, inds+1).load()
+        except OSError:
+                this_ds = None
+
+        return this_ds, url_or_cache
+
+    def _check_cached_coordinates(self, ds: xr.Dataset, inds) -> None:
+        """Checks that the coordinate index used by get_coordinates matches
+        the points (and NaN's) in the data. The index is otherwise removed,
+        since the points might have been picked from the wrong coordinates."""
+        filename, lon_all, lat_all, mask = self._cached_coordinates
+        lon, lat = np.ravel(ds.longitude.values), np.ravel(ds.latitude.values)
+        nan_points = ds.SPEC.isel(time=0).isnull().any(dim=[dim for dim in ds.SPEC.dims if dim not in ['time', 'x']]).values
+
+        consistent = (len(lon) == len(inds) and np.allclose(lon, lon_all[inds]) and np.allclose(lat, lat_all[inds])
+                        and not (self.ignore_nan and np.any(nan_points)))
+        if not consistent:
+            if os.path.isfile(filename):
+                os.remove(filename)
+            raise ValueError(f"Coordinates or NaN's of the data don't match the coordinate index {filename}! The index has been removed, so run again to pick the points from the correct coordinates.")
+
     def file_is_consistent(self, this_ds, bnd_list, url) -> bool:
         if this_ds is None:
             msg.plain(f'SKIPPING, file not found: {url}')
@@ -197,12 +253,22 @@ class WAM4km(BoundaryReader):
 class NORA3(BoundaryReader):
     def __init__(self, stride: int=24, hours_per_file: int=24,
                 last_file: str='', lead_time: int=0,
-                source: str='thredds') -> None:
+                source: str='thredds', max_workers: int=1,
+                coordinate_cache: bool=False) -> None:
+        """Set max_workers > 1 to read that many files concurrently (in
+        separate processes, since netCDF4 is not thread safe).
+
+        Set coordinate_cache=True to store the coordinates locally (in
+        coordinate_cache/NORA3), so that get_coordinates doesn't need to open
+        a file on later runs.
+        """
         self.stride = copy(stride)
         self.hours_per_file = copy(hours_per_file)
         self.lead_time = copy(lead_time)
         self.last_file = copy(last_file)
         self.source = source
+        self.max_workers = copy(max_workers)
+        self.coordinate_cache = copy(coordinate_cache)
         return
 
     def convention(self) -> str:
@@ -214,11 +280,22 @@ class NORA3(BoundaryReader):
         start_times, end_times, file_times = create_time_stamps(start_time, start_time, stride = self.stride, hours_per_file = self.hours_per_file, last_file = self.last_file, lead_time = self.lead_time)
         url = self.get_url(file_times[0], source=self.source)
 
+        if self.coordinate_cache:
+            cache_folder = setup_coordinate_cache(type(self).__name__)
+            # Time stamps masked out, since the coordinates are the same in all files
+            cache_key = coordinate_cache_key({'url': re.sub(r'\d', '#', url)})
+            lon_all, lat_all, __ = read_coordinate_cache(cache_folder, cache_key)
+            if lon_all is not None:
+                return lon_all, lat_all
+
         data = xr.open_dataset(url).isel(time = [0])
 
         lon_all = data.longitude.values[0]
         lat_all = data.latitude.values[0]
 
+        if self.coordinate_cache:
+            msg.to_file(write_coordinate_cache(cache_folder, cache_key, lon_all, lat_all))
+
         return lon_all, lat_all
 
     def __call__(self, start_time, end_time, inds) -> Tuple:
@@ -229,15 +306,13 @@ class NORA3(BoundaryReader):
         start_times, end_times, file_times = create_time_stamps(start_time, end_time, stride = self.stride, hours_per_file = self.hours_per_file, last_file = self.last_file, lead_time = self.lead_time)
         #days = day_list(start_time = self.start_time, end_time = self.end_time)
         msg.info(f"Getting boundary spectra from NORA3 from {self.start_time} to {self.end_time}")
-        bnd_list = []
+        urls = [self.get_url(file_time, source=self.source) for file_time in file_times]
         for n in range(len(file_times)):
-            url = self.get_url(file_times[n], source=self.source)
-            msg.from_file(url)
+            msg.from_file(urls[n])
             msg.plain(f"Reading boundary spectra: {start_times[n]}-{end_times[n]}")
-            with xr.open_dataset(url) as f:
-                this_ds = f.sel(time = slice(start_times[n], end_times[n]), x = (inds+1))[['SPEC', 'longitude', 'latitude', 'time', 'freq', 'direction']].copy()
-            bnd_list.append(this_ds)
-            #bnd_list.append(xr.open_dataset(url).sel(time = slice(start_times[n], end_times[n]), x = (inds+1)))
+
+        bnd_list = map_concurrently(self._read_file, urls, start_times, end_times, [inds]*len(urls),
+                                    max_workers=self.max_workers, processes=True)
         bnd=xr.concat(bnd_list, dim="time").squeeze('y')
 
         time = bnd.time.values
@@ -252,6 +327,13 @@ class NORA3(BoundaryReader):
         return  time, freq, dirs, spec, lon, lat, source
 
 
+    def _read_file(self, url: str, start_time, end_time, inds) -> xr.Dataset:
+        """Reads the spectra from one file."""
+        with xr.open_dataset(url) as f:
+            this_ds = f[['SPEC', 'longitude', 'latitude', 'time', 'freq', 'direction']].sel(time = slice(start_time, end_time))
+            this_ds = self._select_points(this_ds, inds+1).load()
+        return this_ds
+
     def get_url(self, day, source) -> str:
         if source == 'thredds':
             return 'https://thredds.met.no/thredds/dodsC/windsurfer/mywavewam3km_spectra/'+day.strftime('%Y') +'/'+day.strftime('%m')+'/SPC'+day.strftime('%Y%m%d')+'00.nc'
@@ -266,12 +266,12 @@ class WW3(BoundaryWriter):
 
         if self.one_file:
             station[:] = boundary.x()
-            efth[:] =  boundary.spec()
+            self.write_spec(efth, boundary.spec())
             longitude[:] = np.full((len(boundary.time()),len(boundary.lon())), boundary.lon(),dtype=float)
             latitude[:] = np.full((len(boundary.time()),len(boundary.lat())), boundary.lat(),dtype=float)
         else:
             station[:] = 1
-            efth[:] =  boundary.spec(x=[n])
+            self.write_spec(efth, boundary.spec(x=[n]))
             longitude[:] = np.full((len(boundary.time()),1), boundary.lon()[n],dtype=float)
             latitude[:] = np.full((len(boundary.time()),1), boundary.lat()[n],dtype=float)
         #longitude[:] = bnd_out.longitude.values
@@ -281,6 +281,20 @@ class WW3(BoundaryWriter):
         root_grp.close()
         return
 
+    def write_spec(self, efth, spec) -> None:
+        """Writes the spectra to the netcdf variable.
+
+        Lazy (dask) spectra are computed and written one time chunk at a time.
+        """
+        if not hasattr(spec, 'chunks'):
+            efth[:] = spec
+            return
+
+        t0 = 0
+        for nt in spec.chunks[0]:
+            efth[t0:t0+nt] = spec[t0:t0+nt].compute()
+            t0 += nt
+
 
 class SWAN(BoundaryWriter):
     def __init__(self, factor = 1E-4) -> None:
@@ -300,7 +314,7 @@ class SWAN(BoundaryWriter):
         swan_bnd_points = boundary.grid.boundary_points()
         days = boundary.days()
 
-        with open(filename, 'w') as file_out:
+        with open(filename, 'w', buffering=2**20) as file_out:
             file_out.write('SWAN   1\n')
             file_out.write('$ Data produced by '+boundary.data.source+'\n')
             file_out.write('TIME\n')
@@ -325,17 +339,21 @@ class SWAN(BoundaryWriter):
                 #first day
             #msg.to_file(f"{output_path}")
 
+            # Format all points of one time step in one go
+            spec_fmt = ' '.join(['%-10.0f']*len(boundary.dirs())) + '\n'
+            point_fmt = 'FACTOR\n' + format(self.factor,'1.0E') + '\n' + spec_fmt*len(boundary.freq())
+            time_step_fmt = point_fmt*len(boundary.x())
+
             for day in days:
                 msg.plain(day.strftime('%Y-%m-%d'))
-                times = boundary.times_in_day(day)
-                for tim in times:
+                # Read spectra of the whole day at once
+                day_data = boundary.slice_data(start_time=day.strftime('%Y-%m-%d') + "T00:00:00",
+                                               end_time=day.strftime('%Y-%m-%d') + "T23:59:59")
+                times = day_data.time.values
+                # SWAN uses m*m/Hz/deg normalization
+                day_spec = day_data.spec.values*np.pi/(180*self.factor)
+                for n, tim in enumerate(times):
                     time_stamp = str(tim).split('-')[0]+str(tim).split('-')[1]+str(tim).split('-')[2][:2]+'.'+str(tim).split('-')[2][3:5]+'0000\n'
                     file_out.write(time_stamp)
-                    for n in range(len(boundary.x())):
-                        file_out.write('FACTOR\n')
-                        file_out.write(format(self.factor,'1.0E')+'\n')
-                        S = boundary.spec(start_time=tim, end_time=tim, x=[n]).squeeze()
-
-			# SWAN uses m*m/Hz/deg normalization
-                        np.savetxt(file_out,S*np.pi/(180*self.factor), fmt='%-10.0f')
+                    file_out.write(time_step_fmt % tuple(day_spec[n].ravel().tolist()))
         return filename
@@ -82,7 +82,7 @@ class TopoPlotter(GridPlotter):
 
         # Plot locations of wind forcing data points
         if not plain and forcing is not None:
-            lonlat=forcing._point_list(mask=np.full(forcing.size()[1:], True))
+            lonlat=forcing._point_list()
             ax.plot(lonlat[:,0], lonlat[:,1],'r.', markersize=1.5, label=f"Forcing from {forcing.name()}")
 
         #ax.legend(loc="upper right")
@@ -152,7 +152,7 @@ class TopoPlotter(GridPlotter):
 
         # Plot locations of wind forcing data points
         if not plain and forcing is not None:
-            lonlat=forcing._point_list(mask=np.full(forcing.size()[1:], True))
+            lonlat=forcing._point_list()
             ax.plot(lonlat[:,0], lonlat[:,1],'r.', markersize=1.5, label=f"Forcing from {forcing.name()}")
 
         ax.legend(loc="upper right")
@@ -333,7 +333,7 @@ class OldTopoPlotter(GridPlotter):
 
         # Plot locations of wind forcing data points
         if not plain and forcing is not None:
-            lonlat=forcing._point_list(mask=np.full(forcing.size()[1:], True))
+            lonlat=forcing._point_list()
             ax.plot(lonlat[:,0], lonlat[:,1],'r.', markersize=1.5, label=f"Forcing from {forcing.name()}")
 
         ax.legend(loc="upper left")
@@ -402,7 +402,7 @@ class OldTopoPlotter(GridPlotter):
 
         # Plot locations of wind forcing data points
         if not plain and forcing is not None:
-            lonlat=forcing._point_list(mask=np.full(forcing.size()[1:], True))
+            lonlat=forcing._point_list()
             plt.plot(lonlat[:,0], lonlat[:,1],'r.', markersize=1.5, label=f"Forcing from {forcing.name()}")
 
         plt.legend(loc="upper right")
@@ -451,7 +451,7 @@ class MaskPlotter(GridPlotter):
 
         # Plot locations of wind forcing data points
         if not plain and forcing is not None:
-            lonlat=forcing._point_list(mask=np.full(forcing.size()[1:], True))
+            lonlat=forcing._point_list()
             plt.plot(lonlat[:,0], lonlat[:,1],'r.', markersize=1.5, label=f"Forcing from {forcing.name()}")
 
 
@@ -18,7 +18,8 @@ if TYPE_CHECKING:
 # Import default values and aux_funcsiliry functions
 from .. import msg
 from .. import file_module
-from ..aux_funcs import force_to_xyz, distance_2points, domain_size_in_km, set_spacing_dlon_dlat_fixed_edges, set_spacing_dlon_dlat_floating_edges, set_spacing_dx_dy, set_spacing_nx_ny
+from .. import aux_funcs
+from ..aux_funcs import force_to_xyz, xyz_to_matrix, point_list, iterate_point_list, distance_2points, domain_size_in_km, set_spacing_dlon_dlat_fixed_edges, set_spacing_dlon_dlat_floating_edges, set_spacing_dx_dy, set_spacing_nx_ny
 
 
 class Grid:
@@ -31,13 +32,65 @@ class Grid:
                     coords=coords_dict,
                     attrs=attr_dict
                     )
+        self._derived = {}
 
-    def import_topo(self, topo_reader: TopoReader) -> None:
-        """Reads the raw bathymetrical data."""
+    def import_topo(self, topo_reader: TopoReader, keep_matrix: bool=False,
+                    write_cache: bool=False, read_cache: bool=False) -> None:
+        """Reads the raw bathymetrical data.
+
+        The data is stored in xyz-format. Set keep_matrix=True to store data
+        that is given on a rectilinear lon/lat grid as a matrix instead. This
+        saves memory and lets e.g. the RegularGrid mesher skip the
+        triangulation.
+
+        The data read from the source can be cached in the folder topo_cache.
+        The cache is valid as long as the source files are unchanged, and
+        can also be used for smaller areas.
+        """
 
         msg.header(topo_reader, "Importing topography...")
         print(topo_reader)
-        topo, lon, lat = topo_reader(self.lon()[0], self.lon()[-1], self.lat()[0], self.lat()[-1])
+        bbox = (self.lon()[0], self.lon()[-1], self.lat()[0], self.lat()[-1])
+
+        topo = None
+        if write_cache or read_cache:
+            cache_key = topo_reader.cache_key()
+            if cache_key is None:
+                msg.warning(f"Can't cache topography from {type(topo_reader).__name__} since no source files were found.")
+                write_cache, read_cache = False, False
+            else:
+                cache_folder = aux_funcs.setup_topo_cache(type(topo_reader).__name__)
+                expansion_factor = getattr(topo_reader, 'expansion_factor', None)
+
+        if read_cache:
+            topo, lon, lat = aux_funcs.read_topo_cache(cache_folder, cache_key, bbox, expansion_factor)
+            if topo is not None:
+                msg.info('Reading topography from cache!!!')
+
+        if topo is None:
+            topo, lon, lat = topo_reader(*bbox)
+            if write_cache:
+                msg.info('Caching data:')
+                msg.to_file(aux_funcs.write_topo_cache(cache_folder, cache_key, bbox, topo, lon, lat, expansion_factor))
+
+        if keep_matrix:
+            matrix, matrix_lon, matrix_lat = xyz_to_matrix(topo, lon, lat)
+            if matrix is None:
+                msg.info('Topography is not rectilinear. Storing it in xyz-format.')
+            else:
+                topo, lon, lat = matrix.astype(float), matrix_lon, matrix_lat
+
+        if keep_matrix and len(topo.shape) > 1:
+            # Depth is positive, so set everything that is not positive to nan
+            topo[topo<=0]=np.nan
+            vars_dict = {'topo': (['lat', 'lon'], topo)}
+            coords_dict = {'lon': lon, 'lat': lat}
+            self.rawdata = xr.Dataset(
+                        coords=coords_dict,
+                        data_vars=vars_dict
+                        )
+            self._clear_derived()
+            return
 
         topo, lon, lat = force_to_xyz(topo, lon, lat)
 
@@ -51,21 +104,25 @@ class Grid:
                     coords=coords_dict,
                     data_vars=vars_dict
                     )
+        self._clear_derived()
 
     def process_topo(self, filt: GridProcessor=TrivialFilter()) -> None:
         """Processes the raw bathymetrical data, e.g. with a filter."""
 
         msg.header(filt, "Filtering topography...")
-        land_sea_mask = self.raw_topo() > 0 # Sea points set to true
+        land_sea_mask = self.raw_topo(view=True) > 0 # Sea points set to true
 
         print(filt)
-        topo = filt.topo(self.raw_topo(), self.raw_lon(), self.raw_lat(), land_sea_mask)
+        topo = filt.topo(self.raw_topo(), self.raw_lon(view=True), self.raw_lat(view=True), land_sea_mask)
 
         if topo is None:
             msg.warning('Filtering of raw topography is not implemented')
         else:
-            vars_dict = {'topo': (['points'], topo)}
+            if self.raw_topo_is_matrix():
+                topo = np.reshape(topo, self.rawdata.topo.shape)
+            vars_dict = {'topo': (self.rawdata.topo.dims, topo)}
             self.rawdata = self.rawdata.assign(vars_dict)
+            self._clear_derived()
 
     def mesh_grid(self, mesher: Mesher=Interpolate(method = 'linear')) -> None:
         """Meshes the raw data down to the grid definitions."""
@@ -75,10 +132,14 @@ class Grid:
             msg.header(mesher, "Meshing grid bathymetry...")
             print(mesher)
             lonQ, latQ = np.meshgrid(self.lon(), self.lat())
-            topo = mesher(self.raw_topo(), self.raw_lon(), self.raw_lat(), lonQ, latQ)
+            if self.raw_topo_is_matrix():
+                topo = mesher(copy(self.rawdata.topo.values), copy(self.rawdata.lon.values), copy(self.rawdata.lat.values), lonQ, latQ)
+            else:
+                topo = mesher(self.raw_topo(), self.raw_lon(), self.raw_lat(), lonQ, latQ)
 
             vars_dict = {'topo': (['lat', 'lon'], topo)}
             self.data = self.data.assign(vars_dict)
+            self._clear_derived()
 
             self._update_masks()
             print(self)
@@ -97,6 +158,7 @@ class Grid:
         else:
             vars_dict = {'topo': (['lat', 'lon'], topo)}
             self.data = self.data.assign(vars_dict)
+            self._clear_derived()
 
         msg.info('Upodating land-sea mask and boundary mask')
         self._update_masks()
@@ -110,11 +172,30 @@ class Grid:
         self.data = self.data.assign_attrs(attr_dict)
         coords_dict = {'lon': lon, 'lat': lat}
         self.data = self.data.assign_coords(coords_dict)
+        self._clear_derived()
 
         # Initialize the grid with an empty topography
         msg.info("Initializing with an empty topography")
-        self.import_topo(topo_reader=EmptyTopo(self))
-        self.mesh_grid(mesher=Interpolate(method='nearest'))
+        self._set_empty_topo()
+
+    def _set_empty_topo(self) -> None:
+        """Sets an empty topography (depth 9999) without meshing anything.
+
+        The raw topography is a read-only broadcast of a single value on the
+        grid points, so it takes no memory until someone actually uses it.
+        """
+        empty_topo = np.broadcast_to(np.array(9999.), self.size())
+        coords_dict = {'lon': self.lon(), 'lat': self.lat()}
+        vars_dict = {'topo': (['lat', 'lon'], empty_topo)}
+        self.rawdata = xr.Dataset(
+                    coords=coords_dict,
+                    data_vars=vars_dict
+                    )
+
+        vars_dict = {'topo': (['lat', 'lon'], np.full(self.size(), 9999.))}
+        self.data = self.data.assign(vars_dict)
+        self._clear_derived()
+        self._update_masks()
 
     def set_spacing(self, dlon: float=0, dlat: float=0, dm: float=0, nx: int=0, ny: int=0, floating_edge: bool=False) -> None:
         """Defines longitude and latitude vectors based on desired spacing.
@@ -182,53 +263,72 @@ class Grid:
 
         vars_dict = {'boundary_mask': (['lat', 'lon'], boundary_mask)}
         self.data = self.data.assign(vars_dict)
+        self._clear_derived()
 
-    def land_sea_mask(self) -> np.ndarray:
-        """Returns bool array of the land-sea mask (True = sea point)"""
+    def land_sea_mask(self, view: bool=False) -> np.ndarray:
+        """Returns bool array of the land-sea mask (True = sea point)
+
+        Set view=True to get a read-only view instead of a copy.
+        """
 
         if hasattr(self.data, 'land_sea_mask'):
-            return copy(self.data.land_sea_mask.values)
+            return self._copy_or_view(self.data.land_sea_mask.values, view)
         else:
             return np.full((self.ny(), self.nx()), True)
 
-    def boundary_mask(self) -> np.ndarray:
-        """Returns bool array of boundary points (True = boundary point)"""
+    def boundary_mask(self, view: bool=False) -> np.ndarray:
+        """Returns bool array of boundary points (True = boundary point)
+
+        Set view=True to get a read-only view instead of a copy.
+        """
 
         if hasattr(self.data, 'boundary_mask'):
-            return copy(self.data.boundary_mask.values)
+            return self._copy_or_view(self.data.boundary_mask.values, view)
         else:
             return np.full((self.ny(), self.nx()), False)
 
-    def boundary_points(self) -> np.ndarray:
+    def boundary_points(self, view: bool=False) -> np.ndarray:
         """Returns a lon, lat list of the set boundary points."""
 
-        if self.boundary_mask().size > 0:
-            mask = np.logical_and(self.boundary_mask(), self.land_sea_mask())
-            BOUND = self._point_list(mask)
-            return BOUND
+        if self.boundary_mask(view=True).size > 0:
+            BOUND = self._derived_quantity('boundary_points',
+                        lambda: self._point_list(np.logical_and(self.boundary_mask(view=True), self.land_sea_mask(view=True))))
+            return self._copy_or_view(BOUND, view)
         else:
             return np.array([])
 
-    def land_points(self) -> np.ndarray:
+    def land_points(self, view: bool=False) -> np.ndarray:
         """Returns a lon, lat list of land points."""
 
-        if self.boundary_mask().size > 0:
-            mask = np.logical_not(self.land_sea_mask())
-            LAND = self._point_list(mask)
-            return LAND
+        if self.boundary_mask(view=True).size > 0:
+            LAND = self._derived_quantity('land_points',
+                        lambda: self._point_list(np.logical_not(self.land_sea_mask(view=True))))
+            return self._copy_or_view(LAND, view)
         else:
             return np.array([])
 
-    def sea_points(self) -> np.ndarray:
+    def sea_points(self, view: bool=False) -> np.ndarray:
         """Returns a lon, lat list of sea points."""
 
-        if self.boundary_mask().size > 0:
-            mask = self.land_sea_mask()
-            land = self._point_list(mask)
-            return land
+        if self.boundary_mask(view=True).size > 0:
+            SEA = self._derived_quantity('sea_points',
+                        lambda: self._point_list(self.land_sea_mask(view=True)))
+            return self._copy_or_view(SEA, view)
         else:
             return np.array([])
 
+    def number_of_points(self) -> Tuple[int, int, int]:
+        """Returns the number of sea, land and boundary points (boundary
+        points on land are not counted)."""
+
+        def count_points():
+            sea_mask = self.land_sea_mask(view=True)
+            nsea = int(np.count_nonzero(sea_mask))
+            nbound = int(np.count_nonzero(np.logical_and(self.boundary_mask(view=True), sea_mask)))
+            return nsea, sea_mask.size - nsea, nbound
+
+        return self._derived_quantity('number_of_points', count_points)
+
     def name(self) -> str:
         """Return the name of the grid (set at initialization)."""
         return copy(self.data.name)
@@ -252,46 +352,56 @@ class Grid:
 
     def nx(self) -> int:
         """Return the number of points in longitude direction."""
-        return len(self.lon())
+        return len(self.data.lon)
 
     def ny(self) -> int:
         """Return the number of points in latitude direction."""
-        return len(self.lat())
+        return len(self.data.lat)
 
     def boundary_nx(self) -> int:
         """Return approximate number of grid points in the longitude direction
         """
-        abs_diff = np.abs(np.diff(np.where(self.boundary_mask())))
-        if abs_diff.size == 0:
+        abs_diff = self._boundary_step()
+        if abs_diff is None:
             return 0
-        abs_diff=np.median(abs_diff[abs_diff>0]).astype(int)
 
         return np.ceil(self.nx()/abs_diff+1).astype(int)
 
     def boundary_ny(self) -> int:
         """Return approximate number of grid points in the longitude direction
         """
-        abs_diff = np.abs(np.diff(np.where(self.boundary_mask())))
-        if abs_diff.size == 0:
+        abs_diff = self._boundary_step()
+        if abs_diff is None:
             return 0
-        abs_diff=np.median(abs_diff[abs_diff>0]).astype(int)
 
         return np.ceil(self.ny()/abs_diff+1).astype(int)
 
+    def _boundary_step(self) -> int:
+        """Typical index distance between the boundary points. None if no
+        boundary points are set."""
 
-    def lon(self) -> np.ndarray:
+        def step():
+            abs_diff = np.abs(np.diff(np.where(self.boundary_mask(view=True))))
+            if abs_diff.size == 0:
+                return None
+            return np.median(abs_diff[abs_diff>0]).astype(int)
+
+        return self._derived_quantity('boundary_step', step)
+
+
+    def lon(self, view: bool=False) -> np.ndarray:
         """Returns a longitude vector of the grid."""
-        return copy(self.data.lon.values)
+        return self._copy_or_view(self.data.lon.values, view)
 
-    def lat(self) -> np.ndarray:
+    def lat(self, view: bool=False) -> np.ndarray:
         """Returns a latitude vector of the grid."""
-        return copy(self.data.lat.values)
+        return self._copy_or_view(self.data.lat.values, view)
 
     def lon_edges(self) -> Tuple[float, float]:
-        return (np.min(self.lon()), np.max(self.lon()))
+        return self._derived_quantity('lon_edges', lambda: (np.min(self.lon(view=True)), np.max(self.lon(view=True))))
 
     def lat_edges(self) -> Tuple[float, float]:
-        return (np.min(self.lat()), np.max(self.lat()))
+        return self._derived_quantity('lat_edges', lambda: (np.min(self.lat(view=True)), np.max(self.lat(view=True))))
 
     def dlon(self) -> float:
         if hasattr(self.data, 'dlon'):
@@ -317,24 +427,38 @@ class Grid:
         else:
             return None
 
-    def raw_topo(self) -> np.ndarray:
+    def raw_topo_is_matrix(self) -> bool:
+        """True if the unmeshed topography is stored as a matrix."""
+        if hasattr(self, 'rawdata'):
+            return 'points' not in self.rawdata.topo.dims
+        return False
+
+    def _raw_xyz(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The unmeshed topography as xyz vectors. A matrix is converted only
+        once, and not at all if nobody asks for the xyz vectors."""
+        def to_xyz():
+            xyz = force_to_xyz(self.rawdata.topo.values, self.rawdata.lon.values, self.rawdata.lat.values)
+            return tuple([self._copy_or_view(array, view=True) for array in xyz])
+        return self._derived_quantity('raw_xyz', to_xyz)
+
+    def raw_topo(self, view: bool=False) -> np.ndarray:
         """Returns an array containing the unmeshed imported topography."""
         if hasattr(self, 'rawdata'):
-            return copy(self.rawdata.topo.values)
+            return self._copy_or_view(self._raw_xyz()[0], view)
         else:
             return np.array([])
 
-    def raw_lon(self) -> np.ndarray:
+    def raw_lon(self, view: bool=False) -> np.ndarray:
         """Returns a longitude vector of the unmeshed imported topography."""
         if hasattr(self, 'rawdata'):
-            return copy(self.rawdata.lon.values)
+            return self._copy_or_view(self._raw_xyz()[1], view)
         else:
             return np.array([])
 
-    def raw_lat(self) -> np.ndarray:
+    def raw_lat(self, view: bool=False) -> np.ndarray:
         """Returns a latitude vector of the unmeshed imported topography."""
         if hasattr(self, 'rawdata'):
-            return copy(self.rawdata.lat.values)
+            return self._copy_or_view(self._raw_xyz()[2], view)
         else:
             return np.array([])
 
@@ -377,6 +501,7 @@ class Grid:
             self.data = self.data.drop('land_sea_mask')
         if hasattr(self.data, 'boundary_mask'):
             self.data = self.data.drop('boundary_mask')
+        self._clear_derived()
         return
 
     def _set_land_sea_mask(self, land_sea_mask) -> None:
@@ -391,22 +516,50 @@ class Grid:
 
         vars_dict = {'land_sea_mask': (['lat', 'lon'], land_sea_mask)}
         self.data = self.data.assign(vars_dict)
+        self._clear_derived()
 
         return
 
-    def _point_list(self, mask=None):
+    def _derived_quantity(self, name: str, compute):
+        """Returns a quantity derived from the grid data.
+
+        The value is computed once and then reused until the grid is changed
+        by e.g. set_spacing, mesh_grid, process_grid or set_boundary. Arrays
+        are stored read-only.
+        """
+
+        if name not in self._derived:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._derived[name] = value
+        return self._derived[name]
+
+    def _clear_derived(self) -> None:
+        """Forgets all derived quantities. Called whenever the data changes."""
+        self._derived = {}
+
+    @staticmethod
+    def _copy_or_view(array: np.ndarray, view: bool) -> np.ndarray:
+        """Returns a copy of the array, or a read-only view if view=True."""
+        if not view:
+            return copy(array)
+        array = array.view()
+        array.flags.writeable = False
+        return array
+
+    def _point_list(self, mask=None, lazy: bool=False, chunksize: int=100000):
         """Provides a list on longitudes and latitudes with a given mask.
 
         Used to e.g. generate list of boundary points or land points.
-        """
 
-        if mask is None:
-            mask = np.ones(self.size(), dtype=bool)
-        meshlon, meshlat=np.meshgrid(self.lon(),self.lat())
-        lonlat_flat = np.column_stack((meshlon.ravel(),meshlat.ravel()))
-        mask_flat = mask.ravel()
+        Set lazy=True to get an iterator over blocks of at most chunksize
+        points instead of one array.
+        """
 
-        return lonlat_flat[mask_flat]
+        if lazy:
+            return iterate_point_list(self.lon(view=True), self.lat(view=True), mask, chunksize=chunksize)
+        return point_list(self.lon(view=True), self.lat(view=True), mask)
 
     def write_status(self, filename='', folder='') -> None:
         """Writes out the status of the grid to a file."""
@@ -428,12 +581,12 @@ class Grid:
     def __str__(self) -> str:
         """Prints status of the grid."""
 
-        if self.topo().shape==(0,):
-            empty_topo = True
-        elif np.mean(self.topo()[self.land_sea_mask()]) == 9999:
+        topo = self.topo()
+        if topo.shape==(0,):
             empty_topo = True
         else:
-            empty_topo = False
+            sea_topo = topo[self.land_sea_mask(view=True)]
+            empty_topo = np.mean(sea_topo) == 9999
 
         msg.header(self, f"Status of grid {self.name()}")
         msg.plain(f'lon: {self.lon()[0]} - {self.lon()[-1]}, lat: {self.lat()[0]} - {self.lat()[-1]}')
@@ -449,19 +602,20 @@ class Grid:
         if self.nx() is not None:
             msg.plain(f'nx, ny = {self.nx()} x {self.ny()} grid points')
 
-        if self.topo().size > 0 and (not empty_topo):
-            msg.plain(f"Mean depth: {np.mean(self.topo()[self.land_sea_mask()]):.1f} m")
-            msg.plain(f"Max depth: {np.max(self.topo()[self.land_sea_mask()]):.1f} m")
-            msg.plain(f"Min depth: {np.min(self.topo()[self.land_sea_mask()]):.1f} m")
+        if topo.size > 0 and (not empty_topo):
+            msg.plain(f"Mean depth: {np.mean(sea_topo):.1f} m")
+            msg.plain(f"Max depth: {np.max(sea_topo):.1f} m")
+            msg.plain(f"Min depth: {np.min(sea_topo):.1f} m")
 
-        if self.land_sea_mask().size > 0:
+        nsea, nland, nbound = self.number_of_points()
+        if self.land_sea_mask(view=True).size > 0:
             msg.print_line()
             msg.plain('Grid contains:')
-            msg.plain(f'{sum(sum(self.land_sea_mask())):d} sea points')
-            msg.plain(f'{sum(sum(np.logical_not(self.land_sea_mask()))):d} land points')
+            msg.plain(f'{nsea:d} sea points')
+            msg.plain(f'{nland:d} land points')
 
-        if self.boundary_mask().size > 0:
-            msg.plain(f'{sum(sum(np.logical_and(self.boundary_mask(), self.land_sea_mask()))):d} boundary points')
+        if self.boundary_mask(view=True).size > 0:
+            msg.plain(f'{nbound:d} boundary points')
 
         msg.print_line()
 
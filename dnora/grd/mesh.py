@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from copy import copy
 import numpy as np
-from scipy.interpolate import griddata
+from scipy.interpolate import griddata, RegularGridInterpolator
+from scipy.ndimage import distance_transform_edt
+from ..aux_funcs import force_to_xyz, xyz_to_matrix
 
 class Mesher(ABC):
     """Abstract class for meshing the bathymetrical data to the grid."""
@@ -17,6 +19,9 @@ class Mesher(ABC):
         data, lon, lat = 1D np.arrays of same length (depth >0, other is nan)
         lonQ, latQ = 2D np.arrays of desired grid size
 
+        If the Grid-object keeps the raw data in matrix form, data is instead
+        a 2D np.array (lat, lon) and lon, lat are the vectors of the matrix.
+
         The returned array should have the dimensions and orientation:
 
         rows = latitude and colums = longitude
@@ -51,6 +56,7 @@ class Interpolate(Mesher):
 
     def __call__(self, data, lon, lat, lonQ, latQ):
         #lon0, lat0 = np.meshgrid(lon, lat)
+        data, lon, lat = force_to_xyz(data, lon, lat)
         data[np.logical_not(data>0)] = 0 # Keeping land points as nan lets the shoreline creep out
         #M = np.column_stack((data.ravel(), lon0.ravel(),lat0.ravel()))
         M = np.column_stack((data, lon, lat))
@@ -61,6 +67,161 @@ class Interpolate(Mesher):
     def __str__(self):
         return(f"Meshing using {self.method} interpolation.")
 
+class RegularGrid(Mesher):
+    """Interpolates rectilinear data to the grid without triangulating it.
+
+    Much faster than Interpolate for data given on a regular lon/lat grid
+    (e.g. EMODNET or GEBCO). xyz-data that is not rectilinear is meshed using
+    Interpolate with the same method.
+
+    method: 'linear' (bilinear), 'nearest' or 'average'. 'average' takes the
+    mean of the raw data in each grid cell, and is meant for when the grid
+    is coarser than the data.
+    """
+
+    def __init__(self, method: str='linear') -> None:
+        self.method = method
+
+        return
+
+    def __call__(self, data, lon, lat, lonQ, latQ):
+        matrix, lon_vec, lat_vec = xyz_to_matrix(data, lon, lat)
+        if matrix is None:
+            if self.method == 'average':
+                return Interpolate(method='linear')(data, lon, lat, lonQ, latQ)
+            return Interpolate(method=self.method)(data, lon, lat, lonQ, latQ)
+
+        matrix = copy(matrix)
+        matrix[np.logical_not(matrix>0)] = 0 # Keeping land points as nan lets the shoreline creep out
+
+        # Interpolation needs increasing coordinates
+        if len(lon_vec) > 1 and lon_vec[0] > lon_vec[-1]:
+            lon_vec, matrix = lon_vec[::-1], matrix[:,::-1]
+        if len(lat_vec) > 1 and lat_vec[0] > lat_vec[-1]:
+            lat_vec, matrix = lat_vec[::-1], matrix[::-1,:]
+
+        if self.method == 'average':
+            meshed_data = block_average(matrix, lon_vec, lat_vec, lonQ[0,:], latQ[:,0])
+            empty_cells = np.isnan(meshed_data)
+            if np.any(empty_cells):
+                meshed_data[empty_cells] = self._interpolate(matrix, lon_vec, lat_vec, lonQ[empty_cells], latQ[empty_cells], 'nearest')
+            return meshed_data
+
+        return self._interpolate(matrix, lon_vec, lat_vec, lonQ, latQ, self.method)
+
+    @staticmethod
+    def _interpolate(matrix, lon, lat, lonQ, latQ, method):
+        # RegularGridInterpolator needs two points in every dimension
+        if len(lon) == 1:
+            matrix, lon = np.repeat(matrix, 2, axis=1), np.array([lon[0], lon[0]+1])
+        if len(lat) == 1:
+            matrix, lat = np.repeat(matrix, 2, axis=0), np.array([lat[0], lat[0]+1])
+        interpolator = RegularGridInterpolator((lat, lon), matrix, method=method,
+                                                bounds_error=False, fill_value=np.nan)
+        return interpolator((latQ, lonQ))
+
+    def __str__(self):
+        return(f"Meshing using {self.method} regular grid interpolation.")
+
+class BlockAverage(Mesher):
+    """Bins the raw data points into the grid cells and takes the mean,
+    median or min of every cell.
+
+    Meant for grids that are much coarser than the raw data, since the grid
+    depth then represents the whole cell instead of one point. The cost is
+    roughly linear in the number of raw data points. Cells without data are
+    given the value of the nearest cell with data.
+    """
+
+    def __init__(self, statistic: str='mean') -> None:
+        if statistic not in ['mean', 'median', 'min']:
+            raise ValueError(f"statistic must be 'mean', 'median' or 'min', not '{statistic}'")
+        self.statistic = statistic
+
+        return
+
+    def __call__(self, data, lon, lat, lonQ, latQ):
+        data, lon, lat = force_to_xyz(data, lon, lat)
+        data = copy(data)
+        data[np.logical_not(data>0)] = 0 # Keeping land points as nan lets the shoreline creep out
+
+        ny, nx = lonQ.shape
+        cols = cell_index(lon, lonQ[0,:])
+        rows = cell_index(lat, latQ[:,0])
+        inside = np.logical_and(cols>=0, rows>=0)
+        cells = rows[inside]*nx + cols[inside]
+        data = data[inside]
+
+        meshed_data = np.full(ny*nx, np.nan)
+        if self.statistic == 'mean':
+            counts = np.bincount(cells, minlength=ny*nx)
+            sums = np.bincount(cells, weights=data, minlength=ny*nx)
+            has_data = counts > 0
+            meshed_data[has_data] = sums[has_data]/counts[has_data]
+        else:
+            # Sort by cell and then by value within every cell
+            order = np.lexsort((data, cells))
+            cells, data = cells[order], data[order]
+            used_cells, starts, counts = np.unique(cells, return_index=True, return_counts=True)
+            if self.statistic == 'min':
+                meshed_data[used_cells] = data[starts]
+            else:
+                meshed_data[used_cells] = (data[starts+(counts-1)//2] + data[starts+counts//2])/2
+
+        meshed_data = meshed_data.reshape(ny, nx)
+        empty_cells = np.isnan(meshed_data)
+        if np.all(empty_cells):
+            return meshed_data
+        if np.any(empty_cells):
+            # Distances in (approximately) the same units in both directions
+            dlon = np.median(np.diff(lonQ[0,:]))*np.cos(np.deg2rad(np.mean(latQ))) if nx > 1 else 1.
+            dlat = np.median(np.diff(latQ[:,0])) if ny > 1 else 1.
+            __, (i, j) = distance_transform_edt(empty_cells, sampling=(dlat, dlon), return_indices=True)
+            meshed_data = meshed_data[i, j]
+
+        return meshed_data
+
+    def __str__(self):
+        return(f"Meshing using the {self.statistic} of the data in every grid cell.")
+
+def cell_index(coord: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Index of the grid cell (defined by increasing cell centers) that
+    every coordinate falls into. Coordinates outside the cells get -1."""
+    if len(centers) > 1:
+        edges = np.concatenate(([centers[0]-(centers[1]-centers[0])/2],
+                                (centers[1:]+centers[:-1])/2,
+                                [centers[-1]+(centers[-1]-centers[-2])/2]))
+    else:
+        edges = np.array([-np.inf, np.inf])
+    inds = np.searchsorted(edges, coord, side='right') - 1
+    inds[np.logical_or(inds < 0, inds >= len(centers))] = -1
+    return inds
+
+def block_average(matrix, lon, lat, lon_grid, lat_grid) -> np.ndarray:
+    """Averages a matrix (lat, lon) with increasing coordinates in the cells
+    of a coarser grid, one dimension at a time. Empty cells are set to nan."""
+    sums = np.zeros((len(lat_grid), len(lon_grid)))
+    counts = np.zeros((len(lat_grid), len(lon_grid)))
+
+    cols = cell_index(lon, lon_grid)
+    rows = cell_index(lat, lat_grid)
+    matrix = matrix[rows>=0,:][:,cols>=0]
+    cols, rows = cols[cols>=0], rows[rows>=0]
+    if matrix.size == 0:
+        return np.full((len(lat_grid), len(lon_grid)), np.nan)
+
+    # Cell indeces are increasing, so every cell is a contiguous block
+    used_cols, col_starts = np.unique(cols, return_index=True)
+    used_rows, row_starts = np.unique(rows, return_index=True)
+    block_sums = np.add.reduceat(np.add.reduceat(matrix, col_starts, axis=1), row_starts, axis=0)
+    block_counts = np.outer(np.diff(np.append(row_starts, len(rows))), np.diff(np.append(col_starts, len(cols))))
+
+    sums[np.ix_(used_rows, used_cols)] = block_sums
+    counts[np.ix_(used_rows, used_cols)] = block_counts
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums/counts
+
 class Constant(Mesher):
     """Sets a constant depth values"""
 
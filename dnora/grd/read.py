@@ -3,6 +3,9 @@ from __future__ import annotations
 import xarray as xr
 import pandas as pd
 import utm
+import glob
+import os
+import hashlib
 from copy import copy
 from abc import ABC, abstractmethod
 import numpy as np
@@ -10,7 +13,7 @@ from typing import Tuple, TYPE_CHECKING
 if TYPE_CHECKING:
     from .grd_mod import Grid
 # Import aux_funcsiliry functions
-from ..aux_funcs import expand_area
+from ..aux_funcs import expand_area, map_concurrently
 import warnings
 from .. import msg
 
@@ -53,6 +56,27 @@ class TopoReader(ABC):
         """
         return topo, topo_lon, topo_lat
 
+    def cache_key(self) -> str:
+        """Identifies the data read by the reader for the topography cache.
+
+        The key is determined by the type and settings of the reader, and the
+        modification times and sizes of the source files (given in the
+        attribute 'source' or 'filename', possibly as a glob pattern).
+
+        Returns None if no source files are found, and the data can then not
+        be cached.
+        """
+        files = []
+        for attr in ['source', 'filename']:
+            if isinstance(getattr(self, attr, None), str):
+                files += sorted(glob.glob(getattr(self, attr)))
+        if not files:
+            return None
+
+        settings = sorted([(key, val) for key, val in vars(self).items() if isinstance(val, (str, int, float, bool))])
+        file_info = [(f, os.path.getmtime(f), os.path.getsize(f)) for f in files]
+        return hashlib.sha1(repr((type(self).__name__, settings, file_info)).encode()).hexdigest()
+
     @abstractmethod
     def __str__(self):
         """Describes what topography is read and from where.
@@ -121,15 +145,22 @@ class KartverketNo50m(TopoReader):
         https://kartkatalog.geonorge.no/metadata/dybdedata-terrengmodeller-50-meters-grid-landsdekkende/bbd687d0-d34f-4d95-9e60-27e330e0f76e
 
         For reading several files at once, supply the 'tile' argument with a glob pattern, e.g. 'B*'.
+        The files are then read in max_workers parallel threads.
+
+        Files are read chunksize lines at a time, and only the points inside
+        the area (in UTM-coordinates) are kept.
 
         Contributed by: https://github.com/emiliebyer
         """
 
     def __init__(self, expansion_factor: float=1.2, utmzone: int=33,
-                 tile: str='B1008', folder: str='/lustre/storeB/project/fou/om/WW3/bathy/kartverket_50m_x_50m') -> Tuple:
+                 tile: str='B1008', folder: str='/lustre/storeB/project/fou/om/WW3/bathy/kartverket_50m_x_50m',
+                 max_workers: int=1, chunksize: int=1000000) -> Tuple:
         self.source=f'{folder}/{tile}_grid50_utm33.xyz'
         self.expansion_factor = expansion_factor
         self.utmzone = utmzone
+        self.max_workers = max_workers
+        self.chunksize = chunksize
 
         return
 
@@ -140,46 +171,42 @@ class KartverketNo50m(TopoReader):
 
         print(f'Expansion factor: {self.expansion_factor}')
 
-        import dask.dataframe as dd
-        df = dd.read_csv(self.source, sep= ' ', header=None)
-        df.columns = ['x','y','z']
-        x = np.array(df['x'].astype(float))
-        y = np.array(df['y'].astype(float))
-        z = np.array(df['z'].astype(float))
+        utm_bbox = self._utm_bbox(lon0, lon1, lat0, lat1)
+        files = sorted(glob.glob(self.source))
+        if not files:
+            raise ValueError(f"No Kartverket tiles found matching {self.source}!")
+        xyz = map_concurrently(lambda f: self._read_tile(f, utm_bbox), files, max_workers=self.max_workers)
+        x, y, z = np.concatenate(xyz, axis=1)
 
-        # Converting from utm to latitude and longitude
-        lat, lon = utm.to_latlon(x, y, self.utmzone, northern=True, strict=False)
+        mask = np.full(len(x), False)
+        if len(x) > 0:
+            # Converting from utm to latitude and longitude
+            lat, lon = utm.to_latlon(x, y, self.utmzone, northern=True, strict=False)
 
-        # Applying given max and min values for lat and lon
-        mask_lat = np.logical_and(lat0 <= lat, lat <= lat1)
-        mask_lon = np.logical_and(lon0 <= lon, lon <= lon1)
-        mask = np.logical_and(mask_lat, mask_lon)
+            # Applying given max and min values for lat and lon
+            mask_lat = np.logical_and(lat0 <= lat, lat <= lat1)
+            mask_lon = np.logical_and(lon0 <= lon, lon <= lon1)
+            mask = np.logical_and(mask_lat, mask_lon)
+
+        if not np.any(mask):
+            raise ValueError(f"No Kartverket data in {self.source} inside lon ({lon0:.3f}, {lon1:.3f}), lat ({lat0:.3f}, {lat1:.3f})!")
 
-        #topo_lon = lon[mask]
         x = x[mask]
         y = y[mask]
         topo = z[mask]
 
-        # Adding NaN values for land area
-        x_grid = np.unique(x) #np.arange(min(x), max(x), 50)
-        y_grid = np.unique(y) #np.arange(min(y), max(y), 50)
-        grid = np.empty((len(y_grid),len(x_grid)))
-        grid[:] = np.nan
-
-        # Adding depth values for all defined points, leaving the rest as NaN
-        for i in range(len(topo)):
-            xpos = np.where(x_grid==x[i])[0][0]
-            ypos = np.where(y_grid==y[i])[0][0]
-            grid[ypos][xpos] = topo[i]
+        # Adding depth values for all defined points, leaving the rest (land) as NaN
+        x_grid, xpos = np.unique(x, return_inverse=True)
+        y_grid, ypos = np.unique(y, return_inverse=True)
+        grid = np.full((len(y_grid),len(x_grid)), np.nan)
+        grid[ypos, xpos] = topo
 
-        # Converting grid back to list of points usind Pandas
-        df = pd.DataFrame(grid)
-        df = df.unstack().reset_index()
-        df['x'] = [x_grid[i] for i in df['level_0']]
-        df['y'] = [y_grid[i] for i in df['level_1']]
+        # Converting grid back to list of points (x changing slowest)
+        x = np.repeat(x_grid, len(y_grid))
+        y = np.tile(y_grid, len(x_grid))
+        topo = grid.T.ravel()
 
-        topo_lat, topo_lon = utm.to_latlon(df['x'], df['y'], 33, northern=True, strict = False)
-        topo = df[0]
+        topo_lat, topo_lon = utm.to_latlon(x, y, self.utmzone, northern=True, strict = False)
 
         # Masking again to get rid of additional values
         mask_lat = np.logical_and(lat0 < topo_lat, topo_lat < lat1)
@@ -190,9 +217,35 @@ class KartverketNo50m(TopoReader):
         topo_lon = topo_lon[mask]
         topo = topo[mask]
 
-
         return topo, topo_lon, topo_lat
 
+    def _utm_bbox(self, lon0: float, lon1: float, lat0: float, lat1: float) -> Tuple[float, float, float, float]:
+        """UTM bounding box that contains the lon-lat area.
+
+        The edges of the area are not straight lines in UTM, so points along
+        the edges are used. A margin of a few grid points is added.
+        """
+        edge_lon = np.concatenate([np.linspace(lon0, lon1, 50), np.full(50, lon1), np.linspace(lon0, lon1, 50), np.full(50, lon0)])
+        edge_lat = np.concatenate([np.full(50, lat0), np.linspace(lat0, lat1, 50), np.full(50, lat1), np.linspace(lat0, lat1, 50)])
+        x, y, __, __ = utm.from_latlon(edge_lat, edge_lon, force_zone_number=self.utmzone, force_northern=True)
+        margin = 200.
+        return np.min(x)-margin, np.max(x)+margin, np.min(y)-margin, np.max(y)+margin
+
+    def _read_tile(self, filename: str, utm_bbox: Tuple[float, float, float, float]) -> np.ndarray:
+        """Reads the points of one xyz-file that are inside the UTM bounding
+        box, chunksize lines at a time."""
+        x0, x1, y0, y1 = utm_bbox
+        xyz = []
+        for chunk in pd.read_csv(filename, sep=' ', header=None, dtype=float, chunksize=self.chunksize):
+            chunk = chunk.values
+            inside = np.logical_and(np.logical_and(x0 <= chunk[:,0], chunk[:,0] <= x1),
+                                    np.logical_and(y0 <= chunk[:,1], chunk[:,1] <= y1))
+            xyz.append(chunk[inside,:3])
+
+        if not xyz:
+            return np.zeros((3,0))
+        return np.concatenate(xyz).T
+
     def __str__(self):
         return(f"Reading Kartverket topography from {self.source}.")
 
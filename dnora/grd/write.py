@@ -3,6 +3,7 @@ from __future__ import annotations # For TYPE_CHECKING
 import numpy as np
 from copy import copy
 from abc import ABC, abstractmethod
+from pathlib import Path
 import utm
 
 # Import objects
@@ -51,14 +52,16 @@ class BoundaryPoints(GridWriter):
     def __call__(self, grid: Grid, filename: str) -> Tuple:
         output_file = file_module.clean(filename, list_of_placeholders)
 
+        boundary_points = grid.boundary_points()
         with open(output_file,'w') as f:
             if self.include_index and hasattr(grid, 'boundary_inds'):
-                for n in range(len(grid.boundary_points())):
+                boundary_inds = grid.boundary_inds()
+                for n in range(len(boundary_points)):
                     # Going from python 0-indexing to node 1-indexing
-                    f.write(f'{grid.boundary_inds()[n]+1:.0f} {grid.boundary_points()[n,0]:13.10f} {grid.boundary_points()[n,1]:13.10f}\n')
+                    f.write(f'{boundary_inds[n]+1:.0f} {boundary_points[n,0]:13.10f} {boundary_points[n,1]:13.10f}\n')
             else:
-                for n in range(len(grid.boundary_points())):
-                    f.write(f'{grid.boundary_points()[n,0]:13.10f} {grid.boundary_points()[n,1]:13.10f}\n')
+                for n in range(len(boundary_points)):
+                    f.write(f'{boundary_points[n,0]:13.10f} {boundary_points[n,1]:13.10f}\n')
         print(output_file)
         return output_file
 
@@ -135,10 +138,15 @@ class SWAN(GridWriter):
         return filename
 
 class Xyz(GridWriter):
-    """Writes the grid to Xyz-format."""
-    def __init__(self, use_raw=False, utm=False):
+    """Writes the grid to Xyz-format.
+
+    Set binary='npy' or binary='raw' to also write the (x, y, z) columns to a
+    .npy-file or a raw float32 .bin-file.
+    """
+    def __init__(self, use_raw=False, utm=False, binary=None):
         self._use_raw = use_raw
         self._utm = utm
+        self._binary = check_binary_option(binary)
         pass
 
     def _extension(self):
@@ -147,35 +155,43 @@ class Xyz(GridWriter):
     def __call__(self, grid: Grid, filename: str) -> None:
 
         if self._use_raw:
-            z = grid.raw_topo();
+            # The raw topography is already given as points
+            z = grid.raw_topo()
             x = grid.raw_lon()
             y = grid.raw_lat()
         else:
-            z = grid.topo();
-            x = grid.lon()
-            y = grid.lat()
+            # Longitude is the outer loop
+            z = grid.topo().T.ravel()
+            x = np.repeat(grid.lon(), grid.ny())
+            y = np.tile(grid.lat(), grid.nx())
+
+        mask = ~np.isnan(z)
+        x, y, z = x[mask], y[mask], z[mask]
+
+        if self._utm:
+            x, y, __, __ = utm.from_latlon(y, x, 33, 'W')
+            fmt='%.4f'
+        else:
+            fmt='%.9f'
 
+        data = np.column_stack([x, y, z])
         with open(filename, 'w') as f:
             f.write(f'{filename}\n')
-            for nx, lon in enumerate(x):
-                for ny, lat in enumerate(y):
-                    if self._utm:
-                        [lon_out, lat_out, utm_zone, utm_letter] = utm.from_latlon(lat, lon, 33, 'W')
-                        fmt='.4f'
-                    else:
-                        lon_out=lon
-                        lat_out=lat
-                        fmt='.9f'
-                    if ~np.isnan(z[ny,nx]):
-                        f.write(f'{lon_out:{fmt}},{lat_out:{fmt}},{z[ny,nx]:.1f}\n')
-
+            write_rows(f, data, f'{fmt},{fmt},%.1f\n')
 
+        if self._binary is not None:
+            return [filename, write_binary(filename, data, self._binary)]
         return filename
 
 class REEF3D(GridWriter):
-    """Writes the grid to Xyz-format in relative Cartesian grid."""
-    def __init__(self, use_raw=False):
+    """Writes the grid to Xyz-format in relative Cartesian grid.
+
+    Set binary='npy' or binary='raw' to also write the (x, y, z) columns to a
+    .npy-file or a raw float32 .bin-file.
+    """
+    def __init__(self, use_raw=False, binary=None):
         self._use_raw = use_raw
+        self._binary = check_binary_option(binary)
         pass
 
     def _extension(self):
@@ -199,10 +215,33 @@ class REEF3D(GridWriter):
         z = -1*z +np.nanmax(z)# set at zero the maximum depth.
         z[np.isnan(z)] = np.nanmax(z) + 14 # + 14 for land points
 
-        fmt='.5f'
+        data = np.column_stack([x, y, z])
         with open(filename, 'w') as f:
-            for i, __ in enumerate(x):
-                f.write(f'{x[i]:{fmt}} {y[i]:{fmt}} {z[i]:.1f}\n')
-
+            write_rows(f, data, '%.5f %.5f %.1f\n')
 
+        if self._binary is not None:
+            return [filename, write_binary(filename, data, self._binary)]
         return filename
+
+def check_binary_option(binary: str) -> str:
+    if binary not in [None, 'npy', 'raw']:
+        raise ValueError(f"binary should be None, 'npy' or 'raw', not '{binary}'!")
+    return binary
+
+def write_rows(f, data: np.ndarray, fmt: str, block_size: int=100000) -> None:
+    """Writes the rows of the array to the open file using the %-format of
+    one row. The rows are formatted and written block_size at a time."""
+    for n in range(0, len(data), block_size):
+        block = data[n:n+block_size]
+        f.write((fmt*len(block)) % tuple(block.ravel().tolist()))
+
+def write_binary(filename: str, data: np.ndarray, binary: str) -> str:
+    """Writes the data next to the text file, either as a .npy-file or as
+    raw float32 values (.bin). Returns the name of the binary file."""
+    if binary == 'npy':
+        binary_file = str(Path(filename).with_suffix('.npy'))
+        np.save(binary_file, data)
+    else:
+        binary_file = str(Path(filename).with_suffix('.bin'))
+        data.astype(np.float32).tofile(binary_file)
+    return binary_file
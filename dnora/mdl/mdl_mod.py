@@ -32,7 +32,7 @@ from ..file_module import FileNames
 from typing import Union
 # Import default values and aux_funcsiliry functions
 from .. import msg
-from ..bnd.process import processor_for_convention_change
+from ..bnd.process import processor_for_convention_change, ConventionChange
 
 from .. import file_module
 from ..converters import convert_swash_mat_to_netcdf
@@ -56,7 +56,9 @@ class ModelRun:
                         dry_run: bool=False,
                         write_cache: bool=False,
                         read_cache: bool=False,
-                        cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1') -> None:
+                        cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1',
+                        cache_format: str='nc',
+                        lazy: bool=False) -> None:
         """Creates a Boundary-object and imports boundary spectra."""
 
         self._dry_run = dry_run
@@ -80,7 +82,9 @@ class ModelRun:
                                             point_picker=self._point_picker,
                                             write_cache=write_cache,
                                             read_cache=read_cache,
-                                            cache_name=cache_name)
+                                            cache_name=cache_name,
+                                            cache_format=cache_format,
+                                            lazy=lazy)
         else:
             msg.info('Dry run! No boundary spectra will be imported.')
 
@@ -89,7 +93,9 @@ class ModelRun:
                         expansion_factor: float=1.2,
                         write_cache: bool=False,
                         read_cache: bool=False,
-                        cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1') -> None:
+                        cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1',
+                        cache_format: str='nc',
+                        lazy: bool=False) -> None:
         """Creates a Forcing-objects and imports forcing data."""
         self._dry_run = dry_run
 
@@ -110,7 +116,9 @@ class ModelRun:
                                         expansion_factor=expansion_factor,
                                         read_cache=read_cache,
                                         write_cache=write_cache,
-                                        cache_name=cache_name)
+                                        cache_name=cache_name,
+                                        cache_format=cache_format,
+                                        lazy=lazy)
         else:
             msg.info('Dry run! No forcing will be imported.')
 
@@ -198,6 +206,12 @@ class ModelRun:
             boundary_processor = processor_for_convention_change(
                                 current_convention = self.boundary().convention(),
                                 wanted_convention = self._boundary_writer._convention())
+            if boundary_processor is not None:
+                # Apply the whole chain as one reordering of the directions
+                boundary_processor = ConventionChange(
+                                current_convention = self.boundary().convention(),
+                                wanted_convention = self._boundary_writer._convention(),
+                                inplace = True)
 
         if boundary_processor is None:
             msg.info(f"Convention ({self.boundary().convention()}) already equals wanted convention ({self._boundary_writer._convention()}).")
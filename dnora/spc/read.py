@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import Tuple
 from copy import copy
 from ..bnd.bnd_mod import Boundary
+from ..aux_funcs import integrate_directions, map_concurrently
 import numpy as np
 class SpectralReader(ABC):
     """Reads boundary spectra from some source and provide it to the object."""
@@ -52,9 +53,16 @@ class SpectralReader(ABC):
         return time, freq, spec, mdir, spr, lon, lat, source
 
 class BoundaryToSpectra(SpectralReader):
-    """Integrates boundary spectra to omnidairectional spectra"""
-    def __init__(self, boundary: Boundary) -> None:
+    """Integrates boundary spectra to omnidairectional spectra
+
+    The integration is done chunk_size time steps at a time (all at once if
+    None), so that only one chunk of the directional spectra is in memory.
+    The chunks can be integrated in max_workers threads.
+    """
+    def __init__(self, boundary: Boundary, chunk_size: int=None, max_workers: int=1) -> None:
         self._boundary = copy(boundary)
+        self.chunk_size = copy(chunk_size)
+        self.max_workers = copy(max_workers)
 
     def convention(self):
         if self._boundary._convention == 'Met':
@@ -69,31 +77,25 @@ class BoundaryToSpectra(SpectralReader):
         self.name = self._boundary.data.name
         source = self._boundary.data.source
 
-        time = self._boundary.data.sel(time=slice(start_time, end_time)).time.values
+        efth = self._boundary.data.sel(time=slice(start_time, end_time), x=inds).spec.transpose('time', 'x', 'freq', 'dirs')
+        time = efth.time.values
         lon = self._boundary.data.lon.values
         lat = self._boundary.data.lat.values
 
         freq = self._boundary.data.freq.values
-        theta = np.deg2rad(self._boundary.data.dirs)
-        dD = 360/len(self._boundary.data.dirs)
-        # Normalizing here so that integration over direction becomes summing
-        efth = self._boundary.data.sel(time=slice(start_time, end_time), x=inds).spec*dD*np.pi/180
-        ef = efth.sum(dim='dirs')
-        eth = efth.integrate(coord='freq')
-        # m0 = ef.integrate(coord='freq')
-
-        # b1 = np.sin(theta)*efth  # Function of theta and frequency
-        # a1 = np.cos(theta)*efth
-        # thetam = np.arctan2(b1.sum(dim='dirs'),a1.sum(dim='dirs')) # Function of frequency
-        # spr = np.sqrt(2*np.sin(0.5*(thetam-theta))**2*eth).sum(dim='dirs').values*180/np.pi
-
-        b1 = ((np.sin(theta)*efth).sum(dim='dirs'))/ef  # Function of frequency
-        a1 = ((np.cos(theta)*efth).sum(dim='dirs'))/ef
-        thetam = np.arctan2(b1,a1)
-        m1 = np.sqrt(b1**2+a1**2)
-        spr = np.sqrt(2-2*(m1)).values*180/np.pi
-
-        mdir = np.mod(thetam.values*180/np.pi, 360)
-        spec = ef.values
+        dirs = self._boundary.data.dirs.values
+
+        # Keep e.g. float32 spectra as float32
+        dtype = efth.dtype if np.issubdtype(efth.dtype, np.floating) else float
+        spec = np.empty(efth.shape[:-1], dtype=dtype)
+        mdir = np.empty(efth.shape[:-1], dtype=dtype)
+        spr = np.empty(efth.shape[:-1], dtype=dtype)
+
+        chunk_size = self.chunk_size or max(len(time), 1)
+        def integrate_chunk(n: int) -> None:
+            chunk = slice(n, n+chunk_size)
+            spec[chunk], mdir[chunk], spr[chunk] = integrate_directions(efth[chunk].values, dirs)
+
+        map_concurrently(integrate_chunk, range(0, len(time), chunk_size), max_workers=self.max_workers)
 
         return time, freq, spec, mdir, spr, lon, lat, source
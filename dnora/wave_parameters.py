@@ -43,8 +43,19 @@ class WaveParameter(ABC):
     def standard_name(self) -> str:
         pass
 
-    def _is_boundary(self, spec: xr.Dataset) -> bool:
-        return 'dirs' in list(spec.coords)
+    def _moments(self) -> List[float]:
+        """The spectral moments needed by _from_moments()."""
+        return []
+
+    def _directional(self) -> bool:
+        """True if _from_moments() needs the directional moments a1, b1."""
+        return False
+
+    def _from_moments(self, moments: xr.Dataset) -> xr.DataArray:
+        """Calculates the parameter from the Dataset given by
+        spectral_moments(). Return None if this is not possible, and the
+        parameter is then calculated by calling it with the spectra."""
+        return None
 
     def _format_dataset(self, wave_parameter: xr.Dataset, spec: xr.Dataset, data_var=None) -> xr.Dataset:
         if data_var is None:
@@ -76,15 +87,13 @@ class Moment(WaveParameter):
         pass
 
     def __call__(self, spec: xr.Dataset):
-        moment = spec
-        if self._is_boundary(moment):
-            dD = 360/len(moment.dirs)
-            moment = dD*np.pi/180*moment.sum(dim='dirs')
+        return _parameter_from_spectra(self, spec)
 
-        moment = (moment*(moment.freq**self._moment)).integrate(coord='freq')
-        moment = self._format_dataset(moment, spec)
+    def _moments(self):
+        return [self._moment]
 
-        return moment
+    def _from_moments(self, moments: xr.Dataset):
+        return moments[self.name()]
 
     def unit(self):
         pass
@@ -101,9 +110,13 @@ class Hs(WaveParameter):
     """Singificant wave height from spectra"""
 
     def __call__(self, spec: xr.Dataset):
-        hs = 4*Moment(0)(spec)**0.5
-        hs = self._format_dataset(hs, spec)
-        return hs
+        return _parameter_from_spectra(self, spec)
+
+    def _moments(self):
+        return [0]
+
+    def _from_moments(self, moments: xr.Dataset):
+        return 4*moments.m0**0.5
 
     def name(self):
         return 'hs'
@@ -118,9 +131,13 @@ class Tm01(WaveParameter):
     """Mean wave period from spectra"""
 
     def __call__(self, spec: xr.Dataset):
-        tm01 = Moment(0)(spec)/Moment(1)(spec).m1
-        tm01 = self._format_dataset(tm01, spec)
-        return tm01
+        return _parameter_from_spectra(self, spec)
+
+    def _moments(self):
+        return [0, 1]
+
+    def _from_moments(self, moments: xr.Dataset):
+        return moments.m0/moments.m1
 
     def name(self):
         return 'tm01'
@@ -135,9 +152,13 @@ class Tm_10(WaveParameter):
     """Mean wave period based on inverse moment from spectra"""
 
     def __call__(self, spec: xr.Dataset):
-        tm_10 = Moment(-1)(spec)/Moment(0)(spec).m0
-        tm_10 = self._format_dataset(tm_10, spec)
-        return tm_10
+        return _parameter_from_spectra(self, spec)
+
+    def _moments(self):
+        return [-1, 0]
+
+    def _from_moments(self, moments: xr.Dataset):
+        return moments['m-1']/moments.m0
 
     def name(self):
         return 'tm_10'
@@ -152,9 +173,13 @@ class Tm02(WaveParameter):
     """Mean wave period based on second moment from spectra"""
 
     def __call__(self, spec: xr.Dataset):
-        tm02 = (Moment(0)(spec)/Moment(2)(spec).m2)**(0.5)
-        tm02 = self._format_dataset(tm02, spec)
-        return tm02
+        return _parameter_from_spectra(self, spec)
+
+    def _moments(self):
+        return [0, 2]
+
+    def _from_moments(self, moments: xr.Dataset):
+        return (moments.m0/moments.m2)**(0.5)
 
     def name(self):
         return 'tm02'
@@ -169,9 +194,13 @@ class Fm(WaveParameter):
     """Mean freqeuncy from spectra"""
 
     def __call__(self, spec: xr.Dataset):
-        fm = Moment(1)(spec)/Moment(0)(spec).m0
-        fm = self._format_dataset(fm, spec)
-        return fm
+        return _parameter_from_spectra(self, spec)
+
+    def _moments(self):
+        return [0, 1]
+
+    def _from_moments(self, moments: xr.Dataset):
+        return moments.m1/moments.m0
 
     def name(self):
         return 'fm'
@@ -183,9 +212,13 @@ class Wm(WaveParameter):
     """Mean angular freqeuncy from spectra"""
 
     def __call__(self, spec: xr.Dataset):
-        wm = (Moment(1)(spec)/Moment(0)(spec).m0)*2*np.pi
-        wm = self._format_dataset(wm, spec)
-        return wm
+        return _parameter_from_spectra(self, spec)
+
+    def _moments(self):
+        return [0, 1]
+
+    def _from_moments(self, moments: xr.Dataset):
+        return (moments.m1/moments.m0)*2*np.pi
 
     def name(self):
         return 'wm'
@@ -197,30 +230,20 @@ class Dirm(WaveParameter):
     """Mean wave direction"""
 
     def __call__(self, spec: xr.Dataset):
-        m0 =Moment(0)(spec).m0
-
-        if self._is_boundary(spec):
-            theta = np.deg2rad(spec.dirs.values)
-            dD = 360/len(spec.dirs)
-            # Normalizing here so that integration over direction becomes summing
-            efth = dD*np.pi/180*spec
+        return _parameter_from_spectra(self, spec)
 
-            c1 = ((np.cos(theta)*efth).sum(dim='dirs'))  # Function of frequency
-            s1 = ((np.sin(theta)*efth).sum(dim='dirs'))
-        else:
-            theta = np.deg2rad(spec.mdir.values)
+    def _moments(self):
+        return [0]
 
-            c1 = np.cos(theta)*spec  # Function of frequency
-            s1 = np.sin(theta)*spec
+    def _directional(self):
+        return True
 
-        a1m = c1.integrate(coord='freq')/m0  # Mean parameters
-        b1m = s1.integrate(coord='freq')/m0
+    def _from_moments(self, moments: xr.Dataset):
+        a1m = moments.a1/moments.m0  # Mean parameters
+        b1m = moments.b1/moments.m0
 
         thetam = np.arctan2(b1m,a1m)
-        dirm = np.mod(thetam*180/np.pi, 360)
-
-        dirm = self._format_dataset(dirm, spec)
-        return dirm
+        return np.mod(thetam*180/np.pi, 360)
 
     def name(self):
         return 'dirm'
@@ -235,29 +258,24 @@ class Sprm(WaveParameter):
     """Mean wave spreading"""
 
     def __call__(self, spec: xr.Dataset):
-        m0 =Moment(0)(spec).m0
-
-        if self._is_boundary(spec):
-            theta = np.deg2rad(spec.dirs.values)
-            dD = 360/len(spec.dirs)
-            # Normalizing here so that integration over direction becomes summing
-            efth = dD*np.pi/180*spec
+        return _parameter_from_spectra(self, spec)
 
-            c1 = ((np.cos(theta)*efth).sum(dim='dirs'))  # Function of frequency
-            s1 = ((np.sin(theta)*efth).sum(dim='dirs'))
+    def _moments(self):
+        return [0]
 
-            a1m = c1.integrate(coord='freq')/m0  # Mean parameters
-            b1m = s1.integrate(coord='freq')/m0
+    def _directional(self):
+        return True
 
-            m1 = np.sqrt(b1m**2 + a1m**2)
-            sprm = np.sqrt(2-2*(m1))*180/np.pi
-
-        else:
-            sprm = ((spec.spr.values**2*spec).integrate(coord='freq')/m0)**0.5
+    def _from_moments(self, moments: xr.Dataset):
+        if 'spr2' in moments:
+            # Spectra with spreading given as a function of frequency
+            return (moments.spr2/moments.m0)**0.5
 
+        a1m = moments.a1/moments.m0  # Mean parameters
+        b1m = moments.b1/moments.m0
 
-        sprm = self._format_dataset(sprm, spec)
-        return sprm
+        m1 = np.sqrt(b1m**2 + a1m**2)
+        return np.sqrt(2-2*(m1))*180/np.pi
 
     def name(self):
         return 'sprm'
@@ -267,3 +285,112 @@ class Sprm(WaveParameter):
 
     def standard_name(self):
         return 'sea_surface_wave_directional_spread'
+
+def _parameter_from_spectra(wave_parameter: WaveParameter, spec: xr.Dataset) -> xr.Dataset:
+    moments = spectral_moments(spec, wave_parameter._moments(), directional=wave_parameter._directional())
+    parameter = wave_parameter._from_moments(moments).to_dataset(name=wave_parameter.name())
+    return wave_parameter._format_dataset(parameter, spec)
+
+def _trapezoid_weights(x: np.ndarray) -> np.ndarray:
+    """Weights w so that sum(y*w) equals the trapezoidal integral of y(x)."""
+    dx = np.diff(x)
+    weights = np.zeros(len(x))
+    weights[:-1] += dx/2
+    weights[1:] += dx/2
+    return weights
+
+def spectral_moments(spec: xr.Dataset, moments: List[float]=[0], directional: bool=False) -> xr.Dataset:
+    """Calculates several spectral moments in one pass over the spectra.
+
+    Directional spectra (Boundary) are summed over the directions only once.
+    All frequency moments are then calculated with one matrix product. The
+    data variables are named as by Moment, e.g. 'm0', 'm1' and 'm-1'.
+
+    directional=True also gives the first order directional moments
+    a1 and b1 (integrals of cos(theta)*E and sin(theta)*E, not normalized by
+    m0). For 1D spectra (Spectra) mdir is used as theta, and the integral of
+    spr**2*E is given as spr2.
+
+    As when summing with xarray, NaN's are skipped in the summation over
+    directions, but not in the integration over frequencies. Dask-backed
+    spectra give dask-backed moments.
+    """
+    is_boundary = 'dirs' in list(spec.coords)
+    if is_boundary:
+        efth = spec.spec.transpose(..., 'freq', 'dirs').fillna(0)
+    else:
+        efth = spec.spec.transpose(..., 'freq')
+    dims = efth.dims[:-2] if is_boundary else efth.dims[:-1]
+    coords = {name: coord for name, coord in spec.coords.items() if set(coord.dims).issubset(dims)}
+
+    freq = spec.freq.values
+    integration_weights = _trapezoid_weights(freq)
+    efth = efth.data
+
+    if is_boundary:
+        theta = np.deg2rad(spec.dirs.values)
+        dD = 360/len(theta)
+        if directional:
+            dir_weights = np.column_stack((np.ones(len(theta)), np.cos(theta), np.sin(theta)))
+        else:
+            dir_weights = np.ones((len(theta), 1))
+        # Normalizing here so that integration over direction becomes summing
+        reduced = efth @ (dD*np.pi/180*dir_weights)
+        ef = reduced[..., 0]
+        if directional:
+            c1, s1 = reduced[..., 1], reduced[..., 2]
+    else:
+        ef = efth
+        if directional:
+            theta = np.deg2rad(spec.mdir.transpose(..., 'freq').data)
+            c1, s1 = np.cos(theta)*ef, np.sin(theta)*ef
+            spr2 = spec.spr.transpose(..., 'freq').data**2*ef
+
+    freq_weights = np.column_stack([freq**n*integration_weights for n in moments])
+    integrated_moments = ef @ freq_weights
+
+    data_vars = {}
+    for n, moment in enumerate(moments):
+        data_vars[Moment(moment).name()] = (dims, integrated_moments[..., n])
+    if directional:
+        data_vars['a1'] = (dims, c1 @ integration_weights)
+        data_vars['b1'] = (dims, s1 @ integration_weights)
+        if not is_boundary:
+            data_vars['spr2'] = (dims, spr2 @ integration_weights)
+
+    return xr.Dataset(data_vars=data_vars, coords=coords)
+
+def compute_wave_parameters(spec: xr.Dataset, parameters: List[WaveParameter], chunk_size: int=None) -> xr.Dataset:
+    """Calculates several wave parameters from the same spectra.
+
+    The spectral moments needed by all the parameters are calculated together,
+    and all parameters are then derived from them. Set chunk_size to do this
+    for that many time steps at a time, so that only one chunk of the spectra
+    needs to be in memory.
+    """
+    moments = sorted(set([m for wp in parameters for m in wp._moments()]))
+    directional = any([wp._directional() for wp in parameters])
+
+    if chunk_size is None or 'time' not in spec.dims:
+        chunks = [spec]
+    else:
+        chunks = (spec.isel(time=slice(n, n+chunk_size)) for n in range(0, len(spec.time), chunk_size))
+
+    dsets = []
+    for spec_chunk in chunks:
+        spectral_moments_chunk = spectral_moments(spec_chunk, moments, directional=directional)
+        if chunk_size is not None:
+            # Only one chunk of (possibly lazy) spectra is read at a time
+            spectral_moments_chunk = spectral_moments_chunk.compute()
+        parameter_list = []
+        for wp in parameters:
+            parameter = wp._from_moments(spectral_moments_chunk)
+            if parameter is None:
+                parameter_list.append(wp(spec_chunk))
+            else:
+                parameter_list.append(wp._format_dataset(parameter.to_dataset(name=wp.name()), spec_chunk))
+        dsets.append(xr.merge(parameter_list))
+
+    if len(dsets) == 1:
+        return dsets[0]
+    return xr.concat(dsets, dim='time')
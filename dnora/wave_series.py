@@ -5,17 +5,19 @@ import matplotlib.pyplot as plt
 from typing import List
 from copy import copy
 import pandas as pd
-from dnora.wave_parameters import WaveParameter
+from dnora.wave_parameters import WaveParameter, compute_wave_parameters
 
 class WaveSeries:
     def __call__(self, parameter: str) -> np.ndarray:
         return self.data[parameter].values
 
-    def from_spectra(self, spec: xr.Dataset, parameters: List[WaveParameter]):
-        dsets = []
-        for wp in parameters:
-            dsets.append(wp(spec))
-        self.data = xr.merge(dsets)
+    def from_spectra(self, spec: xr.Dataset, parameters: List[WaveParameter], chunk_size: int=None):
+        """Calculates the wave parameters from the spectra.
+
+        The spectral moments are calculated only once for all parameters. Set
+        chunk_size to process that many time steps at a time.
+        """
+        self.data = compute_wave_parameters(spec, parameters, chunk_size=chunk_size)
 
     def plot(self, parameter: str, x: List[int]=None) -> np.ndarray:
         self.slice_data(x=x)[parameter].plot()
@@ -15,6 +15,19 @@ class ForcingReader(ABC):
     def __call__(self, grid: Grid, start_time: str, end_time: str, expansion_factor: float):
         pass
 
+    def set_lazy(self, lazy: bool) -> None:
+        """This is set automatically by the .import_forcing() method.
+
+        Readers that support it should then return dask-backed data instead
+        of reading them into memory.
+        """
+        self._lazy = lazy
+
+    def is_lazy(self) -> bool:
+        if not hasattr(self, '_lazy'):
+            return False
+        return self._lazy
+
     def name(self) -> str:
         return type(self).__name__
 
@@ -33,6 +46,22 @@ class DnoraNc(ForcingReader):
         return ds
 
 
+class DnoraZarr(ForcingReader):
+    def __init__(self, store: str) -> None:
+        self.store = store
+
+    def __call__(self, grid, start_time, end_time, expansion_factor):
+        lon_min, lon_max, lat_min, lat_max = aux_funcs.expand_area(min(grid.lon()), max(grid.lon()), min(grid.lat()), max(grid.lat()), expansion_factor)
+        msg.info(f"Getting wind forcing from cached zarr store {self.store} from {start_time} to {end_time}")
+
+        ds = xr.open_zarr(self.store, consolidated=True)
+        # Time steps are appended in the order they were cached
+        ds = ds.sortby('time').sel(time=slice(start_time, end_time), lon=slice(lon_min, lon_max), lat=slice(lat_min, lat_max))
+        if not self.is_lazy():
+            ds = ds.load()
+        return ds
+
+
 class File_WW3Nc(ForcingReader):
     def __init__(self, folder: str='', filename: str='ww3_wind_T0', dateformat: str='%Y%m%dT%H%M', stride: int=None, hours_per_file: int=24, last_file: str='', lead_time: int=0) -> None:
         self.stride = stride
@@ -70,7 +99,11 @@ class File_WW3Nc(ForcingReader):
             msg.from_file(filename)
             msg.plain(f"Reading wind data: {time0}-{time1}")
 
-            wnd_list.append(xr.open_dataset(filename).sel(time=slice(time0, time1),
+            if self.is_lazy():
+                ds = xr.open_dataset(filename, chunks={})
+            else:
+                ds = xr.open_dataset(filename)
+            wnd_list.append(ds.sel(time=slice(time0, time1),
                             lon=slice(lon_min, lon_max), lat=slice(lat_min, lat_max)))
 
         wind_forcing = xr.concat(wnd_list, dim="time")
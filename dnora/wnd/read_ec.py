@@ -5,7 +5,7 @@ import xarray as xr
 from subprocess import call
 import os, glob
 import time
-import cdsapi
+from typing import List
 # Import objects
 from ..grd.grd_mod import Grid
 
@@ -14,53 +14,17 @@ from .read import ForcingReader
 
 # Import aux_funcsiliry functions
 from .. import msg
-from ..aux_funcs import create_time_stamps, u_v_from_dir, expand_area, lon_in_km, create_monthly_time_stamps, int_list_of_days, int_list_of_months, int_list_of_years
+from ..aux_funcs import create_time_stamps, u_v_from_dir, expand_area, lon_in_km, create_monthly_time_stamps, month_periods, download_from_cds
 import pandas as pd
 
 
 
-def download_era5_from_cds(start_time, end_time, lon, lat, folder='dnora_wnd_temp') -> str:
-    """Downloads ERA5 10 m wind data from the Copernicus Climate Data Store for a
-    given area and time period"""
+def era5_cds_request(start_time, end_time, lon, lat) -> dict:
+    """CDS request for ERA5 10 m wind data for a given area and for all days
+    between start_time and end_time, which need to be in the same month."""
     start_time = pd.Timestamp(start_time)
     end_time = pd.Timestamp(end_time)
-    c = cdsapi.Client()
-
-    filename = f'{folder}/EC_ERA5.nc'
-    # cds_command_test = {
-    #     'product_type': 'reanalysis',
-    #     'format': 'netcdf',
-    #     'variable': [
-    #         '10m_u_component_of_wind', '10m_v_component_of_wind',
-    #     ],
-    #     'year': '2008',
-    #     'month': '01',
-    #     'day': [
-    #         '01', '02',
-    #     ],
-    #     'time': [
-    #         '00:00', '01:00', '02:00',
-    #         '03:00', '04:00', '05:00',
-    #         '06:00', '07:00', '08:00',
-    #         '09:00', '10:00', '11:00',
-    #         '12:00', '13:00', '14:00',
-    #         '15:00', '16:00', '17:00',
-    #         '18:00', '19:00', '20:00',
-    #         '21:00', '22:00', '23:00',
-    #     ],
-    #     'area': [
-    #         61.25, 4, 60.53,
-    #         5.73,
-    #     ],
-    # }
-
-    years = [f'{y:4.0f}' for y in int_list_of_years(start_time, end_time)]
-    if len(years) == 1:
-        years = years[0]
-    months = [f'{m:02.0f}' for m in int_list_of_months(start_time, end_time)]
-    if len(months) == 1:
-        months = months[0]
-    days = [f'{d:02.0f}' for d in int_list_of_days(start_time, end_time)]
+    days = [f'{d:02.0f}' for d in range(start_time.day, end_time.day+1)]
     if len(days) == 1:
         days = days[0]
 
@@ -70,8 +34,8 @@ def download_era5_from_cds(start_time, end_time, lon, lat, folder='dnora_wnd_tem
         'variable': [
             '10m_u_component_of_wind', '10m_v_component_of_wind',
         ],
-        'year': years,
-        'month': months,
+        'year': f'{start_time.year:4.0f}',
+        'month': f'{start_time.month:02.0f}',
         'day': days,
         'time': [
             '00:00', '01:00', '02:00',
@@ -90,13 +54,33 @@ def download_era5_from_cds(start_time, end_time, lon, lat, folder='dnora_wnd_tem
         ],
     }
 
-    c.retrieve('reanalysis-era5-single-levels', cds_command, filename)
-    return filename
+    return cds_command
+
+def download_era5_from_cds(start_time, end_time, lon, lat, folder='dnora_wnd_temp', client=None, max_workers: int=1) -> List[str]:
+    """Downloads ERA5 10 m wind data from the Copernicus Climate Data Store for a
+    given area and time period.
+
+    The period is split into monthly requests that are cached in the folder,
+    so only months that have not been downloaded before are retrieved.
+    """
+    requests = [era5_cds_request(t0, t1, lon, lat) for t0, t1 in month_periods(start_time, end_time)]
+    return download_from_cds('reanalysis-era5-single-levels', requests, folder, client=client, max_workers=max_workers)
 
 
 class ERA5(ForcingReader):
     """Reads ERA5 wind data
+
+    The data is downloaded from the Copernicus Climate Data Store. Downloaded
+    months are kept in the folder and reused. Set max_workers to download
+    several months at the same time. A client with a
+    retrieve(dataset, request, target) method can be given instead of the
+    default cdsapi.Client.
     """
+    def __init__(self, folder: str='dnora_wnd_temp', max_workers: int=1, client=None) -> None:
+        self.folder = copy(folder)
+        self.max_workers = copy(max_workers)
+        self.client = client
+        return
 
     def __call__(self, grid: Grid, start_time: str, end_time: str, expansion_factor: float):
         """Reads boundary spectra between given times and given area around
@@ -106,27 +90,14 @@ class ERA5(ForcingReader):
             f"Getting ERA5 wind forcing from {start_time} to {end_time}")
 
 
-        temp_folder = 'dnora_wnd_temp'
-        if not os.path.isdir(temp_folder):
-            os.mkdir(temp_folder)
-            print("Creating folder %s..." % temp_folder)
-
-        msg.plain("Removing old files from temporary folder...")
-        for f in glob.glob("dnora_wnd_temp/EC_ERA5.nc"):
-            os.remove(f)
-
         # Define area to search in
         lon_min, lon_max, lat_min, lat_max = expand_area(min(grid.lon()), max(grid.lon()), min(grid.lat()), max(grid.lat()), expansion_factor)
 
 
-        # start_times, end_times = create_monthly_time_stamps(start_time, end_time)
-        # wnd_list = []
-        # for t0, t1 in zip(start_times, end_times):
-        #     msg.plain(f"Reading wind forcing data: {t0}-{t1}")
-        #     # Creates file dnora_wnd_tmp/EC_ERA5_YYYY_MM.nc
-
-        nc_file = download_era5_from_cds(start_time, end_time, lon=(lon_min, lon_max), lat=(lat_min, lat_max), folder='dnora_wnd_temp')
-        wind_forcing = xr.open_dataset(nc_file)
+        nc_files = download_era5_from_cds(start_time, end_time, lon=(lon_min, lon_max), lat=(lat_min, lat_max),
+                                        folder=self.folder, client=self.client, max_workers=self.max_workers)
+        wind_forcing = xr.concat([xr.open_dataset(nc_file) for nc_file in nc_files], dim='time')
+        wind_forcing = wind_forcing.sel(time=slice(start_time, end_time))
         wind_forcing = wind_forcing.rename_dims({'longitude': 'lon', 'latitude': 'lat'})
         wind_forcing = wind_forcing.rename_vars({'longitude': 'lon', 'latitude': 'lat'})
         wind_forcing = wind_forcing.rename_vars({'u10': 'u', 'v10': 'v'})
@@ -5,6 +5,8 @@ import xarray as xr
 from subprocess import call
 import os, glob
 import time
+import uuid
+from typing import List, Callable
 # Import objects
 from ..grd.grd_mod import Grid
 
@@ -13,7 +15,102 @@ from .read import ForcingReader
 
 # Import aux_funcsiliry functions
 from .. import msg
-from ..aux_funcs import create_time_stamps, u_v_from_dir, expand_area, lon_in_km
+from ..aux_funcs import create_time_stamps, u_v_from_dir, expand_area, lon_in_km, map_concurrently
+from .regrid import WindRegridder, setup_regrid_cache, regular_axis
+
+def run_fimex_commands(fimex_commands: List[List[str]], output_files: List[str],
+                        max_workers: int=1, retries: int=2) -> None:
+    """Runs the fimex commands, max_workers of them at the same time.
+
+    A command is retried (at most retries times) if it fails or doesn't
+    create its output file. An exception listing the missing files is raised
+    if some commands still fail.
+    """
+
+    def _run(fimex_command, output_file) -> bool:
+        for attempt in range(retries+1):
+            if attempt > 0:
+                msg.plain(f"Retrying fimex ({attempt}/{retries}) for {output_file}...")
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            if call(fimex_command) == 0 and os.path.exists(output_file):
+                return True
+        return False
+
+    succeeded = map_concurrently(_run, fimex_commands, output_files, max_workers=max_workers)
+
+    failed_files = [f for f, ok in zip(output_files, succeeded) if not ok]
+    if failed_files:
+        msg.warning(f"fimex failed to create {len(failed_files)} of {len(output_files)} files!")
+        for f in failed_files:
+            msg.plain(f)
+        raise RuntimeError(f"fimex failed to create: {', '.join(failed_files)}")
+
+def read_fimex_files(output_files: List[str]) -> List[xr.Dataset]:
+    """Loads the files created by fimex and removes them."""
+    wnd_list = []
+    for nc_fimex in output_files:
+        wnd_list.append(xr.load_dataset(nc_fimex).squeeze())
+        os.remove(nc_fimex)
+    return wnd_list
+
+def run_and_read_fimex(fimex_commands: List[List[str]], output_files: List[str],
+                        max_workers: int=1, retries: int=2) -> List[xr.Dataset]:
+    """Runs the fimex commands and loads the files they created.
+
+    The temporary files of the run are removed also if fimex fails or the
+    files can't be read.
+    """
+    try:
+        run_fimex_commands(fimex_commands, output_files, max_workers=max_workers, retries=retries)
+        return read_fimex_files(output_files)
+    finally:
+        for nc_fimex in output_files:
+            if os.path.exists(nc_fimex):
+                os.remove(nc_fimex)
+
+def read_and_regrid(urls: List[str], start_times: List, end_times: List, variables: List[str],
+                    lon: np.ndarray, lat: np.ndarray, components: Callable, rotate: bool=False,
+                    cache_folder: str=None, reduce_dims: dict=None) -> xr.Dataset:
+    """Reads the wind from the files and regrids it to the lon/lat axes
+    without fimex.
+
+    The interpolation weights are determined from the first file and applied
+    to all files (see regrid.WindRegridder). Only the part of the source grid
+    that covers the target grid is read.
+
+    components(data) gets a dict with the variables and should return the x-
+    and y-components of the wind. These are rotated to east/north if
+    rotate=True. Extra dimensions (e.g. height) are reduced to the index given
+    in reduce_dims (default 0).
+    """
+    reduce_dims = reduce_dims or {}
+    regridder = None
+    times, u_list, v_list = [], [], []
+    for url, t0, t1 in zip(urls, start_times, end_times):
+        with xr.open_dataset(url) as ds:
+            if regridder is None:
+                regridder = WindRegridder.from_dataset(ds, variables[0], lon, lat, rotate=rotate, cache_folder=cache_folder)
+            data = {}
+            for var in variables:
+                da = regridder.select(ds[var].sel(time=slice(t0, t1)))
+                da = da.isel({dim: reduce_dims.get(dim, 0) for dim in da.dims[1:-2]})
+                data[var] = da.load()
+
+        x_comp, y_comp = components(data)
+        u, v = regridder(x_comp.values, y_comp.values)
+        times.append(data[variables[0]].time.values)
+        u_list.append(u)
+        v_list.append(v)
+
+    return xr.Dataset({'u': (['time', 'lat', 'lon'], np.concatenate(u_list)),
+                       'v': (['time', 'lat', 'lon'], np.concatenate(v_list))},
+                       coords={'time': np.concatenate(times), 'lat': regridder.lat, 'lon': regridder.lon})
+
+def check_regrid_option(regrid: str) -> str:
+    if regrid not in ['fimex', 'native']:
+        raise ValueError(f"regrid should be 'fimex' or 'native', not '{regrid}'!")
+    return regrid
 
 
 class NORA3(ForcingReader):
@@ -30,9 +127,18 @@ class NORA3(ForcingReader):
     """
 
     def __init__(self, stride: int=1, hours_per_file: int=1, last_file: str='',
-                lead_time: int=4, source: str='thredds'):
+                lead_time: int=4, source: str='thredds', max_workers: int=1,
+                retries: int=2, fimex: str='fimex', regrid: str='fimex',
+                weights_cache: bool=True):
         """The data is currently in hourly files. Do not change the default
         setting unless you have a good reason to do so.
+
+        Set max_workers > 1 to run that many fimex processes at the same time.
+        Failed fimex calls are retried (retries times). The fimex executable
+        can be changed with the 'fimex' option.
+
+        Set regrid='native' to interpolate without fimex. The interpolation
+        weights are then stored in regrid_cache/NORA3 (weights_cache=True).
         """
 
         self.stride = copy(stride)
@@ -40,6 +146,11 @@ class NORA3(ForcingReader):
         self.lead_time = copy(lead_time)
         self.last_file = copy(last_file)
         self.source = source
+        self.max_workers = copy(max_workers)
+        self.retries = copy(retries)
+        self.fimex = copy(fimex)
+        self.regrid = check_regrid_option(regrid)
+        self.weights_cache = copy(weights_cache)
         return
 
     def __call__(self, grid: Grid, start_time: str, end_time: str, expansion_factor: float):
@@ -57,13 +168,12 @@ class NORA3(ForcingReader):
 
 
         temp_folder = 'dnora_wnd_temp'
-        if not os.path.isdir(temp_folder):
+        if self.regrid == 'fimex' and not os.path.isdir(temp_folder):
             os.mkdir(temp_folder)
             print("Creating folder %s..." % temp_folder)
 
-        msg.plain("Removing old files from temporary folder...")
-        for f in glob.glob("dnora_wnd_temp/*MetNo_NORA3.nc"):
-            os.remove(f)
+        # Unique file names so that several runs can share the temporary folder
+        run_id = uuid.uuid4().hex[:8]
 
         # Define area to search in
         lon_min, lon_max, lat_min, lat_max = expand_area(min(grid.lon()), max(grid.lon()), min(grid.lat()), max(grid.lat()), expansion_factor)
@@ -73,17 +183,23 @@ class NORA3(ForcingReader):
         mean_lon_in_km = (lon_in_km(grid.lat()[0])+lon_in_km(grid.lat()[-1]))*0.5
         dlon = 3/mean_lon_in_km
 
-        wnd_list = []
+        urls = []
+        fimex_commands = []
+        output_files = []
         for n in range(len(file_times)):
 
             url = self.get_url(file_times[n], start_times[n], first_ind=self.lead_time, source=self.source)
+            urls.append(url)
 
             msg.from_file(url)
             msg.plain(f"Reading wind forcing data: {start_times[n]}-{end_times[n]}")
 
-            nc_fimex = f'dnora_wnd_temp/wind_{n:04.0f}_MetNo_NORA3.nc'
+            if self.regrid == 'native':
+                continue
+
+            nc_fimex = f'dnora_wnd_temp/wind_{run_id}_{n:04.0f}_MetNo_NORA3.nc'
 
-            fimex_command = ['fimex', '--input.file='+url,
+            fimex_command = [self.fimex, '--input.file='+url,
                              '--interpolate.method=bilinear',
                              '--interpolate.projString=+proj=latlong +ellps=sphere +a=6371000 +e=0',
                              '--interpolate.xAxisValues='
@@ -101,19 +217,19 @@ class NORA3(ForcingReader):
                              end_times[n].strftime('%Y-%m-%dT%H:%M:%S'),
                              '--process.rotateVector.direction=latlon',
                              '--output.file='+nc_fimex]
-            # read_success = False
-            # for ct in range(5):  # try 6 times
-            #     try:
-            #         call(fimex_command)
-            #         read_success = True
-            #     except:
-            #         print(f'......Retry {ct}.....')
-            #         time.sleep(10)  # wait for 10 seconds before re-trying
-            #
-            # # Don't want to catch the last execption
-            # if not read_success:
-            call(fimex_command)
-            wnd_list.append(xr.open_dataset(nc_fimex).squeeze())
+            fimex_commands.append(fimex_command)
+            output_files.append(nc_fimex)
+
+        if self.regrid == 'native':
+            # The wind direction is given relative to north, so no rotation is needed
+            cache_folder = setup_regrid_cache(self.name()) if self.weights_cache else None
+            wind_forcing = read_and_regrid(urls, start_times, end_times, ['wind_speed', 'wind_direction'],
+                                regular_axis(lon_min, dlon, lon_max), regular_axis(lat_min, dlat, lat_max),
+                                components=lambda data: u_v_from_dir(data['wind_speed'], data['wind_direction']),
+                                cache_folder=cache_folder)
+            return wind_forcing.fillna(0)
+
+        wnd_list = run_and_read_fimex(fimex_commands, output_files, max_workers=self.max_workers, retries=self.retries)
 
         wind_forcing = xr.concat(wnd_list, dim="time")
 
@@ -154,15 +270,25 @@ class MyWave3km(ForcingReader):
     from the wave model output. This means that model land points have no data.
     """
 
-    def __init__(self, stride: int=24, hours_per_file: int=24, last_file: str='', lead_time: int=0):
+    def __init__(self, stride: int=24, hours_per_file: int=24, last_file: str='', lead_time: int=0,
+                max_workers: int=1, retries: int=2, fimex: str='fimex', regrid: str='fimex',
+                weights_cache: bool=True):
         """The data is currently in daily files. Do not change the default
         setting unless you have a good reason to do so.
+
+        Set max_workers > 1 to run that many fimex processes at the same time.
+        Set regrid='native' to interpolate without fimex.
         """
 
         self.stride = copy(stride)
         self.hours_per_file = copy(hours_per_file)
         self.lead_time = copy(lead_time)
         self.last_file = copy(last_file)
+        self.max_workers = copy(max_workers)
+        self.retries = copy(retries)
+        self.fimex = copy(fimex)
+        self.regrid = check_regrid_option(regrid)
+        self.weights_cache = copy(weights_cache)
         return
 
     def __call__(self, grid: Grid, start_time: str, end_time: str, expansion_factor: float):
@@ -177,13 +303,12 @@ class MyWave3km(ForcingReader):
             f"Getting wind forcing from MEPS from {self.start_time} to {self.end_time}")
 
         temp_folder = 'dnora_wnd_temp'
-        if not os.path.isdir(temp_folder):
+        if self.regrid == 'fimex' and not os.path.isdir(temp_folder):
             os.mkdir(temp_folder)
             print("Creating folder %s..." % temp_folder)
 
-        msg.plain("Removing old files from temporary folder...")
-        for f in glob.glob("dnora_wnd_temp/*MetNo_MyWave3km.nc"):
-            os.remove(f)
+        # Unique file names so that several runs can share the temporary folder
+        run_id = uuid.uuid4().hex[:8]
 
 
         # Define area to search in
@@ -194,17 +319,23 @@ class MyWave3km(ForcingReader):
         mean_lon_in_km = (lon_in_km(grid.lat()[0])+lon_in_km(grid.lat()[-1]))*0.5
         dlon = 3/mean_lon_in_km
 
-        wnd_list = []
+        urls = []
+        fimex_commands = []
+        output_files = []
         for n in range(len(file_times)):
             url = self.get_url(file_times[n])
+            urls.append(url)
 
             msg.from_file(url)
             msg.plain(
                 f"Reading wind forcing data: {start_times[n]}-{end_times[n]}")
 
-            nc_fimex = f'dnora_wnd_temp/wind_{n:04.0f}_MetNo_MyWave3km.nc'
+            if self.regrid == 'native':
+                continue
 
-            fimex_command = ['fimex', '--input.file='+url,
+            nc_fimex = f'dnora_wnd_temp/wind_{run_id}_{n:04.0f}_MetNo_MyWave3km.nc'
+
+            fimex_command = [self.fimex, '--input.file='+url,
                              '--interpolate.method=bilinear',
                              '--interpolate.projString=+proj=latlong +ellps=sphere +a=6371000 +e=0',
                              '--interpolate.xAxisValues='+ str(lon_min)+','+str(lon_min+dlon)+ ',...,'+str(lon_max)+'',
@@ -219,8 +350,18 @@ class MyWave3km(ForcingReader):
                              '--process.rotateVector.direction=latlon',
                              '--output.file='+nc_fimex]
 
-            call(fimex_command)
-            wnd_list.append(xr.open_dataset(nc_fimex).squeeze())
+            fimex_commands.append(fimex_command)
+            output_files.append(nc_fimex)
+
+        if self.regrid == 'native':
+            cache_folder = setup_regrid_cache(self.name()) if self.weights_cache else None
+            wind_forcing = read_and_regrid(urls, start_times, end_times, ['ff', 'dd'],
+                                regular_axis(lon_min, dlon, lon_max), regular_axis(lat_min, dlat, lat_max),
+                                components=lambda data: u_v_from_dir(data['ff'], data['dd']),
+                                cache_folder=cache_folder)
+            return wind_forcing.fillna(0)
+
+        wnd_list = run_and_read_fimex(fimex_commands, output_files, max_workers=self.max_workers, retries=self.retries)
 
         wind_forcing = xr.concat(wnd_list, dim="time")
 
@@ -255,15 +396,26 @@ class MEPS(ForcingReader):
     The data is from a 2.5 km AROME model.
     """
 
-    def __init__(self, stride: int = 6, hours_per_file: int = 67, last_file: str = '', lead_time: int = 0):
+    def __init__(self, stride: int = 6, hours_per_file: int = 67, last_file: str = '', lead_time: int = 0,
+                max_workers: int = 1, retries: int = 2, fimex: str = 'fimex', regrid: str = 'fimex',
+                weights_cache: bool = True):
         """The data is currently in 6 hourly files. Do not change the default
         setting unless you have a good reason to do so.
+
+        Set max_workers > 1 to run that many fimex processes at the same time.
+        Set regrid='native' to interpolate without fimex. The wind components
+        are then rotated from the model grid to east/north.
         """
 
         self.stride = copy(stride)
         self.hours_per_file = copy(hours_per_file)
         self.lead_time = copy(lead_time)
         self.last_file = copy(last_file)
+        self.max_workers = copy(max_workers)
+        self.retries = copy(retries)
+        self.fimex = copy(fimex)
+        self.regrid = check_regrid_option(regrid)
+        self.weights_cache = copy(weights_cache)
         return
 
     def __call__(self, grid: Grid, start_time: str, end_time: str, expansion_factor: float):
@@ -278,13 +430,12 @@ class MEPS(ForcingReader):
             f"Getting wind forcing from MEPS from {self.start_time} to {self.end_time}")
 
         temp_folder = 'dnora_wnd_temp'
-        if not os.path.isdir(temp_folder):
+        if self.regrid == 'fimex' and not os.path.isdir(temp_folder):
             os.mkdir(temp_folder)
             msg.info("Creating folder %s..." % temp_folder)
 
-        msg.plain("Removing old files from temporary folder...")
-        for f in glob.glob("dnora_wnd_temp/*MetNo_MEPS.nc"):
-            os.remove(f)
+        # Unique file names so that several runs can share the temporary folder
+        run_id = uuid.uuid4().hex[:8]
 
         # Check weather to use 'det' or 'subset' files
         url = self.get_url(file_times[0], 'det')
@@ -303,16 +454,22 @@ class MEPS(ForcingReader):
         # Define area to search in
         lon_min, lon_max, lat_min, lat_max = expand_area(min(grid.lon()), max(grid.lon()), min(grid.lat()), max(grid.lat()), expansion_factor)
 
-        wnd_list = []
+        urls = []
+        fimex_commands = []
+        output_files = []
         for n in range(len(file_times)):
             msg.plain(
                 f"Reading wind forcing data: {start_times[n]}-{end_times[n]}")
 
-            nc_fimex = f'dnora_wnd_temp/wind_{n:04.0f}_MetNo_MEPS.nc'
+            nc_fimex = f'dnora_wnd_temp/wind_{run_id}_{n:04.0f}_MetNo_MEPS.nc'
             url = self.get_url(file_times[n], prefix)
+            urls.append(url)
             msg.from_file(url)
 
-            fimex_command = ['fimex', '--input.file='+url,
+            if self.regrid == 'native':
+                continue
+
+            fimex_command = [self.fimex, '--input.file='+url,
                              '--interpolate.method=bilinear',
                              '--interpolate.projString=+proj=latlong +ellps=sphere +a=6371000 +e=0',
                              '--interpolate.xAxisValues='
@@ -338,9 +495,19 @@ class MEPS(ForcingReader):
                 fimex_command.insert(-2, '--extract.reduceDimension.start=1')
                 fimex_command.insert(-2, '--extract.reduceDimension.end=1')
 
-            call(fimex_command)
+            fimex_commands.append(fimex_command)
+            output_files.append(nc_fimex)
+
+        if self.regrid == 'native':
+            # Same ensemble member that fimex picks from the 'subset' files
+            reduce_dims = {'ensemble_member': 1} if prefix == 'subset' else None
+            cache_folder = setup_regrid_cache(self.name()) if self.weights_cache else None
+            return read_and_regrid(urls, start_times, end_times, ['x_wind_10m', 'y_wind_10m'],
+                                regular_axis(lon_min, dlon, lon_max), regular_axis(lat_min, dlat, lat_max),
+                                components=lambda data: (data['x_wind_10m'], data['y_wind_10m']),
+                                rotate=True, cache_folder=cache_folder, reduce_dims=reduce_dims)
 
-            wnd_list.append(xr.open_dataset(nc_fimex).squeeze())
+        wnd_list = run_and_read_fimex(fimex_commands, output_files, max_workers=self.max_workers, retries=self.retries)
 
         wind_forcing = xr.concat(wnd_list, dim="time")
 
@@ -0,0 +1,243 @@
+"""Native regridding of wind fields from a projected model grid to a regular
+lon/lat grid.
+
+The bilinear interpolation is expressed as a sparse weight matrix that is
+built once (and optionally cached on disk) and then applied to all time
+steps as one sparse matrix product. Grid relative vector components can be
+rotated to east/north in the same step.
+"""
+from __future__ import annotations
+import numpy as np
+import xarray as xr
+import scipy.sparse as sparse
+import os, json, hashlib
+from typing import Tuple
+from .. import msg
+from ..aux_funcs import check_if_folder
+
+EARTH_RADIUS = 6371000.
+
+class Projection:
+    """Spherical forward projection of a CF grid mapping.
+
+    Supported grid mappings are 'latitude_longitude', 'rotated_latitude_longitude'
+    and 'lambert_conformal_conic'.
+    """
+    def __init__(self, grid_mapping: dict=None):
+        self.attrs = dict(grid_mapping or {'grid_mapping_name': 'latitude_longitude'})
+        self.grid_mapping_name = self.attrs.get('grid_mapping_name')
+        if self.grid_mapping_name not in ['latitude_longitude', 'rotated_latitude_longitude', 'lambert_conformal_conic']:
+            raise ValueError(f"Grid mapping {self.grid_mapping_name} not supported for native regridding!")
+        self.radius = float(self.attrs.get('earth_radius', EARTH_RADIUS))
+
+    def is_angular(self) -> bool:
+        """True if the projected coordinates are in degrees."""
+        return self.grid_mapping_name != 'lambert_conformal_conic'
+
+    def forward(self, lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Projects longitudes and latitudes to the coordinates of the grid."""
+        lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+        if self.grid_mapping_name == 'latitude_longitude':
+            return lon, lat
+        if self.grid_mapping_name == 'rotated_latitude_longitude':
+            return self._rotated_pole(lon, lat)
+        return self._lambert_conformal_conic(lon, lat)
+
+    def _rotated_pole(self, lon, lat):
+        lon_p = np.deg2rad(float(self.attrs['grid_north_pole_longitude']))
+        lat_p = np.deg2rad(float(self.attrs['grid_north_pole_latitude']))
+        lam, phi = np.deg2rad(lon) - lon_p, np.deg2rad(lat)
+
+        rlat = np.arcsin(np.clip(np.sin(phi)*np.sin(lat_p) + np.cos(phi)*np.cos(lat_p)*np.cos(lam), -1, 1))
+        rlon = np.arctan2(-np.cos(phi)*np.sin(lam), np.sin(phi)*np.cos(lat_p) - np.cos(phi)*np.sin(lat_p)*np.cos(lam))
+        rlon = np.rad2deg(rlon) - float(self.attrs.get('north_pole_grid_longitude', 0.))
+        return np.mod(rlon + 180, 360) - 180, np.rad2deg(rlat)
+
+    def _lambert_conformal_conic(self, lon, lat):
+        parallels = np.deg2rad(np.atleast_1d(self.attrs['standard_parallel']).astype(float))
+        lat1, lat2 = parallels[0], parallels[-1]
+        lon0 = np.deg2rad(float(self.attrs['longitude_of_central_meridian']))
+        lat0 = np.deg2rad(float(self.attrs['latitude_of_projection_origin']))
+
+        def t(phi):
+            return np.tan(np.pi/4 + phi/2)
+
+        if np.isclose(lat1, lat2):
+            n = np.sin(lat1)
+        else:
+            n = np.log(np.cos(lat1)/np.cos(lat2))/np.log(t(lat2)/t(lat1))
+        F = np.cos(lat1)*t(lat1)**n/n
+        rho = self.radius*F/t(np.deg2rad(lat))**n
+        rho0 = self.radius*F/t(lat0)**n
+        theta = n*(np.mod(np.deg2rad(lon) - lon0 + np.pi, 2*np.pi) - np.pi)
+
+        x = rho*np.sin(theta) + float(self.attrs.get('false_easting', 0.))
+        y = rho0 - rho*np.cos(theta) + float(self.attrs.get('false_northing', 0.))
+        return x, y
+
+    def north_angle(self, lon: np.ndarray, lat: np.ndarray, dlat: float=1e-3) -> np.ndarray:
+        """Angle (radians) from the grid y-axis to true north, positive
+        towards the grid x-axis."""
+        x0, y0 = self.forward(lon, lat)
+        x1, y1 = self.forward(lon, np.asarray(lat) + dlat)
+        dx, dy = x1 - x0, y1 - y0
+        if self.is_angular():
+            dx = (np.mod(dx + 180, 360) - 180)*np.cos(np.deg2rad(y0))
+        return np.arctan2(dx, dy)
+
+def bilinear_weights(x: np.ndarray, y: np.ndarray, tx: np.ndarray, ty: np.ndarray) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """Sparse bilinear interpolation weights from the regular (y, x) grid to
+    the points (tx, ty).
+
+    The matrix has the shape (len(tx), len(y)*len(x)) so that it can be applied
+    to fields flattened in C-order. Returns also the mask of target points
+    that are outside the source grid (these have no weights).
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    tx, ty = np.ravel(tx).astype(float), np.ravel(ty).astype(float)
+    nx, ny = len(x), len(y)
+
+    def _position(axis, t):
+        """Fractional index of t along the axis (which can be descending)."""
+        if axis[0] > axis[-1]:
+            return len(axis) - 1 - _position(axis[::-1], t)
+        i = np.clip(np.searchsorted(axis, t) - 1, 0, len(axis)-2)
+        return i + (t - axis[i])/(axis[i+1] - axis[i])
+
+    px, py = _position(x, tx), _position(y, ty)
+    outside = (px < 0) | (px > nx-1) | (py < 0) | (py > ny-1) | np.isnan(px) | np.isnan(py)
+    px, py = np.clip(np.nan_to_num(px), 0, nx-1), np.clip(np.nan_to_num(py), 0, ny-1)
+
+    i0, j0 = np.minimum(px.astype(int), nx-2), np.minimum(py.astype(int), ny-2)
+    wx, wy = px - i0, py - j0
+
+    rows = np.repeat(np.arange(len(tx)), 4)
+    cols = np.stack([j0*nx + i0, j0*nx + i0 + 1, (j0+1)*nx + i0, (j0+1)*nx + i0 + 1], axis=1).ravel()
+    vals = np.stack([(1-wx)*(1-wy), wx*(1-wy), (1-wx)*wy, wx*wy], axis=1)
+    vals[outside] = 0.
+
+    weights = sparse.csr_matrix((vals.ravel(), (rows, cols)), shape=(len(tx), nx*ny))
+    # Zero weights are removed so that NaN's of unused neighbours don't spread
+    weights.eliminate_zeros()
+    return weights, outside
+
+def setup_regrid_cache(reader_name: str) -> str:
+    """Creates the folder for the regridding weights of a certain reader."""
+    check_if_folder('regrid_cache')
+    cache_folder = f'regrid_cache/{reader_name}'
+    check_if_folder(cache_folder)
+    return cache_folder
+
+def regrid_cache_key(projection: Projection, x: np.ndarray, y: np.ndarray, lon: np.ndarray, lat: np.ndarray, rotate: bool) -> str:
+    """Key of the regridding weights. Identifies both the source and the target grid."""
+    h = hashlib.sha1(json.dumps(projection.attrs, sort_keys=True, default=str).encode())
+    for array in [x, y, lon, lat]:
+        h.update(np.ascontiguousarray(array, dtype=float).tobytes())
+        h.update(b'|')
+    h.update(str(rotate).encode())
+    return h.hexdigest()
+
+class WindRegridder:
+    """Regrids (and rotates) wind components to a regular lon/lat grid.
+
+    The source fields are given as (..., y, x) arrays of the window of the
+    source grid that is needed to cover the target grid (see select()).
+    """
+    def __init__(self, weights: sparse.csr_matrix, outside: np.ndarray, window: Tuple[slice, slice],
+                cos: np.ndarray, sin: np.ndarray, lon: np.ndarray, lat: np.ndarray) -> None:
+        self.weights = weights
+        self.outside = outside
+        self.window = window
+        self.cos = cos
+        self.sin = sin
+        self.lon = lon
+        self.lat = lat
+
+    @classmethod
+    def from_grids(cls, projection: Projection, x: np.ndarray, y: np.ndarray,
+                lon: np.ndarray, lat: np.ndarray, rotate: bool=False) -> WindRegridder:
+        """Builds the weights from the source axes x, y (in the coordinates of
+        the projection) to the regular target axes lon, lat."""
+        lon2d, lat2d = np.meshgrid(lon, lat)
+        tx, ty = projection.forward(lon2d.ravel(), lat2d.ravel())
+        weights, outside = bilinear_weights(x, y, tx, ty)
+
+        # Only read the part of the source grid that is actually used
+        used = np.flatnonzero(np.diff(weights.tocsc().indptr))
+        if len(used) == 0:
+            raise ValueError('Target grid is completely outside of the source grid!')
+        j, i = divmod(used, len(x))
+        window = (slice(int(j.min()), int(j.max())+1), slice(int(i.min()), int(i.max())+1))
+        weights, __ = bilinear_weights(x[window[1]], y[window[0]], tx, ty)
+
+        if rotate:
+            angle = projection.north_angle(lon2d.ravel(), lat2d.ravel())
+            cos, sin = np.cos(angle), np.sin(angle)
+        else:
+            cos, sin = np.ones(len(tx)), np.zeros(len(tx))
+        return cls(weights, outside, window, cos, sin, np.asarray(lon), np.asarray(lat))
+
+    @classmethod
+    def from_dataset(cls, ds: xr.Dataset, variable: str, lon: np.ndarray, lat: np.ndarray,
+                    rotate: bool=False, cache_folder: str=None) -> WindRegridder:
+        """Builds the regridder using the grid mapping and the two last
+        dimensions of the variable. The weights are read from/written to the
+        cache_folder if it is given."""
+        y_dim, x_dim = ds[variable].dims[-2:]
+        grid_mapping = ds[variable].attrs.get('grid_mapping')
+        projection = Projection(ds[grid_mapping].attrs if grid_mapping in ds else None)
+        x, y = ds[x_dim].values, ds[y_dim].values
+
+        if cache_folder is None:
+            return cls.from_grids(projection, x, y, lon, lat, rotate)
+
+        filename = f'{cache_folder}/{regrid_cache_key(projection, x, y, lon, lat, rotate)}.npz'
+        if os.path.isfile(filename):
+            msg.from_file(filename)
+            return cls.read(filename)
+        regridder = cls.from_grids(projection, x, y, lon, lat, rotate)
+        regridder.write(filename)
+        msg.to_file(filename)
+        return regridder
+
+    @staticmethod
+    def read(filename: str) -> WindRegridder:
+        with np.load(filename) as data:
+            weights = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=tuple(data['shape']))
+            window = (slice(*data['window'][0]), slice(*data['window'][1]))
+            return WindRegridder(weights, data['outside'], window, data['cos'], data['sin'], data['lon'], data['lat'])
+
+    def write(self, filename: str) -> None:
+        tmpfile = f'{filename}.{os.getpid()}.tmp'
+        window = [[self.window[0].start, self.window[0].stop], [self.window[1].start, self.window[1].stop]]
+        with open(tmpfile, 'wb') as f:
+            np.savez(f, data=self.weights.data, indices=self.weights.indices, indptr=self.weights.indptr,
+                    shape=self.weights.shape, outside=self.outside, window=window,
+                    cos=self.cos, sin=self.sin, lon=self.lon, lat=self.lat)
+        os.replace(tmpfile, filename)
+
+    def select(self, data):
+        """Selects the needed window of the source grid from a (..., y, x) DataArray/Dataset variable."""
+        y_dim, x_dim = data.dims[-2:]
+        return data.isel({y_dim: self.window[0], x_dim: self.window[1]})
+
+    def regrid(self, data: np.ndarray) -> np.ndarray:
+        """Interpolates a (..., y, x) field to a (..., lat, lon) field."""
+        data = np.asarray(data)
+        lead = data.shape[:-2]
+        flat = data.reshape(-1, data.shape[-2]*data.shape[-1])
+        out = (self.weights @ flat.T).T
+        out[:, self.outside] = np.nan
+        return out.reshape(lead + (len(self.lat), len(self.lon)))
+
+    def __call__(self, x_comp: np.ndarray, y_comp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Interpolates the vector components and rotates them to east/north."""
+        x_comp, y_comp = self.regrid(x_comp), self.regrid(y_comp)
+        cos, sin = self.cos.reshape(len(self.lat), len(self.lon)), self.sin.reshape(len(self.lat), len(self.lon))
+        u = x_comp*cos - y_comp*sin
+        v = x_comp*sin + y_comp*cos
+        return u, v
+
+def regular_axis(start: float, step: float, stop: float) -> np.ndarray:
+    """Regular axis start, start+step, ..., stop (as fimex's 'a,b,...,c')."""
+    return start + step*np.arange(int(np.floor((stop - start)/step + 1e-6)) + 1)
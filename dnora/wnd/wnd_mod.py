@@ -7,7 +7,7 @@ import re
 import glob, os
 from calendar import monthrange
 # Import abstract classes and needed instances of them
-from .read import ForcingReader, DnoraNc
+from .read import ForcingReader, DnoraNc, DnoraZarr
 from .write import ForcingWriter
 
 # Import default values and aux_funcsiliry functions
@@ -18,6 +18,7 @@ class Forcing:
         self.grid = copy(grid)
         self._name = copy(name)
         self._history = []
+        self._lazy = False
         return
 
     def import_forcing(self, start_time: str, end_time: str,
@@ -25,35 +26,57 @@ class Forcing:
                     expansion_factor: float=1.2,
                     write_cache: bool=False,
                     read_cache: bool=False,
-                    cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1'):
+                    cache_name: str='#Grid_#Lon0_#Lon1_#Lat0_#Lat1',
+                    cache_format: str='nc',
+                    lazy: bool=False):
         """Imports forcing data from a certain source.
 
         Data are import between start_time and end_time from the source
         defined in the forcing_reader. Data are read around an area defined
         by the Grid object passed at initialization of this object.
+
+        The cache is written as monthly netcdf files (cache_format='nc') or
+        to a single appendable zarr store (cache_format='zarr').
+
+        Set lazy=True to keep the data dask-backed if the reader supports it.
+        The data are then only read when they are needed.
         """
+        self._lazy = copy(lazy)
 
         self.start_time = copy(start_time)
         self.end_time = copy(end_time)
         self._history.append(copy(forcing_reader))
 
         if write_cache or read_cache:
-            cache_folder, cache_name, cache_empty = aux_funcs.setup_cache('wnd', forcing_reader.name(), cache_name, self.grid)
+            cache_folder, cache_name, cache_empty = aux_funcs.setup_cache('wnd', forcing_reader.name(), cache_name, self.grid, cache_format)
+            cache_store = f'{cache_folder}/{cache_name}.zarr'
+
+        if read_cache and not cache_empty:
+            # Check the coverage of the cache before reading any data
+            cache_intervals, cache_dt = aux_funcs.cache_coverage(cache_folder, cache_name, cache_format)
+            patch_start, patch_end = aux_funcs.missing_periods(cache_intervals, cache_dt, start_time, end_time)
+            if patch_start == [pd.Timestamp(start_time)] and patch_end == [pd.Timestamp(end_time)]:
+                msg.info('No data found in cache for the requested period.')
+                cache_empty = True
 
         if read_cache and not cache_empty:
             msg.info('Reading wind forcing data from cache!!!')
             original_forcing_reader = copy(forcing_reader)
-            forcing_reader = DnoraNc(files=glob.glob(f'{cache_folder}/{cache_name}*'))
+            if cache_format == 'zarr':
+                forcing_reader = DnoraZarr(store=cache_store)
+            else:
+                forcing_reader = DnoraNc(files=aux_funcs.cache_files(cache_folder, cache_name))
 
+        forcing_reader.set_lazy(lazy)
         msg.header(forcing_reader, "Loading wind forcing...")
         self.data = forcing_reader(
             self.grid, start_time, end_time, expansion_factor)
 
         ### Patch data if read from cache and all data not found
         if read_cache and not cache_empty:
-            patch_start, patch_end = aux_funcs.determine_patch_periods(self.time(), start_time, end_time)
             if patch_start:
                 msg.info('Not all data found in cache. Patching from original source...')
+                original_forcing_reader.set_lazy(lazy)
                 wnd_list = [self.data]
                 for t0, t1 in zip(patch_start, patch_end):
                     wnd_ds = original_forcing_reader(self.grid, t0, t1, expansion_factor)
@@ -63,16 +86,37 @@ class Forcing:
 
         if write_cache:
             msg.info('Caching data:')
-            for month in self.months():
-                cache_file = f"{cache_name}_{month.strftime('%Y-%m')}.nc"
-                t0 = f"{month.strftime('%Y-%m-01')}"
-                d1 = monthrange(int(month.strftime('%Y')), int(month.strftime('%m')))[1]
-                t1 = f"{month.strftime(f'%Y-%m-{d1}')}"
-                outfile = f'{cache_folder}/{cache_file}'
-                if os.path.exists(outfile):
-                    os.remove(outfile)
-                self.data.sel(time=slice(t0, t1)).to_netcdf(outfile)
-                msg.to_file(outfile)
+            replaced_periods = []
+            if cache_format == 'zarr':
+                nt = aux_funcs.append_to_zarr_cache(self.data, cache_store)
+                msg.plain(f"Appended {nt} new time steps")
+                msg.to_file(cache_store)
+            else:
+                cache_files = []
+                for month in self.months():
+                    cache_file = f"{cache_name}_{month.strftime('%Y-%m')}.nc"
+                    t0 = f"{month.strftime('%Y-%m-01')}"
+                    d1 = monthrange(int(month.strftime('%Y')), int(month.strftime('%m')))[1]
+                    t1 = f"{month.strftime(f'%Y-%m-{d1}')}"
+                    outfile = f'{cache_folder}/{cache_file}'
+                    month_data = self.data.sel(time=slice(t0, t1))
+                    if self.is_lazy():
+                        # Lazy data might be read from the file we are replacing
+                        month_data = month_data.load()
+                    # Write to a temporary file first so that the cache is never incomplete
+                    tmpfile = f'{outfile}.{os.getpid()}.tmp'
+                    month_data.to_netcdf(tmpfile)
+                    os.replace(tmpfile, outfile)
+                    cache_files.append(outfile)
+                    replaced_periods.append([pd.Timestamp(t0), pd.Timestamp(t1) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')])
+                    msg.to_file(outfile)
+
+                if self.is_lazy():
+                    # Point the lazy data to the new cache files
+                    self.data = xr.open_mfdataset(cache_files).sel(time=slice(self.time()[0], self.time()[-1]))
+
+            aux_funcs.update_cache_coverage(cache_folder, cache_name, self.time(), cache_format,
+                                            replaced_periods=replaced_periods)
 
         return
 
@@ -110,17 +154,29 @@ class Forcing:
             return 0
 
     def u(self):
+        """Returns a dask array if the forcing was imported with lazy=True."""
         if hasattr(self, 'data'):
+            if self.is_lazy():
+                return self.data.u.data
             return copy(self.data.u.values)
         else:
             return np.array([[[]]])
 
     def v(self):
+        """Returns a dask array if the forcing was imported with lazy=True."""
         if hasattr(self, 'data'):
+            if self.is_lazy():
+                return self.data.v.data
             return copy(self.data.v.values)
         else:
             return np.array([[[]]])
 
+    def is_lazy(self) -> bool:
+        """True if the data are kept dask-backed."""
+        if not hasattr(self, 'data'):
+            return False
+        return self._lazy and self.data.u.chunks is not None
+
     def magnitude(self):
         if np.min(self.u()).shape == 0:
             return np.array([[[]]])
@@ -170,17 +226,18 @@ class Forcing:
 
         return self.u().shape
 
-    def _point_list(self, mask):
+    def _point_list(self, mask=None, lazy: bool=False, chunksize: int=100000):
         """Provides a list on longitudes and latitudes with a given mask.
 
         Used to e.g. generate list of boundary points or land points.
-        """
 
-        meshlon, meshlat=np.meshgrid(self.lon(),self.lat())
-        lonlat_flat = np.column_stack((meshlon.ravel(),meshlat.ravel()))
-        mask_flat = mask.ravel()
+        Set lazy=True to get an iterator over blocks of at most chunksize
+        points instead of one array.
+        """
 
-        return lonlat_flat[mask_flat]
+        if lazy:
+            return aux_funcs.iterate_point_list(self.lon(), self.lat(), mask, chunksize=chunksize)
+        return aux_funcs.point_list(self.lon(), self.lat(), mask)
 
 
     def slice_data(self, start_time: str='', end_time: str=''):
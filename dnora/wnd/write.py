@@ -4,7 +4,7 @@ from abc import ABC, abstractmethod
 import numpy as np
 import pandas as pd
 from copy import copy
-from typing import TYPE_CHECKING, Tuple
+from typing import TYPE_CHECKING, Tuple, List
 
 # Import objects
 if TYPE_CHECKING:
@@ -12,6 +12,7 @@ if TYPE_CHECKING:
 
 # Import default values and aux_funcsiliry functions
 from .. import msg
+from .. import aux_funcs
 
 class ForcingWriter(ABC):
     """Writes the forcing data to a certain file format.
@@ -51,29 +52,61 @@ class WW3(ForcingWriter):
         return filename
 
 
+def format_swan_wind(times: np.ndarray, u: np.ndarray, v: np.ndarray) -> str:
+    """Formats the wind components [time, lat, lon] in SWAN ascii format.
+
+    The values are written in mm/s, truncated to integers.
+    """
+    if len(times) == 0:
+        return ''
+    ny, nx = u.shape[1:]
+    time_step_fmt = (' '.join(['%i']*nx) + '\n')*ny
+    time_stamps = pd.to_datetime(times).strftime('%Y%m%d.%H%M%S')
+    u = (u*1000).astype(np.int64)
+    v = (v*1000).astype(np.int64)
+
+    day_str = []
+    for n, time_stamp in enumerate(time_stamps):
+        day_str.append(time_stamp + '\n')
+        day_str.append(time_step_fmt % tuple(u[n].ravel().tolist()))
+        day_str.append(time_stamp + '\n')
+        day_str.append(time_step_fmt % tuple(v[n].ravel().tolist()))
+    return ''.join(day_str)
+
+def _format_swan_day(day_data: Tuple) -> str:
+    """Formats the (times, u, v) of one day (picklable for process pools)."""
+    return format_swan_wind(*day_data)
+
 class SWAN(ForcingWriter):
-    """Writes wind forcing data to SWAN ascii format."""
+    """Writes wind forcing data to SWAN ascii format.
+
+    Set max_workers > 1 to format that many days in parallel in separate
+    processes.
+    """
+    def __init__(self, max_workers: int=1) -> None:
+        self.max_workers = copy(max_workers)
+        return
 
     def _extension(self):
         return 'asc'
 
     def __call__(self, forcing: Forcing, filename: str) -> List[str]:
 
-        days = forcing.days()
-        with open(filename, 'w') as file_out:
-            ct = 0
-            for day in days:
-                msg.plain(day.strftime('%Y-%m-%d'))
-                times = forcing.times_in_day(day)
-                for n in range(len(times)):
-                    time_stamp = pd.to_datetime(
-                        times[n]).strftime('%Y%m%d.%H%M%S')+'\n'
-                    file_out.write(time_stamp)
-                    np.savetxt(file_out, forcing.u()
-                               [ct, :, :]*1000, fmt='%i')
-                    file_out.write(time_stamp)
-                    np.savetxt(file_out, forcing.v()
-                               [ct, :, :]*1000, fmt='%i')
-                    ct += 1
+        # The days are streamed through one pool of processes. At most
+        # max_workers days are formatted ahead of the one being written to
+        # bound the memory use, and the days are written in order.
+        with open(filename, 'w', buffering=2**20) as file_out:
+            for day_str in aux_funcs.iterate_concurrently(_format_swan_day, self._daily_data(forcing),
+                                                         max_workers=self.max_workers,
+                                                         processes=True):
+                file_out.write(day_str)
 
         return filename
+
+    def _daily_data(self, forcing: Forcing):
+        """Yields the times and wind components of the forcing day by day."""
+        for day in forcing.days():
+            msg.plain(day.strftime('%Y-%m-%d'))
+            day_data = forcing.slice_data(start_time=day.strftime('%Y-%m-%d') + "T00:00:00",
+                                          end_time=day.strftime('%Y-%m-%d') + "T23:59:59")
+            yield day_data.time.values, day_data.u.values, day_data.v.values
@@ -1,7 +1,7 @@
 import unittest
 import sys
 sys.path.insert(0, "../../")
-from dnora.aux_funcs import create_time_stamps, u_v_from_dir
+from dnora.aux_funcs import create_time_stamps, u_v_from_dir, point_list, iterate_point_list, plan_index_reads, iterate_concurrently
 import numpy as np
 
 class TimeStamps(unittest.TestCase):
@@ -180,5 +180,63 @@ class WindDir(unittest.TestCase):
 			self.assertAlmostEqual(u,-np.sin(wd*np.pi/180)*ws)
 			self.assertAlmostEqual(v,-np.cos(wd*np.pi/180)*ws)
 
+class PointList(unittest.TestCase):
+	def setUp(self):
+		self.lon = np.array([1., 2., 3., 4.])
+		self.lat = np.array([10., 20., 30.])
+		self.mask = np.zeros((3,4), dtype=bool)
+		self.mask[0,:] = True
+		self.mask[1,2] = True
+		self.mask[2,0] = True
+
+	def meshgrid_point_list(self, mask):
+		meshlon, meshlat = np.meshgrid(self.lon, self.lat)
+		return np.column_stack((meshlon.ravel(), meshlat.ravel()))[mask.ravel()]
+
+	def test_point_list(self):
+		self.assertIsNone(np.testing.assert_array_equal(point_list(self.lon, self.lat, self.mask), self.meshgrid_point_list(self.mask)))
+
+	def test_all_points(self):
+		all_points = np.full((3,4), True)
+		self.assertIsNone(np.testing.assert_array_equal(point_list(self.lon, self.lat), self.meshgrid_point_list(all_points)))
+
+	def test_no_points(self):
+		self.assertEqual(point_list(self.lon, self.lat, np.zeros((3,4), dtype=bool)).shape, (0,2))
+
+	def test_iterate_point_list(self):
+		blocks = list(iterate_point_list(self.lon, self.lat, self.mask, chunksize=5))
+		self.assertTrue(all([len(block) <= 5 for block in blocks]))
+		self.assertIsNone(np.testing.assert_array_equal(np.concatenate(blocks), self.meshgrid_point_list(self.mask)))
+
+class PlanIndexReads(unittest.TestCase):
+	def test_runs(self):
+		inds = np.array([9, 0, 2, 3, 11, 2])
+		blocks, positions = plan_index_reads(inds, max_gap=0)
+		self.assertEqual(blocks, [(0, 1), (2, 4), (9, 10), (11, 12)])
+		self.assertIsNone(np.testing.assert_array_equal(np.concatenate([np.arange(a, b) for a, b in blocks])[positions], inds))
+
+	def test_merged_gaps(self):
+		inds = np.array([9, 0, 2, 3, 11, 2])
+		blocks, positions = plan_index_reads(inds, max_gap=1)
+		self.assertEqual(blocks, [(0, 4), (9, 12)])
+		self.assertIsNone(np.testing.assert_array_equal(np.concatenate([np.arange(a, b) for a, b in blocks])[positions], inds))
+
+		blocks, positions = plan_index_reads(inds, max_gap=100)
+		self.assertEqual(blocks, [(0, 12)])
+		self.assertIsNone(np.testing.assert_array_equal(positions, inds))
+
+class IterateConcurrently(unittest.TestCase):
+	def test_order_and_read_ahead(self):
+		for max_workers in [1, 3]:
+			started = []
+			def square(x):
+				started.append(x)
+				return x**2
+
+			for n, result in enumerate(iterate_concurrently(square, range(10), max_workers=max_workers)):
+				self.assertEqual(result, n**2)
+				self.assertLessEqual(len(started), n + max_workers)
+			self.assertEqual(sorted(started), list(range(10)))
+
 if __name__ == '__main__':
 	unittest.main()
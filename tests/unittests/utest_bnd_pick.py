@@ -0,0 +1,140 @@
+import unittest
+import sys
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.boundary import EdgesAsBoundary
+from dnora.bnd import Boundary
+from dnora.bnd.read import BoundaryReader, ForceFeed
+from dnora.bnd.pick import NearestGridPoint, spatial_index
+import pandas as pd
+import dask.array as da
+from dnora.aux_funcs import min_distance
+import numpy as np
+
+def brute_force_nearest(grid, bnd_lon, bnd_lat):
+	bnd_points = grid.boundary_points()
+	inds, dists = [], []
+	for lon, lat in bnd_points:
+		dx, ind = min_distance(lon, lat, bnd_lon, bnd_lat)
+		inds.append(ind)
+		dists.append(dx)
+	return np.array(inds), np.array(dists)
+
+class NearestGridPointPicker(unittest.TestCase):
+	def setUp(self):
+		self.grid = Grid(lon=(5,6), lat=(60,61))
+		self.grid.set_spacing(nx=11, ny=11)
+		self.grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+
+		np.random.seed(1)
+		self.bnd_lon = np.random.uniform(4, 7, 500)
+		self.bnd_lat = np.random.uniform(59, 62, 500)
+
+	def test_same_as_brute_force(self):
+		inds = NearestGridPoint()(self.grid, self.bnd_lon, self.bnd_lat)
+		expected, __ = brute_force_nearest(self.grid, self.bnd_lon, self.bnd_lat)
+		self.assertIsNone(np.testing.assert_array_equal(inds, expected))
+
+	def test_max_dist(self):
+		__, dists = brute_force_nearest(self.grid, self.bnd_lon, self.bnd_lat)
+		max_dist = np.median(dists)
+		inds = NearestGridPoint(max_dist=max_dist)(self.grid, self.bnd_lon, self.bnd_lat)
+		self.assertEqual(len(inds), np.sum(dists <= max_dist))
+
+	def test_list_coordinates(self):
+		inds = NearestGridPoint()(self.grid, list(self.bnd_lon), list(self.bnd_lat))
+		expected, __ = brute_force_nearest(self.grid, self.bnd_lon, self.bnd_lat)
+		self.assertIsNone(np.testing.assert_array_equal(inds, expected))
+
+		# ForceFeed gives back the coordinates as they were given
+		reader = ForceFeed(None, None, None, None, list(self.bnd_lon), list(self.bnd_lat), 'Ocean')
+		inds = NearestGridPoint(max_dist=100)(self.grid, *reader.get_coordinates(None))
+		self.assertIsNone(np.testing.assert_array_equal(inds, expected))
+
+	def test_index_is_reused(self):
+		tree1 = spatial_index(self.bnd_lon, self.bnd_lat)
+		tree2 = spatial_index(self.bnd_lon.copy(), self.bnd_lat.copy())
+		self.assertIs(tree1, tree2)
+
+		tree3 = spatial_index(self.bnd_lon+1, self.bnd_lat)
+		self.assertIsNot(tree1, tree3)
+
+class CountingBoundaryReader(BoundaryReader):
+	"""Coarse source with one spectrum per point and value equal to the index."""
+	def __init__(self, lazy_spec=False):
+		self.requested = []
+		self.lazy_spec = lazy_spec
+		lon, lat = np.meshgrid(np.linspace(4.5, 6.5, 3), np.linspace(59.5, 61.5, 3))
+		self.lon, self.lat = lon.ravel(), lat.ravel()
+
+	def convention(self):
+		return 'Ocean'
+
+	def get_coordinates(self, start_time):
+		return self.lon, self.lat
+
+	def __call__(self, start_time, end_time, inds):
+		self.requested.append(np.array(inds))
+		time = pd.date_range(start_time, end_time, freq='1H')
+		spec = np.ones((len(time), len(inds), 3, 4))*np.array(inds)[None, :, None, None]
+		if self.lazy_spec:
+			spec = da.from_array(spec)
+		return time.values, np.array([0.1, 0.2, 0.3]), np.arange(0, 360, 90.), spec, self.lon[inds], self.lat[inds], 'test'
+
+class UniqueBoundaryReads(unittest.TestCase):
+	def test_each_spectrum_read_once(self):
+		grid = Grid(lon=(5,6), lat=(60,61))
+		grid.set_spacing(nx=11, ny=11)
+		grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+		expected = NearestGridPoint()(grid, *CountingBoundaryReader().get_coordinates(None))
+		self.assertTrue(len(np.unique(expected)) < len(expected))
+
+		for lazy_spec in [False, True]:
+			reader = CountingBoundaryReader(lazy_spec=lazy_spec)
+			boundary = Boundary(grid)
+			boundary.import_boundary('2020-01-01T00:00', '2020-01-01T03:00', reader, point_picker=NearestGridPoint(), lazy=lazy_spec)
+
+			self.assertEqual(len(reader.requested), 1)
+			self.assertIsNone(np.testing.assert_array_equal(reader.requested[0], np.unique(expected)))
+			self.assertEqual(len(boundary.x()), len(expected))
+			self.assertIsNone(np.testing.assert_array_equal(np.asarray(boundary.spec())[0,:,0,0], expected))
+			self.assertIsNone(np.testing.assert_array_equal(boundary.lon(), reader.lon[expected]))
+
+	def test_readers_returning_other_points(self):
+		grid = Grid(lon=(5,6), lat=(60,61))
+		grid.set_spacing(nx=11, ny=11)
+		grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+		source = CountingBoundaryReader()
+		time, freq, dirs, spec, lon, lat, __ = source('2020-01-01T00:00', '2020-01-01T03:00', np.arange(9))
+
+		class AllPointsReader(CountingBoundaryReader):
+			"""Ignores inds and returns lon/lat as lists."""
+			def __call__(self, start_time, end_time, inds):
+				self.requested.append(np.array(inds))
+				return time, freq, dirs, spec, list(lon), list(lat), 'test'
+
+		for reader in [ForceFeed(time, freq, dirs, spec, lon, lat, 'Ocean'), AllPointsReader()]:
+			boundary = Boundary(grid)
+			boundary.import_boundary('2020-01-01T00:00', '2020-01-01T03:00', reader, point_picker=NearestGridPoint())
+			self.assertEqual(len(boundary.x()), 9)
+			self.assertIsNone(np.testing.assert_array_equal(boundary.spec()[0,:,0,0], np.arange(9)))
+			self.assertIsNone(np.testing.assert_array_equal(boundary.lon(), lon))
+
+	def test_lon_lat_as_lists(self):
+		grid = Grid(lon=(5,6), lat=(60,61))
+		grid.set_spacing(nx=11, ny=11)
+		grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+
+		class ListReader(CountingBoundaryReader):
+			def __call__(self, start_time, end_time, inds):
+				time, freq, dirs, spec, lon, lat, source = super().__call__(start_time, end_time, inds)
+				return time, freq, dirs, spec, list(lon), list(lat), source
+
+		reader = ListReader()
+		expected = NearestGridPoint()(grid, *reader.get_coordinates(None))
+		boundary = Boundary(grid)
+		boundary.import_boundary('2020-01-01T00:00', '2020-01-01T03:00', reader, point_picker=NearestGridPoint())
+		self.assertIsNone(np.testing.assert_array_equal(boundary.lat(), reader.lat[expected]))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -2,6 +2,7 @@ import unittest
 import sys
 sys.path.insert(0, "../../")
 from dnora import bnd
+from dnora.aux_funcs import interp_spec
 import numpy as np
 from copy import copy
 
@@ -481,5 +482,66 @@ class BoundarySpectralConventionsCircular(unittest.TestCase):
 		self.assertIsNone(np.testing.assert_almost_equal(Snew,S))
 
 
+class BoundaryReGridDirs(unittest.TestCase):
+	def test_same_as_spline_interpolation(self):
+		S, D = load_test_spec(shifted=True) # Spectra starting from 7.5 deg
+		f = np.loadtxt('data/freq.test')
+
+		for first_dir in [0, 5]:
+			Snew, Dnew, fnew = bnd.process.ReGridDirs(first_dir=first_dir)(S, D, f)
+			self.assertEqual(Dnew[0], first_dir)
+			for n1 in range(S.shape[0]):
+				for n2 in range(S.shape[1]):
+					Sref = interp_spec(f, D, S[n1,n2,:,:], f, Dnew)
+					self.assertIsNone(np.testing.assert_almost_equal(Snew[n1,n2,:,:],Sref))
+
+	def test_chunked(self):
+		S, D = load_test_spec(shifted=True)
+		f = np.loadtxt('data/freq.test')
+
+		Snew, Dnew, __ = bnd.process.ReGridDirs()(S, D, f)
+		Schunk, Dchunk, __ = bnd.process.ReGridDirs(chunk_size=1)(S, D, f)
+		self.assertIsNone(np.testing.assert_almost_equal(Dnew,Dchunk))
+		self.assertIsNone(np.testing.assert_almost_equal(Snew,Schunk))
+
+class BoundaryConventionChange(unittest.TestCase):
+	conventions = ['Ocean', 'Met', 'Math', 'MathVec', 'WW3']
+
+	def chain(self, cur_c, wan_c, S, D):
+		bnd_processor = bnd.process.processor_for_convention_change(current_convention=cur_c, wanted_convention=wan_c)
+		if not isinstance(bnd_processor, list):
+			bnd_processor = [bnd_processor]
+		Snew, Dnew = copy(S), copy(D)
+		for processor in bnd_processor:
+			Snew, Dnew = processor(spec=Snew, dirs=Dnew)
+		return Snew, Dnew
+
+	def test_same_as_chain(self):
+		S, D = load_test_spec()
+		for cur_c in self.conventions:
+			for wan_c in self.conventions:
+				if cur_c == wan_c:
+					continue
+				Sref, Dref = self.chain(cur_c, wan_c, S, D)
+				Snew, Dnew = bnd.process.ConventionChange(cur_c, wan_c)(spec=S, dirs=D)
+				self.assertIsNone(np.testing.assert_almost_equal(Dnew,Dref))
+				self.assertIsNone(np.testing.assert_almost_equal(Snew,Sref))
+
+	def test_inplace(self):
+		S, D = load_test_spec()
+		Sref, Dref = self.chain('Met', 'WW3', S, D)
+		Sinplace = copy(S)
+		Snew, Dnew = bnd.process.ConventionChange('Met', 'WW3', inplace=True)(spec=Sinplace, dirs=D)
+		self.assertTrue(Snew is Sinplace)
+		self.assertIsNone(np.testing.assert_almost_equal(Dnew,Dref))
+		self.assertIsNone(np.testing.assert_almost_equal(Snew,Sref))
+
+	def test_dask(self):
+		import dask.array as da
+		S, D = load_test_spec()
+		Sref, Dref = self.chain('WW3', 'Math', S, D)
+		Snew, Dnew = bnd.process.ConventionChange('WW3', 'Math')(spec=da.from_array(S, chunks=(1,1,-1,-1)), dirs=D)
+		self.assertIsNone(np.testing.assert_almost_equal(Snew.compute(),Sref))
+
 if __name__ == '__main__':
 	unittest.main()
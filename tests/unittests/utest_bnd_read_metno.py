@@ -0,0 +1,186 @@
+import unittest
+import sys
+sys.path.insert(0, "../../")
+from dnora.bnd.read_metno import NORA3, WAM4km
+import numpy as np
+import pandas as pd
+import xarray as xr
+import tempfile
+import os
+
+def write_spectral_file(filename, start_time, nt, value_offset=0., nx=5, lon_shift=0.):
+	time = pd.date_range(start_time, periods=nt, freq='1h')
+	freq = np.linspace(0.04, 0.5, 4)
+	direction = np.arange(7.5, 360, 15.)
+	spec = np.zeros((nt, 1, nx, len(freq), len(direction)))
+	for n in range(nt):
+		spec[n] = (time[n].hour + value_offset)*100 + np.arange(1, nx+1)[None, :, None, None]
+	ds = xr.Dataset(
+		data_vars=dict(
+			SPEC=(['time', 'y', 'x', 'freq', 'direction'], spec),
+			longitude=(['y', 'x'], np.array([np.arange(nx)+5.+lon_shift])),
+			latitude=(['y', 'x'], np.array([np.arange(nx)+60.])),
+		),
+		coords=dict(time=time, x=np.arange(1, nx+1), y=[1], freq=freq, direction=direction),
+		attrs=dict(title='Test spectra', institution='dnora'),
+	)
+	ds.to_netcdf(filename)
+
+class LocalNORA3(NORA3):
+	def get_url(self, day, source) -> str:
+		return os.path.join(source, f"SPC{day.strftime('%Y%m%d')}00.nc")
+
+class LocalWAM4km(WAM4km):
+	def __init__(self, folder, **kwargs):
+		super().__init__(ignore_nan=False, cache=False, **kwargs)
+		self.folder = folder
+
+	def get_url(self, day):
+		return os.path.join(self.folder, f"MyWave_wam4_SPC_{day.strftime('%Y%m%dT%H')}Z.nc")
+
+class ConcurrentNORA3(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		for day in pd.date_range('2020-01-01', '2020-01-04', freq='D'):
+			write_spectral_file(os.path.join(self.folder.name, f"SPC{day.strftime('%Y%m%d')}00.nc"), day, 24)
+
+	def tearDown(self):
+		self.folder.cleanup()
+
+	def test_same_as_serial(self):
+		inds = np.array([3, 0, 2])
+		serial = LocalNORA3(source=self.folder.name)('2020-01-01 00:00', '2020-01-04 12:00', inds)
+		concurrent = LocalNORA3(source=self.folder.name, max_workers=4)('2020-01-01 00:00', '2020-01-04 12:00', inds)
+
+		time, freq, dirs, spec, lon, lat, source = concurrent
+		self.assertEqual(len(time), 24*3+13)
+		self.assertTrue(np.all(np.diff(time) > np.timedelta64(0)))
+		self.assertIsNone(np.testing.assert_almost_equal(lon, np.array([8., 5., 7.])))
+		self.assertIsNone(np.testing.assert_almost_equal(spec[:,:,0,0], spec[:,:,-1,-1]))
+
+		for serial_var, concurrent_var in zip(serial[:-1], concurrent[:-1]):
+			self.assertIsNone(np.testing.assert_array_equal(serial_var, concurrent_var))
+
+class ConcurrentWAM4km(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		# 2020-01-01T12Z is missing and 2020-01-01T18Z is inconsistent
+		for file_time in pd.to_datetime(['2020-01-01 00:00', '2020-01-01 06:00', '2020-01-01 18:00', '2020-01-02 00:00']):
+			filename = os.path.join(self.folder.name, f"MyWave_wam4_SPC_{file_time.strftime('%Y%m%dT%H')}Z.nc")
+			lon_shift = 1. if file_time.hour == 18 else 0.
+			write_spectral_file(filename, file_time, 24, value_offset=file_time.hour*10, lon_shift=lon_shift)
+
+	def tearDown(self):
+		self.folder.cleanup()
+
+	def test_fallback_to_earlier_forecast(self):
+		inds = np.array([0, 4])
+		for max_workers in [1, 3]:
+			reader = LocalWAM4km(self.folder.name, hours_per_file=24, max_workers=max_workers)
+			time, freq, dirs, spec, lon, lat, source = reader('2020-01-01 00:00', '2020-01-02 05:00', inds)
+
+			self.assertEqual(len(time), 30)
+			self.assertTrue(np.all(np.diff(time) > np.timedelta64(0)))
+
+			# 12-23 read from the 06 forecast, since 12 is missing and 18 inconsistent
+			hours = pd.to_datetime(time).hour.values
+			expected_offset = np.array([0]*6 + [60]*18 + [0]*6)
+			self.assertIsNone(np.testing.assert_almost_equal(spec[:,0,0,0], (hours + expected_offset)*100 + 1))
+			self.assertIsNone(np.testing.assert_almost_equal(spec[:,1,0,0], (hours + expected_offset)*100 + 5))
+
+	def test_files_read(self):
+		read_urls = []
+		class CountingWAM4km(LocalWAM4km):
+			def _read_file(self, url, *args, **kwargs):
+				read_urls.append(os.path.basename(url))
+				return super()._read_file(url, *args, **kwargs)
+
+		reader = CountingWAM4km(self.folder.name, hours_per_file=24, max_workers=1)
+		reader('2020-01-01 00:00', '2020-01-02 05:00', np.array([0, 4]))
+
+		# Earlier forecasts only read for the missing and the inconsistent file, and the missing file only tried once
+		hours = [name[-6:-4] for name in read_urls]
+		self.assertEqual(hours, ['00', '06', '12', '06', '18', '06', '00'])
+
+class WAM4kmCoordinates(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		self.cwd = os.getcwd()
+		os.chdir(self.folder.name)
+		self.filename = os.path.join(self.folder.name, "MyWave_wam4_SPC_20200101T00Z.nc")
+		write_spectral_file(self.filename, '2020-01-01 00:00', 2)
+		with xr.open_dataset(self.filename) as ds:
+			ds = ds.load()
+		ds.SPEC.values[0,0,1,2,3] = np.nan
+		ds.SPEC.values[0,0,3,0,0] = np.nan
+		ds.to_netcdf(self.filename)
+
+	def tearDown(self):
+		os.chdir(self.cwd)
+		self.folder.cleanup()
+
+	def test_nan_points_removed(self):
+		reader = LocalWAM4km(self.folder.name, hours_per_file=24)
+		reader.ignore_nan = True
+		lon, lat = reader.get_coordinates('2020-01-01 00:00')
+		self.assertIsNone(np.testing.assert_almost_equal(lon, np.array([5., 7., 9.])))
+		self.assertIsNone(np.testing.assert_array_equal(reader.pointers[0], np.array([0, 2, 4])))
+
+	def test_coordinate_cache(self):
+		reader = LocalWAM4km(self.folder.name, hours_per_file=24, coordinate_cache=True)
+		reader.ignore_nan = True
+		lon, lat = reader.get_coordinates('2020-01-01 00:00')
+		self.assertTrue(os.path.isdir('coordinate_cache/LocalWAM4km'))
+
+		# Later files are not opened, since the coordinate index is used
+		os.remove(self.filename)
+		cached_lon, cached_lat = reader.get_coordinates('2020-01-02 00:00')
+		self.assertIsNone(np.testing.assert_array_equal(lon, cached_lon))
+		self.assertIsNone(np.testing.assert_array_equal(lat, cached_lat))
+		self.assertIsNone(np.testing.assert_array_equal(reader.pointers[0], np.array([0, 2, 4])))
+
+	def test_coordinate_cache_checked_against_data(self):
+		reader = LocalWAM4km(self.folder.name, hours_per_file=24, coordinate_cache=True)
+		reader.ignore_nan = True
+		reader.get_coordinates('2020-01-01 00:00')
+
+		# Same NaN's: the index is used and the data are read as usual
+		lon, lat = reader.get_coordinates('2020-01-01 00:00')
+		time, freq, dirs, spec, bnd_lon, bnd_lat, source = reader('2020-01-01 00:00', '2020-01-01 01:00', np.array([0, 2]))
+		self.assertIsNone(np.testing.assert_array_equal(bnd_lon[0], lon[[0, 2]]))
+
+		# A later file has NaN's at other points
+		write_spectral_file(self.filename, '2020-01-01 00:00', 2)
+		with xr.open_dataset(self.filename) as ds:
+			ds = ds.load()
+		ds.SPEC.values[0,0,2,0,0] = np.nan
+		ds.to_netcdf(self.filename)
+		reader.get_coordinates('2020-01-01 00:00')
+		with self.assertRaises(ValueError):
+			reader('2020-01-01 00:00', '2020-01-01 01:00', np.array([0, 1]))
+		self.assertEqual(os.listdir('coordinate_cache/LocalWAM4km'), [])
+
+		lon, lat = reader.get_coordinates('2020-01-01 00:00')
+		self.assertIsNone(np.testing.assert_almost_equal(lon, np.array([5., 6., 8., 9.])))
+
+class CoalescedPointReads(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		for day in pd.date_range('2020-01-01', '2020-01-02', freq='D'):
+			write_spectral_file(os.path.join(self.folder.name, f"SPC{day.strftime('%Y%m%d')}00.nc"), day, 24, nx=12)
+
+	def tearDown(self):
+		self.folder.cleanup()
+
+	def test_same_as_fancy_index(self):
+		inds = np.array([9, 0, 2, 3, 11, 2])
+		reference = LocalNORA3(source=self.folder.name)('2020-01-01 00:00', '2020-01-02 12:00', inds)
+		for max_gap in [0, 2, 100]:
+			reader = LocalNORA3(source=self.folder.name)
+			reader.set_max_gap(max_gap)
+			coalesced = reader('2020-01-01 00:00', '2020-01-02 12:00', inds)
+			for reference_var, coalesced_var in zip(reference[:-1], coalesced[:-1]):
+				self.assertIsNone(np.testing.assert_array_equal(reference_var, coalesced_var))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.boundary import EdgesAsBoundary
+from dnora.bnd import Boundary
+from dnora.bnd.write import SWAN
+import numpy as np
+import pandas as pd
+
+def reference_swan_spectra(boundary, factor, file_out):
+	"""Original point-by-point writing of the SWAN spectra."""
+	for day in boundary.days():
+		for tim in boundary.times_in_day(day):
+			time_stamp = str(tim).split('-')[0]+str(tim).split('-')[1]+str(tim).split('-')[2][:2]+'.'+str(tim).split('-')[2][3:5]+'0000\n'
+			file_out.write(time_stamp)
+			for n in range(len(boundary.x())):
+				file_out.write('FACTOR\n')
+				file_out.write(format(factor,'1.0E')+'\n')
+				S = boundary.spec(start_time=tim, end_time=tim, x=[n]).squeeze()
+				np.savetxt(file_out,S*np.pi/(180*factor), fmt='%-10.0f')
+
+def create_boundary(dtype):
+	grid = Grid(lon=(5,6), lat=(60,61))
+	grid.set_spacing(nx=5, ny=5)
+	grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+	boundary = Boundary(grid)
+
+	bnd_points = grid.boundary_points()
+	time = pd.date_range('2020-01-01T00:00', '2020-01-03T12:00', freq='3H')
+	freq = np.linspace(0.04, 0.5, 7)
+	dirs = np.arange(0, 360, 30.)
+	np.random.seed(3)
+	spec = np.random.exponential(0.5, (len(time), len(bnd_points), len(freq), len(dirs))).astype(dtype)
+	boundary.data = boundary.compile_to_xr(time, freq, dirs, spec, bnd_points[:,0], bnd_points[:,1], 'test')
+	return boundary
+
+class SWANBoundaryWriter(unittest.TestCase):
+	def test_identical_to_point_by_point(self):
+		for dtype in [np.float32, np.float64]:
+			boundary = create_boundary(dtype)
+			with tempfile.TemporaryDirectory() as tmpdir:
+				filename = os.path.join(tmpdir, 'spec.asc')
+				SWAN()(boundary, filename)
+				with open(filename, 'r') as f:
+					written = f.read()
+
+			# Header is written before the first time stamp
+			header = written[:written.index('20200101.000000\n')]
+			with tempfile.TemporaryDirectory() as tmpdir:
+				reference_file = os.path.join(tmpdir, 'reference.asc')
+				with open(reference_file, 'w') as file_out:
+					file_out.write(header)
+					reference_swan_spectra(boundary, 1E-4, file_out)
+				with open(reference_file, 'r') as f:
+					reference = f.read()
+
+			self.assertEqual(written, reference)
+
+if __name__ == '__main__':
+	unittest.main()
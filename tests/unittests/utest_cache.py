@@ -0,0 +1,234 @@
+import unittest
+import sys
+import os
+import tempfile
+import glob
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.boundary import EdgesAsBoundary
+from dnora.bnd import Boundary
+from dnora.bnd.read import BoundaryReader
+from dnora.wnd import Forcing
+from dnora.wnd.read import ForcingReader
+from dnora import aux_funcs
+import json
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+class TimeSlicedBoundary(BoundaryReader):
+	"""Returns spectra for the requested times from one in-memory dataset."""
+	def __init__(self, ds):
+		self.ds = ds
+		self.calls = []
+
+	def convention(self):
+		return 'Ocean'
+
+	def get_coordinates(self, start_time):
+		return self.ds.lon.values, self.ds.lat.values
+
+	def __call__(self, start_time, end_time, inds):
+		self.calls.append((pd.Timestamp(start_time), pd.Timestamp(end_time)))
+		ds = self.ds.sel(time=slice(start_time, end_time), x=inds)
+		return ds.time.values, ds.freq.values, ds.dirs.values, ds.spec.values, ds.lon.values, ds.lat.values, 'test'
+
+class TimeSlicedForcing(ForcingReader):
+	"""Returns wind for the requested times from one in-memory dataset."""
+	def __init__(self, ds):
+		self.ds = ds
+		self.calls = []
+
+	def __call__(self, grid, start_time, end_time, expansion_factor):
+		self.calls.append((pd.Timestamp(start_time), pd.Timestamp(end_time)))
+		return self.ds.sel(time=slice(start_time, end_time))
+
+def create_grid():
+	grid = Grid(lon=(5,6), lat=(60,61), name='CacheTest')
+	grid.set_spacing(nx=4, ny=4)
+	grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+	return grid
+
+def create_boundary_data(grid):
+	bnd_points = grid.boundary_points()
+	time = pd.date_range('2020-01-30T00:00', '2020-02-02T21:00', freq='3H')
+	freq = np.linspace(0.04, 0.5, 5)
+	dirs = np.arange(0, 360, 30.)
+	np.random.seed(9)
+	spec = np.random.exponential(0.5, (len(time), len(bnd_points), len(freq), len(dirs))).astype(np.float32)
+	return Boundary(grid).compile_to_xr(time, freq, dirs, spec, bnd_points[:,0], bnd_points[:,1], 'test')
+
+def create_forcing_data():
+	time = pd.date_range('2020-01-30T00:00', '2020-02-02T23:00', freq='1H')
+	np.random.seed(10)
+	u = np.random.normal(0, 10, (len(time), 5, 5))
+	v = np.random.normal(0, 10, (len(time), 5, 5))
+	return xr.Dataset(data_vars=dict(u=(['time', 'lat', 'lon'], u), v=(['time', 'lat', 'lon'], v)),
+		coords=dict(time=time, lat=np.linspace(60,61,5), lon=np.linspace(5,6,5)))
+
+class CacheTestCase(unittest.TestCase):
+	def setUp(self):
+		self.cwd = os.getcwd()
+		self.tmpdir = tempfile.TemporaryDirectory()
+		os.chdir(self.tmpdir.name)
+
+	def tearDown(self):
+		os.chdir(self.cwd)
+		self.tmpdir.cleanup()
+
+class BoundaryCache(CacheTestCase):
+	def import_boundary(self, reader, end_time, cache_format, lazy=False):
+		boundary = Boundary(create_grid())
+		boundary.import_boundary('2020-01-30T00:00', end_time, reader, write_cache=True, read_cache=True, cache_format=cache_format, lazy=lazy)
+		return boundary
+
+	def check_patching(self, cache_format, lazy=False):
+		ds = create_boundary_data(create_grid())
+		self.import_boundary(TimeSlicedBoundary(ds), '2020-01-31T21:00', cache_format)
+
+		reader = TimeSlicedBoundary(ds)
+		boundary = self.import_boundary(reader, '2020-02-02T21:00', cache_format, lazy=lazy)
+
+		# Only the missing period is read from the original source
+		self.assertEqual(reader.calls, [(pd.Timestamp('2020-02-01T00:00'), pd.Timestamp('2020-02-02T21:00'))])
+		self.assertIsNone(np.testing.assert_array_equal(boundary.time(), pd.to_datetime(ds.time.values)))
+		self.assertIsNone(np.testing.assert_array_equal(np.asarray(boundary.spec()), ds.spec.values))
+		return ds
+
+	def test_netcdf(self):
+		self.check_patching('nc')
+		self.assertEqual(sorted([os.path.basename(f) for f in glob.glob('bnd_cache/TimeSlicedBoundary/*.nc')]), ['CacheTest_5.00_6.00_60.00_61.00_2020-01.nc', 'CacheTest_5.00_6.00_60.00_61.00_2020-02.nc'])
+
+	def test_zarr(self):
+		ds = self.check_patching('zarr')
+		cached = xr.open_zarr('bnd_cache/TimeSlicedBoundary/CacheTest_5.00_6.00_60.00_61.00.zarr', consolidated=True)
+		# Time steps are appended only once
+		self.assertEqual(len(cached.time), len(ds.time))
+		self.assertIsNone(np.testing.assert_array_equal(cached.sortby('time').spec.values, ds.spec.values))
+
+	def test_zarr_lazy(self):
+		self.check_patching('zarr', lazy=True)
+
+	def test_unknown_format(self):
+		with self.assertRaises(ValueError):
+			self.import_boundary(TimeSlicedBoundary(create_boundary_data(create_grid())), '2020-01-31T21:00', 'hdf')
+
+class BoundaryCacheCoverage(CacheTestCase):
+	def setUp(self):
+		super().setUp()
+		self.ds = create_boundary_data(create_grid())
+		self.folder = 'bnd_cache/TimeSlicedBoundary'
+		self.name = 'CacheTest_5.00_6.00_60.00_61.00'
+
+	def import_boundary(self, start_time, end_time, read_cache=True, write_cache=True):
+		reader = TimeSlicedBoundary(self.ds)
+		boundary = Boundary(create_grid())
+		boundary.import_boundary(start_time, end_time, reader, write_cache=write_cache, read_cache=read_cache)
+		return boundary, reader
+
+	def coverage(self):
+		with open(f'{self.folder}/coverage.json', 'r') as f:
+			return json.load(f)[self.name]['nc']
+
+	def test_coverage_is_merged(self):
+		self.import_boundary('2020-01-30T00:00', '2020-01-31T21:00')
+		self.import_boundary('2020-02-01T00:00', '2020-02-01T21:00')
+		self.assertEqual(self.coverage(), {'dt': '0 days 03:00:00', 'intervals': [['2020-01-30T00:00:00', '2020-02-01T21:00:00']]})
+
+	def test_uncovered_period_is_not_read_from_cache(self):
+		self.import_boundary('2020-01-30T00:00', '2020-01-30T21:00')
+		boundary, reader = self.import_boundary('2020-02-01T00:00', '2020-02-01T21:00')
+		self.assertEqual(reader.calls, [(pd.Timestamp('2020-02-01T00:00'), pd.Timestamp('2020-02-01T21:00'))])
+		self.assertIsInstance(boundary._history[0], TimeSlicedBoundary)
+
+	def test_gap_is_patched(self):
+		self.import_boundary('2020-01-30T00:00', '2020-01-30T21:00')
+		self.import_boundary('2020-02-01T00:00', '2020-02-01T21:00')
+		boundary, reader = self.import_boundary('2020-01-30T00:00', '2020-02-01T21:00')
+		self.assertEqual(reader.calls, [(pd.Timestamp('2020-01-31T00:00'), pd.Timestamp('2020-01-31T21:00'))])
+		self.assertIsNone(np.testing.assert_array_equal(boundary.spec(), self.ds.sel(time=slice('2020-01-30T00:00', '2020-02-01T21:00')).spec.values))
+
+	def test_overwritten_month_is_removed_from_coverage(self):
+		self.import_boundary('2020-01-30T00:00', '2020-02-02T21:00')
+		# Overwrites the file for February
+		self.import_boundary('2020-02-02T00:00', '2020-02-02T21:00', read_cache=False)
+		self.assertEqual(self.coverage()['intervals'], [['2020-01-30T00:00:00', '2020-01-31T21:00:00'], ['2020-02-02T00:00:00', '2020-02-02T21:00:00']])
+
+	def test_cache_without_coverage_file(self):
+		self.import_boundary('2020-01-30T00:00', '2020-01-31T21:00')
+		os.remove(f'{self.folder}/coverage.json')
+		boundary, reader = self.import_boundary('2020-01-30T00:00', '2020-02-01T21:00', write_cache=False)
+		self.assertEqual(reader.calls, [(pd.Timestamp('2020-02-01T00:00'), pd.Timestamp('2020-02-01T21:00'))])
+		self.assertEqual(self.coverage()['intervals'], [['2020-01-30T00:00:00', '2020-01-31T21:00:00']])
+
+	def test_deleted_cache_file(self):
+		self.import_boundary('2020-01-30T00:00', '2020-02-01T21:00')
+		os.remove(f'{self.folder}/{self.name}_2020-01.nc')
+		boundary, reader = self.import_boundary('2020-01-30T00:00', '2020-02-01T21:00', write_cache=False)
+		self.assertEqual(reader.calls, [(pd.Timestamp('2020-01-30T00:00'), pd.Timestamp('2020-01-31T21:00'))])
+		self.assertIsNone(np.testing.assert_array_equal(boundary.spec(), self.ds.sel(time=slice('2020-01-30T00:00', '2020-02-01T21:00')).spec.values))
+		self.assertEqual(self.coverage()['intervals'], [['2020-02-01T00:00:00', '2020-02-01T21:00:00']])
+
+	def test_deleted_cache(self):
+		self.import_boundary('2020-01-30T00:00', '2020-01-31T21:00')
+		for f in glob.glob(f'{self.folder}/*.nc'):
+			os.remove(f)
+		self.import_boundary('2020-02-01T00:00', '2020-02-01T21:00', read_cache=False)
+		self.assertEqual(self.coverage()['intervals'], [['2020-02-01T00:00:00', '2020-02-01T21:00:00']])
+
+	def test_missing_periods(self):
+		dt = pd.Timedelta(hours=1)
+		intervals = [[pd.Timestamp('2020-01-01T03:00'), pd.Timestamp('2020-01-01T05:00')],
+					[pd.Timestamp('2020-01-01T08:00'), pd.Timestamp('2020-01-01T10:00')]]
+		patch_start, patch_end = aux_funcs.missing_periods(intervals, dt, '2020-01-01T00:00', '2020-01-01T12:00')
+		self.assertEqual(patch_start, [pd.Timestamp('2020-01-01T00:00'), pd.Timestamp('2020-01-01T06:00'), pd.Timestamp('2020-01-01T11:00')])
+		self.assertEqual(patch_end, [pd.Timestamp('2020-01-01T02:00'), pd.Timestamp('2020-01-01T07:00'), pd.Timestamp('2020-01-01T12:00')])
+
+		patch_start, patch_end = aux_funcs.missing_periods(intervals, dt, '2020-01-01T04:00', '2020-01-01T05:00')
+		self.assertEqual(patch_start, [])
+
+class ForcingCache(CacheTestCase):
+	def import_forcing(self, reader, end_time, cache_format):
+		forcing = Forcing(create_grid())
+		forcing.import_forcing('2020-01-30T00:00', end_time, reader, write_cache=True, read_cache=True, cache_format=cache_format)
+		return forcing
+
+	def test_zarr(self):
+		ds = create_forcing_data()
+		self.import_forcing(TimeSlicedForcing(ds), '2020-01-31T23:00', 'zarr')
+
+		reader = TimeSlicedForcing(ds)
+		forcing = self.import_forcing(reader, '2020-02-02T23:00', 'zarr')
+		self.assertEqual(reader.calls, [(pd.Timestamp('2020-02-01T00:00'), pd.Timestamp('2020-02-02T23:00'))])
+		self.assertIsNone(np.testing.assert_array_equal(forcing.u(), ds.u.values))
+		self.assertIsNone(np.testing.assert_array_equal(forcing.v(), ds.v.values))
+
+		cached = xr.open_zarr('wnd_cache/TimeSlicedForcing/CacheTest_5.00_6.00_60.00_61.00.zarr', consolidated=True)
+		self.assertEqual(len(cached.time), len(ds.time))
+
+class ZarrAppend(unittest.TestCase):
+	def wind(self, start_time, end_time, lon=(5., 5.5, 6.)):
+		time = pd.date_range(start_time, end_time, freq='1H')
+		u = np.ones((len(time), 2, len(lon)))*np.arange(len(time))[:, None, None]
+		return xr.Dataset({'u': (['time', 'lat', 'lon'], u)}, coords={'time': time, 'lat': [60., 61.], 'lon': list(lon)})
+
+	def test_daily_chunks(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			store = f'{tmpdir}/wind.zarr'
+			self.assertEqual(aux_funcs.append_to_zarr_cache(self.wind('2020-01-01T00:00', '2020-01-02T11:00'), store), 36)
+			self.assertEqual(aux_funcs.append_to_zarr_cache(self.wind('2020-01-02T00:00', '2020-01-04T23:00'), store), 60)
+			cached = xr.open_zarr(store, consolidated=True)
+			self.assertEqual(cached.u.encoding['chunks'][0], 24)
+			self.assertEqual(len(cached.time), 96)
+			self.assertEqual(len([f for f in os.listdir(f'{store}/u') if not f.startswith('.')]), 4)
+			self.assertIsNone(np.testing.assert_array_equal(cached.u.values[36:,0,0], np.arange(12, 72)))
+
+	def test_different_coordinates(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			store = f'{tmpdir}/wind.zarr'
+			aux_funcs.append_to_zarr_cache(self.wind('2020-01-01T00:00', '2020-01-01T23:00'), store)
+			with self.assertRaises(ValueError):
+				aux_funcs.append_to_zarr_cache(self.wind('2020-01-02T00:00', '2020-01-02T23:00', lon=(5., 5.6, 6.)), store)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.wnd.read_ec import ERA5
+from dnora.aux_funcs import month_periods, download_from_cds
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+class FakeCdsClient:
+	"""Writes a small ERA5-like wind file instead of contacting the CDS.
+
+	netCDF4 is not thread safe, so the files are written one at a time."""
+	def __init__(self):
+		self.requests = []
+		self.lock = threading.Lock()
+
+	def retrieve(self, dataset, request, target):
+		self.requests.append(request)
+		days = np.atleast_1d(request['day'])
+		time = pd.date_range(f"{request['year']}-{request['month']}-{days[0]}T00:00", f"{request['year']}-{request['month']}-{days[-1]}T23:00", freq='1H')
+		lat = np.array([61., 60.5, 60.])
+		lon = np.array([5., 5.5, 6.])
+		u = np.ones((len(time), len(lat), len(lon)))*time.day.values[:, None, None]
+		ds = xr.Dataset({'u10': (['time', 'latitude', 'longitude'], u), 'v10': (['time', 'latitude', 'longitude'], -u)},
+					coords={'time': time, 'latitude': lat, 'longitude': lon})
+		with self.lock:
+			ds.to_netcdf(target)
+
+class MonthPeriods(unittest.TestCase):
+	def test_over_new_year(self):
+		periods = month_periods('2019-12-15T06:00', '2020-02-03T00:00')
+		self.assertEqual(len(periods), 3)
+		self.assertEqual(periods[0], (pd.Timestamp('2019-12-01'), pd.Timestamp('2019-12-31')))
+		self.assertEqual(periods[2], (pd.Timestamp('2020-02-01'), pd.Timestamp('2020-02-29')))
+
+class CdsDownload(unittest.TestCase):
+	def test_requests_are_cached(self):
+		client = FakeCdsClient()
+		requests = [{'year': '2020', 'month': '01', 'day': ['01', '02']}, {'year': '2020', 'month': '02', 'day': ['01', '02']}]
+		with tempfile.TemporaryDirectory() as tmpdir:
+			files = download_from_cds('test-dataset', requests, tmpdir, client=client, max_workers=2)
+			self.assertEqual(len(client.requests), 2)
+			self.assertEqual(len(set(files)), 2)
+			self.assertTrue(all([os.path.isfile(f) for f in files]))
+
+			requests.append({'year': '2020', 'month': '03', 'day': ['01', '02']})
+			new_files = download_from_cds('test-dataset', requests, tmpdir, client=client)
+			self.assertEqual(len(client.requests), 3)
+			self.assertEqual(new_files[:2], files)
+
+	def test_era5_wind_only_missing_months(self):
+		client = FakeCdsClient()
+		grid = Grid(lon=(5.2,5.8), lat=(60.2,60.8))
+		with tempfile.TemporaryDirectory() as tmpdir:
+			reader = ERA5(folder=tmpdir, client=client, max_workers=2)
+			wind = reader(grid, '2020-01-30T00:00', '2020-02-02T12:00', expansion_factor=1.2)
+			self.assertEqual(len(client.requests), 2)
+			self.assertEqual(pd.Timestamp(wind.time.values[0]), pd.Timestamp('2020-01-30T00:00'))
+			self.assertEqual(pd.Timestamp(wind.time.values[-1]), pd.Timestamp('2020-02-02T12:00'))
+			self.assertIsNone(np.testing.assert_array_equal(wind.lat.values, [60., 60.5, 61.]))
+			self.assertIsNone(np.testing.assert_array_equal(wind.u.values[:,0,0], pd.to_datetime(wind.time.values).day))
+
+			wind = reader(grid, '2020-02-20T00:00', '2020-03-01T00:00', expansion_factor=1.2)
+			self.assertEqual(len(client.requests), 3)
+			self.assertEqual(client.requests[-1]['month'], '03')
+
+if __name__ == '__main__':
+	unittest.main()
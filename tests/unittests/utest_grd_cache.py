@@ -0,0 +1,94 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.read import GEBCO2021, ForceFeed
+from dnora import aux_funcs
+import numpy as np
+import xarray as xr
+
+class CountingGEBCO(GEBCO2021):
+	def __init__(self, **kwargs):
+		super().__init__(**kwargs)
+		self.calls = []
+
+	def __call__(self, lon_min, lon_max, lat_min, lat_max):
+		self.calls.append((lon_min, lon_max, lat_min, lat_max))
+		return super().__call__(lon_min, lon_max, lat_min, lat_max)
+
+def write_gebco_file(filename):
+	lon = np.arange(4, 7, 0.05)
+	lat = np.arange(59, 62, 0.05)
+	np.random.seed(6)
+	elevation = np.random.uniform(-300, 50, (len(lat), len(lon)))
+	xr.Dataset(data_vars=dict(elevation=(['lat', 'lon'], elevation)), coords=dict(lon=lon, lat=lat)).to_netcdf(filename)
+
+def import_topo(reader, lon=(5,6), lat=(60,61), **kwargs):
+	grid = Grid(lon=lon, lat=lat)
+	grid.set_spacing(nx=5, ny=5)
+	grid.import_topo(reader, **kwargs)
+	return grid
+
+class TopoCache(unittest.TestCase):
+	def setUp(self):
+		self.cwd = os.getcwd()
+		self.tmpdir = tempfile.TemporaryDirectory()
+		os.chdir(self.tmpdir.name)
+		write_gebco_file('gebco_2021_test.nc')
+
+	def tearDown(self):
+		os.chdir(self.cwd)
+		self.tmpdir.cleanup()
+
+	def test_same_area(self):
+		reader = CountingGEBCO(tile='test', folder='.')
+		direct = import_topo(reader)
+		import_topo(reader, write_cache=True)
+		cached = import_topo(reader, read_cache=True)
+		self.assertEqual(len(reader.calls), 2)
+		self.assertIsNone(np.testing.assert_array_equal(cached.raw_topo(), direct.raw_topo()))
+		self.assertIsNone(np.testing.assert_array_equal(cached.raw_lon(), direct.raw_lon()))
+		self.assertIsNone(np.testing.assert_array_equal(cached.raw_lat(), direct.raw_lat()))
+
+	def test_contained_area(self):
+		reader = CountingGEBCO(tile='test', folder='.')
+		import_topo(reader, write_cache=True)
+		direct = import_topo(reader, lon=(5.2,5.7), lat=(60.1,60.6))
+		cached = import_topo(reader, lon=(5.2,5.7), lat=(60.1,60.6), read_cache=True)
+		self.assertEqual(len(reader.calls), 2)
+		self.assertIsNone(np.testing.assert_array_equal(cached.raw_topo(), direct.raw_topo()))
+		self.assertIsNone(np.testing.assert_array_equal(cached.raw_lon(), direct.raw_lon()))
+
+		# Not contained
+		import_topo(reader, lon=(5.5,6.5), lat=(60,61), read_cache=True)
+		self.assertEqual(len(reader.calls), 3)
+
+	def test_changed_source(self):
+		reader = CountingGEBCO(tile='test', folder='.')
+		import_topo(reader, write_cache=True)
+		stat = os.stat('gebco_2021_test.nc')
+		os.utime('gebco_2021_test.nc', (stat.st_atime, stat.st_mtime+10))
+		import_topo(reader, read_cache=True)
+		self.assertEqual(len(reader.calls), 2)
+
+	def test_no_source_files(self):
+		topo = np.ones((3,3))*10
+		grid = import_topo(ForceFeed(topo, np.array([5,5.5,6]), np.array([60,60.5,61])), write_cache=True, read_cache=True)
+		self.assertFalse(os.path.isdir('topo_cache'))
+		self.assertIsNone(np.testing.assert_array_equal(grid.raw_topo(), topo.ravel()))
+
+	def test_least_recently_used_is_evicted(self):
+		folder = aux_funcs.setup_topo_cache('Test')
+		topo = np.ones(100)
+		entries = []
+		for n in range(3):
+			entries.append(aux_funcs.write_topo_cache(folder, 'key', (n, n+1, 0, 1), topo, topo, topo, max_bytes=3*2400))
+		# Using the first entry makes the second one the least recently used
+		aux_funcs.read_topo_cache(folder, 'key', (0, 1, 0, 1))
+		entries.append(aux_funcs.write_topo_cache(folder, 'key', (3, 4, 0, 1), topo, topo, topo, max_bytes=3*2400))
+		self.assertEqual([os.path.isdir(e) for e in entries], [True, False, True, True])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import sys
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.read import ForceFeed
+from dnora.grd.mesh import Interpolate, RegularGrid, BlockAverage
+from dnora.aux_funcs import force_to_xyz
+import numpy as np
+
+def linear_topo():
+	lon = np.linspace(4.9, 6.1, 49)
+	lat = np.linspace(59.9, 61.1, 61)
+	lon0, lat0 = np.meshgrid(lon, lat)
+	topo = 100 + 20*(lon0-5) + 50*(lat0-60)
+	return topo, lon, lat
+
+def query_points():
+	lonQ, latQ = np.meshgrid(np.linspace(5.013, 5.987, 13), np.linspace(60.017, 60.983, 9))
+	return lonQ, latQ
+
+class RegularGridMesher(unittest.TestCase):
+	def test_linear_same_as_griddata(self):
+		topo, lon, lat = linear_topo()
+		lonQ, latQ = query_points()
+		expected = Interpolate(method='linear')(*force_to_xyz(topo, lon, lat), lonQ, latQ)
+
+		meshed = RegularGrid(method='linear')(topo, lon, lat, lonQ, latQ)
+		self.assertIsNone(np.testing.assert_array_almost_equal(meshed, expected))
+
+		# Rectilinear xyz-data, also in reversed order
+		z, x, y = force_to_xyz(topo, lon, lat)
+		meshed = RegularGrid(method='linear')(z[::-1], x[::-1], y[::-1], lonQ, latQ)
+		self.assertIsNone(np.testing.assert_array_almost_equal(meshed, expected))
+
+	def test_nearest_same_as_griddata(self):
+		__, lon, lat = linear_topo()
+		np.random.seed(2)
+		topo = np.random.uniform(1, 100, (len(lat), len(lon)))
+		lonQ, latQ = query_points()
+		expected = Interpolate(method='nearest')(*force_to_xyz(topo, lon, lat), lonQ, latQ)
+		meshed = RegularGrid(method='nearest')(topo, lon, lat, lonQ, latQ)
+		self.assertIsNone(np.testing.assert_array_equal(meshed, expected))
+
+	def test_average(self):
+		__, lon, lat = linear_topo()
+		np.random.seed(3)
+		topo = np.random.uniform(-10, 100, (len(lat), len(lon)))
+		lonQ, latQ = np.meshgrid(np.linspace(5, 6, 5), np.linspace(60, 61, 4))
+		meshed = RegularGrid(method='average')(topo, lon, lat, lonQ, latQ)
+
+		dlon, dlat = 0.25, 1/3
+		land_as_zero = np.maximum(topo, 0)
+		for i in range(latQ.shape[0]):
+			for j in range(lonQ.shape[1]):
+				in_lon = np.logical_and(lon >= lonQ[0,j]-dlon/2, lon < lonQ[0,j]+dlon/2)
+				in_lat = np.logical_and(lat >= latQ[i,0]-dlat/2, lat < latQ[i,0]+dlat/2)
+				self.assertAlmostEqual(meshed[i,j], np.mean(land_as_zero[in_lat,:][:,in_lon]))
+
+	def test_not_rectilinear(self):
+		np.random.seed(4)
+		x, y = np.random.uniform(4.9, 6.1, 500), np.random.uniform(59.9, 61.1, 500)
+		z = 100 + 20*(x-5) + 50*(y-60)
+		lonQ, latQ = query_points()
+		expected = Interpolate(method='linear')(z.copy(), x, y, lonQ, latQ)
+		meshed = RegularGrid(method='linear')(z.copy(), x, y, lonQ, latQ)
+		self.assertIsNone(np.testing.assert_array_equal(meshed, expected))
+
+def brute_force_block(z, x, y, lonQ, latQ, function):
+	dlon = lonQ[0,1]-lonQ[0,0]
+	dlat = latQ[1,0]-latQ[0,0]
+	z = np.maximum(z, 0)
+	meshed = np.full(lonQ.shape, np.nan)
+	for i in range(lonQ.shape[0]):
+		for j in range(lonQ.shape[1]):
+			in_lon = np.logical_and(x >= lonQ[0,j]-dlon/2, x < lonQ[0,j]+dlon/2)
+			in_lat = np.logical_and(y >= latQ[i,0]-dlat/2, y < latQ[i,0]+dlat/2)
+			in_cell = np.logical_and(in_lon, in_lat)
+			if np.any(in_cell):
+				meshed[i,j] = function(z[in_cell])
+	return meshed
+
+class BlockAverageMesher(unittest.TestCase):
+	def setUp(self):
+		np.random.seed(5)
+		self.x = np.random.uniform(4.9, 6.1, 5000)
+		self.y = np.random.uniform(59.9, 61.1, 5000)
+		self.z = np.random.uniform(-20, 100, 5000)
+		self.lonQ, self.latQ = np.meshgrid(np.linspace(5, 6, 6), np.linspace(60, 61, 5))
+
+	def test_statistics(self):
+		for statistic, function in [('mean', np.mean), ('median', np.median), ('min', np.min)]:
+			meshed = BlockAverage(statistic=statistic)(self.z.copy(), self.x, self.y, self.lonQ, self.latQ)
+			expected = brute_force_block(self.z, self.x, self.y, self.lonQ, self.latQ, function)
+			self.assertIsNone(np.testing.assert_array_almost_equal(meshed, expected))
+
+	def test_empty_cells_get_nearest_value(self):
+		# Remove all data from one cell
+		in_cell = np.logical_and(np.abs(self.x-5.4) < 0.1, np.abs(self.y-60.5) < 0.125)
+		meshed = BlockAverage()(self.z[~in_cell], self.x[~in_cell], self.y[~in_cell], self.lonQ, self.latQ)
+		self.assertFalse(np.any(np.isnan(meshed)))
+		self.assertIn(meshed[2,2], [meshed[2,1], meshed[2,3], meshed[1,2], meshed[3,2]])
+
+	def test_unknown_statistic(self):
+		with self.assertRaises(ValueError):
+			BlockAverage(statistic='max')
+
+class GridKeepMatrix(unittest.TestCase):
+	def test_import_and_mesh(self):
+		topo, lon, lat = linear_topo()
+		grids = []
+		for keep_matrix in [False, True]:
+			grid = Grid(lon=(5,6), lat=(60,61))
+			grid.set_spacing(nx=11, ny=7)
+			grid.import_topo(ForceFeed(topo, lon, lat), keep_matrix=keep_matrix)
+			grids.append(grid)
+
+		self.assertFalse(grids[0].raw_topo_is_matrix())
+		self.assertTrue(grids[1].raw_topo_is_matrix())
+		self.assertIsNone(np.testing.assert_array_equal(grids[0].raw_topo(), grids[1].raw_topo()))
+		self.assertIsNone(np.testing.assert_array_equal(grids[0].raw_lon(), grids[1].raw_lon()))
+		self.assertIsNone(np.testing.assert_array_equal(grids[0].raw_lat(), grids[1].raw_lat()))
+
+		grids[0].mesh_grid(Interpolate(method='linear'))
+		grids[1].mesh_grid(RegularGrid(method='linear'))
+		self.assertIsNone(np.testing.assert_array_almost_equal(grids[0].topo(), grids[1].topo()))
+
+	def test_xyz_converted_once(self):
+		topo, lon, lat = linear_topo()
+		grid = Grid(lon=(5,6), lat=(60,61))
+		grid.set_spacing(nx=11, ny=7)
+		grid.import_topo(ForceFeed(topo, lon, lat), keep_matrix=True)
+		grid.mesh_grid(RegularGrid(method='linear'))
+		self.assertNotIn('raw_xyz', grid._derived)
+
+		raw_lon = grid.raw_lon(view=True)
+		self.assertIs(grid._raw_xyz()[1], grid._derived['raw_xyz'][1])
+		self.assertFalse(raw_lon.flags.writeable)
+		self.assertTrue(grid.raw_lon().flags.writeable)
+
+		old_topo = grid.raw_topo()
+		grid.import_topo(ForceFeed(2*topo, lon, lat), keep_matrix=True)
+		self.assertIsNone(np.testing.assert_array_equal(grid.raw_topo(), 2*old_topo))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import tempfile
+import glob
+sys.path.insert(0, "../../")
+from dnora.grd.read import KartverketNo50m
+from dnora.aux_funcs import expand_area
+import numpy as np
+import pandas as pd
+import utm
+
+def reference_kartverket(reader, lon_min, lon_max, lat_min, lat_max):
+	"""Original point-by-point implementation of KartverketNo50m."""
+	lon0, lon1, lat0, lat1 = expand_area(lon_min, lon_max, lat_min, lat_max, reader.expansion_factor)
+	df = pd.concat([pd.read_csv(f, sep= ' ', header=None) for f in sorted(glob.glob(reader.source))])
+	df.columns = ['x','y','z']
+	x = np.array(df['x'].astype(float))
+	y = np.array(df['y'].astype(float))
+	z = np.array(df['z'].astype(float))
+	lat, lon = utm.to_latlon(x, y, reader.utmzone, northern=True, strict=False)
+	mask = np.logical_and(np.logical_and(lat0 <= lat, lat <= lat1), np.logical_and(lon0 <= lon, lon <= lon1))
+	x, y, topo = x[mask], y[mask], z[mask]
+	x_grid = np.unique(x)
+	y_grid = np.unique(y)
+	grid = np.empty((len(y_grid),len(x_grid)))
+	grid[:] = np.nan
+	for i in range(len(topo)):
+		xpos = np.where(x_grid==x[i])[0][0]
+		ypos = np.where(y_grid==y[i])[0][0]
+		grid[ypos][xpos] = topo[i]
+	df = pd.DataFrame(grid)
+	df = df.unstack().reset_index()
+	df['x'] = [x_grid[i] for i in df['level_0']]
+	df['y'] = [y_grid[i] for i in df['level_1']]
+	topo_lat, topo_lon = utm.to_latlon(df['x'], df['y'], 33, northern=True, strict = False)
+	topo = df[0]
+	mask = np.logical_and(np.logical_and(lat0 < topo_lat, topo_lat < lat1), np.logical_and(lon0 < topo_lon, topo_lon < lon1))
+	return np.array(topo[mask]), np.array(topo_lon[mask]), np.array(topo_lat[mask])
+
+def write_tile(filename, x, y, seed):
+	np.random.seed(seed)
+	xx, yy = np.meshgrid(x, y)
+	xx, yy = xx.ravel(), yy.ravel()
+	zz = np.round(np.random.uniform(-5, 200, len(xx)), 2)
+	# Land points are missing from the files
+	keep = np.random.uniform(size=len(xx)) > 0.2
+	np.savetxt(filename, np.column_stack((xx[keep], yy[keep], zz[keep])), fmt='%.2f', delimiter=' ')
+
+class KartverketReader(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		write_tile(f'{self.tmpdir.name}/B0001_grid50_utm33.xyz', np.arange(490000, 500000, 250.), np.arange(7540000, 7550000, 250.), 1)
+		write_tile(f'{self.tmpdir.name}/B0002_grid50_utm33.xyz', np.arange(500000, 510000, 250.), np.arange(7540000, 7550000, 250.), 2)
+		self.area = (14.85, 15.15, 67.96, 68.04)
+
+	def tearDown(self):
+		self.tmpdir.cleanup()
+
+	def check_same_as_reference(self, **kwargs):
+		reader = KartverketNo50m(folder=self.tmpdir.name, **kwargs)
+		topo, lon, lat = reader(*self.area)
+		ref_topo, ref_lon, ref_lat = reference_kartverket(reader, *self.area)
+		self.assertGreater(len(topo), 0)
+		self.assertIsNone(np.testing.assert_array_equal(topo, ref_topo))
+		self.assertIsNone(np.testing.assert_array_equal(lon, ref_lon))
+		self.assertIsNone(np.testing.assert_array_equal(lat, ref_lat))
+
+	def test_one_tile(self):
+		self.check_same_as_reference(tile='B0001')
+
+	def test_many_tiles_in_chunks(self):
+		self.check_same_as_reference(tile='B*', chunksize=1000, max_workers=2)
+
+	def test_no_tiles_or_no_data(self):
+		with self.assertRaisesRegex(ValueError, 'No Kartverket tiles'):
+			KartverketNo50m(folder=self.tmpdir.name, tile='C*')(*self.area)
+		with self.assertRaisesRegex(ValueError, 'No Kartverket data'):
+			KartverketNo50m(folder=self.tmpdir.name, tile='B*')(5., 5.1, 60., 60.1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.write import Xyz, REEF3D, write_rows
+import numpy as np
+import utm
+
+def create_grid():
+	grid = Grid(lon=(5,6), lat=(60,61))
+	grid.set_spacing(nx=7, ny=5)
+	np.random.seed(5)
+	topo = np.random.uniform(-20, 200, (grid.ny(), grid.nx()))
+	topo[topo < 0] = np.nan
+	grid.data.topo.values = topo
+	return grid
+
+def reference_xyz(grid, filename, use_utm):
+	"""Original point by point Xyz-writer."""
+	z, x, y = grid.topo(), grid.lon(), grid.lat()
+	with open(filename, 'w') as f:
+		f.write(f'{filename}\n')
+		for nx, lon in enumerate(x):
+			for ny, lat in enumerate(y):
+				if use_utm:
+					[lon_out, lat_out, utm_zone, utm_letter] = utm.from_latlon(lat, lon, 33, 'W')
+					fmt='.4f'
+				else:
+					lon_out=lon
+					lat_out=lat
+					fmt='.9f'
+				if ~np.isnan(z[ny,nx]):
+					f.write(f'{lon_out:{fmt}},{lat_out:{fmt}},{z[ny,nx]:.1f}\n')
+
+def reference_reef3d(grid, filename):
+	"""Original point by point REEF3D-writer."""
+	z = grid.topo()
+	x, y = np.meshgrid(np.linspace(0,grid.nx()*grid.dx(),grid.nx()), np.linspace(0,grid.ny()*grid.dy(),grid.ny()))
+	x, y, z = x.ravel(), y.ravel(), z.ravel()
+	z = -1*z +np.nanmax(z)
+	z[np.isnan(z)] = np.nanmax(z) + 14
+	with open(filename, 'w') as f:
+		for i, __ in enumerate(x):
+			f.write(f'{x[i]:.5f} {y[i]:.5f} {z[i]:.1f}\n')
+
+def read_file(filename):
+	with open(filename) as f:
+		return f.read()
+
+class WriteRows(unittest.TestCase):
+	def test_blocks(self):
+		data = np.arange(15.).reshape(5, 3)
+		with tempfile.TemporaryDirectory() as tmpdir:
+			with open(f'{tmpdir}/rows.txt', 'w') as f:
+				write_rows(f, data, '%.1f %.2f %.0f\n', block_size=2)
+			self.assertEqual(read_file(f'{tmpdir}/rows.txt').splitlines()[-1], '12.0 13.00 14')
+
+class XyzWriter(unittest.TestCase):
+	def test_same_as_point_by_point(self):
+		grid = create_grid()
+		with tempfile.TemporaryDirectory() as tmpdir:
+			for use_utm in [False, True]:
+				filename, reference = f'{tmpdir}/grid.xyz', f'{tmpdir}/reference.xyz'
+				Xyz(utm=use_utm)(grid, filename)
+				reference_xyz(grid, reference, use_utm)
+				self.assertEqual(read_file(filename).splitlines()[1:], read_file(reference).splitlines()[1:])
+
+	def test_binary(self):
+		grid = create_grid()
+		with tempfile.TemporaryDirectory() as tmpdir:
+			files = Xyz(binary='npy')(grid, f'{tmpdir}/grid.xyz')
+			self.assertEqual(files[1], f'{tmpdir}/grid.npy')
+			data = np.load(files[1])
+			self.assertEqual(data.shape, (np.sum(~np.isnan(grid.topo())), 3))
+			self.assertIsNone(np.testing.assert_almost_equal(data, np.loadtxt(files[0], delimiter=',', skiprows=1), decimal=1))
+
+			files = Xyz(binary='raw')(grid, f'{tmpdir}/grid.xyz')
+			self.assertIsNone(np.testing.assert_array_equal(np.fromfile(files[1], dtype=np.float32).reshape(-1, 3), data.astype(np.float32)))
+
+		with self.assertRaises(ValueError):
+			Xyz(binary='hdf5')
+
+class REEF3DWriter(unittest.TestCase):
+	def test_same_as_point_by_point(self):
+		grid = create_grid()
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filename, reference = f'{tmpdir}/grid.dat', f'{tmpdir}/reference.dat'
+			self.assertEqual(REEF3D()(grid, filename), filename)
+			reference_reef3d(grid, reference)
+			self.assertEqual(read_file(filename), read_file(reference))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import sys
 sys.path.insert(0, "../../")
 from dnora.grd import Grid
+from dnora.grd.mesh import Interpolate
+from dnora.grd.boundary import EdgesAsBoundary
 import numpy as np
 
 class GridMethodsInit(unittest.TestCase):
@@ -202,5 +204,54 @@ class GridMethodsDlonSpacing(unittest.TestCase):
 		self.assertIsNone(np.testing.assert_almost_equal(np.arange(1, 2.0, 0.11),grid.lon()))
 		self.assertIsNone(np.testing.assert_almost_equal(np.arange(0, 2.0, 0.09),grid.lat()))
 
+class GridMethodsEmptyTopo(unittest.TestCase):
+	def test_empty_topo_after_spacing(self):
+		grid = Grid(lon=(1,2), lat=(0,2))
+		grid.set_spacing(nx=10, ny=20)
+		self.assertIsNone(np.testing.assert_array_equal(grid.topo(), np.full((20,10), 9999.)))
+		self.assertTrue(grid.land_sea_mask().all())
+		self.assertFalse(grid.boundary_mask().any())
+		self.assertEqual(grid.raw_topo().shape, (200,))
+		self.assertIsNone(np.testing.assert_array_equal(grid.raw_topo(), 9999.))
+
+	def test_empty_topo_can_be_meshed(self):
+		grid = Grid(lon=(1,2), lat=(0,2))
+		grid.set_spacing(nx=10, ny=20)
+		grid.set_spacing(nx=5, ny=4)
+		self.assertEqual(grid.topo().shape, (4,5))
+		grid.mesh_grid(mesher=Interpolate(method='nearest'))
+		self.assertIsNone(np.testing.assert_array_equal(grid.topo(), np.full((4,5), 9999.)))
+
+class GridMethodsDerived(unittest.TestCase):
+	def test_boundary_points_invalidated(self):
+		grid = Grid(lon=(1,2), lat=(0,2))
+		grid.set_spacing(nx=5, ny=4)
+		self.assertEqual(grid.boundary_points().shape, (0,2))
+		grid.set_boundary(EdgesAsBoundary(edges=['N']))
+		self.assertEqual(grid.boundary_points().shape, (5,2))
+		self.assertIsNone(np.testing.assert_array_almost_equal(grid.boundary_points()[:,1], np.full(5, 2.)))
+		grid.set_boundary(EdgesAsBoundary(edges=['N', 'S']))
+		self.assertEqual(grid.boundary_points().shape, (10,2))
+		self.assertEqual(grid.number_of_points(), (20, 0, 10))
+		self.assertEqual((grid.boundary_nx(), grid.boundary_ny()), (6, 5))
+		grid.set_spacing(nx=3, ny=3)
+		self.assertEqual(grid.boundary_points().shape, (0,2))
+		self.assertEqual(grid.number_of_points(), (9, 0, 0))
+		self.assertEqual(grid.lon_edges(), (1, 2))
+
+	def test_views_are_read_only(self):
+		grid = Grid(lon=(1,2), lat=(0,2))
+		grid.set_spacing(nx=5, ny=4)
+		grid.set_boundary(EdgesAsBoundary(edges=['N']))
+		for array in [grid.lon(view=True), grid.land_sea_mask(view=True), grid.boundary_mask(view=True), grid.boundary_points(view=True)]:
+			self.assertFalse(array.flags.writeable)
+
+		points = grid.boundary_points()
+		points[0,0] = -99
+		mask = grid.land_sea_mask()
+		mask[0,0] = False
+		self.assertEqual(grid.boundary_points()[0,0], 1.)
+		self.assertTrue(grid.land_sea_mask()[0,0])
+
 if __name__ == '__main__':
 	unittest.main()
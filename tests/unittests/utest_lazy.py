@@ -0,0 +1,108 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.boundary import EdgesAsBoundary
+from dnora.bnd import Boundary
+from dnora.bnd.read import DnoraNc
+from dnora.bnd.process import processor_for_convention_change
+from dnora.bnd.write import SWAN, WW3
+from dnora.wnd import Forcing
+from dnora.wnd.read import DnoraNc as DnoraNcWind
+import numpy as np
+import pandas as pd
+import xarray as xr
+import dask.array as da
+import netCDF4
+
+def create_grid():
+	grid = Grid(lon=(5,6), lat=(60,61))
+	grid.set_spacing(nx=4, ny=4)
+	grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+	return grid
+
+def write_boundary_file(grid, filename):
+	boundary = Boundary(grid)
+	bnd_points = grid.boundary_points()
+	time = pd.date_range('2020-01-01T00:00', '2020-01-02T21:00', freq='3H')
+	freq = np.linspace(0.04, 0.5, 5)
+	dirs = np.arange(0, 360, 30.)
+	np.random.seed(7)
+	spec = np.random.exponential(0.5, (len(time), len(bnd_points), len(freq), len(dirs))).astype(np.float32)
+	boundary.compile_to_xr(time, freq, dirs, spec, bnd_points[:,0], bnd_points[:,1], 'test').to_netcdf(filename)
+
+def write_forcing_file(filename):
+	time = pd.date_range('2020-01-01T00:00', '2020-01-02T23:00', freq='1H')
+	np.random.seed(8)
+	u = np.random.normal(0, 10, (len(time), 5, 5))
+	v = np.random.normal(0, 10, (len(time), 5, 5))
+	xr.Dataset(data_vars=dict(u=(['time', 'lat', 'lon'], u), v=(['time', 'lat', 'lon'], v)),
+		coords=dict(time=time, lat=np.linspace(59.5,61.5,5), lon=np.linspace(4.5,6.5,5))).to_netcdf(filename)
+
+class LazyBoundary(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.grid = create_grid()
+		self.file = os.path.join(self.tmpdir.name, 'bnd.nc')
+		write_boundary_file(self.grid, self.file)
+
+	def tearDown(self):
+		self.tmpdir.cleanup()
+
+	def import_boundary(self, lazy):
+		boundary = Boundary(self.grid)
+		boundary.import_boundary('2020-01-01T00:00', '2020-01-02T21:00', DnoraNc(files=[self.file], convention='Ocean'), lazy=lazy)
+		return boundary
+
+	def test_spec_is_lazy(self):
+		self.assertFalse(self.import_boundary(lazy=False).is_lazy())
+		boundary = self.import_boundary(lazy=True)
+		self.assertTrue(boundary.is_lazy())
+		self.assertIsInstance(boundary.spec(), da.Array)
+
+	def test_processing_and_writing(self):
+		eager = self.import_boundary(lazy=False)
+		lazy = self.import_boundary(lazy=True)
+		for boundary in [eager, lazy]:
+			boundary.process_boundary(processor_for_convention_change(current_convention='Ocean', wanted_convention='Met'))
+
+		self.assertIsInstance(lazy.spec(), da.Array)
+		self.assertIsNone(np.testing.assert_array_equal(lazy.dirs(), eager.dirs()))
+		self.assertIsNone(np.testing.assert_array_equal(np.asarray(lazy.spec()), eager.spec()))
+
+		for writer, ext in [(SWAN(), 'asc'), (WW3(), 'nc')]:
+			output = []
+			for n, boundary in enumerate([eager, lazy]):
+				filename = os.path.join(self.tmpdir.name, f'out{n}.{ext}')
+				writer(boundary, filename)
+				if ext == 'asc':
+					with open(filename, 'r') as f:
+						output.append(f.read())
+				else:
+					with netCDF4.Dataset(filename) as ds:
+						output.append(ds['efth'][:])
+			if ext == 'asc':
+				self.assertEqual(output[0], output[1])
+			else:
+				self.assertIsNone(np.testing.assert_array_equal(output[0], output[1]))
+
+class LazyForcing(unittest.TestCase):
+	def test_u_v_are_lazy(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filename = os.path.join(tmpdir, 'wnd.nc')
+			write_forcing_file(filename)
+			eager = Forcing(create_grid())
+			eager.import_forcing('2020-01-01T00:00', '2020-01-02T23:00', DnoraNcWind(files=[filename]))
+			lazy = Forcing(create_grid())
+			lazy.import_forcing('2020-01-01T00:00', '2020-01-02T23:00', DnoraNcWind(files=[filename]), lazy=True)
+
+			self.assertIsInstance(eager.u(), np.ndarray)
+			self.assertIsInstance(lazy.u(), da.Array)
+			self.assertIsInstance(lazy.v(), da.Array)
+			self.assertEqual(lazy.size(), eager.size())
+			self.assertIsNone(np.testing.assert_array_equal(np.asarray(lazy.magnitude()), eager.magnitude()))
+
+if __name__ == '__main__':
+	unittest.main()
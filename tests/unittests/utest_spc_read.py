@@ -0,0 +1,70 @@
+import unittest
+import sys
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.grd.boundary import EdgesAsBoundary
+from dnora.bnd import Boundary
+from dnora.spc.read import BoundaryToSpectra
+import numpy as np
+import pandas as pd
+
+def create_boundary():
+	grid = Grid(lon=(5,6), lat=(60,61))
+	grid.set_spacing(nx=5, ny=5)
+	grid.set_boundary(EdgesAsBoundary(edges=['N','W','S','E']))
+	boundary = Boundary(grid)
+
+	bnd_points = grid.boundary_points()
+	time = pd.date_range('2020-01-01T00:00', '2020-01-02T12:00', freq='3H')
+	freq = np.linspace(0.04, 0.5, 7)
+	dirs = np.arange(0, 360, 30.)
+	np.random.seed(4)
+	spec = np.random.exponential(0.5, (len(time), len(bnd_points), len(freq), len(dirs)))
+	boundary.data = boundary.compile_to_xr(time, freq, dirs, spec, bnd_points[:,0], bnd_points[:,1], 'test')
+	boundary._convention = 'Ocean'
+	return boundary
+
+def reference_integration(boundary, start_time, end_time, inds):
+	"""Original xarray integration of the boundary spectra."""
+	theta = np.deg2rad(boundary.data.dirs)
+	dD = 360/len(boundary.data.dirs)
+	efth = boundary.data.sel(time=slice(start_time, end_time), x=inds).spec*dD*np.pi/180
+	ef = efth.sum(dim='dirs')
+	b1 = ((np.sin(theta)*efth).sum(dim='dirs'))/ef
+	a1 = ((np.cos(theta)*efth).sum(dim='dirs'))/ef
+	thetam = np.arctan2(b1,a1)
+	m1 = np.sqrt(b1**2+a1**2)
+	spr = np.sqrt(2-2*(m1)).values*180/np.pi
+	mdir = np.mod(thetam.values*180/np.pi, 360)
+	return ef.values, mdir, spr
+
+class BoundaryToSpectraIntegration(unittest.TestCase):
+	def test_same_as_xarray_integration(self):
+		boundary = create_boundary()
+		inds = [0, 2, 5]
+		start_time, end_time = '2020-01-01T03:00', '2020-01-02T00:00'
+		ef, mdir, spr = reference_integration(boundary, start_time, end_time, inds)
+		for chunk_size, max_workers in [(None, 1), (2, 1), (3, 2)]:
+			time, freq, spec, new_mdir, new_spr, lon, lat, source = BoundaryToSpectra(boundary, chunk_size=chunk_size, max_workers=max_workers)(start_time, end_time, inds)
+			self.assertEqual(len(time), 8)
+			self.assertIsNone(np.testing.assert_almost_equal(spec, ef))
+			self.assertIsNone(np.testing.assert_almost_equal(new_mdir, mdir))
+			self.assertIsNone(np.testing.assert_almost_equal(new_spr, spr))
+
+	def test_nan_bin_and_float32(self):
+		boundary = create_boundary()
+		boundary.data['spec'] = boundary.data.spec.astype('float32')
+		boundary.data.spec[2, 1, 3, 4] = np.nan
+		inds = [0, 1, 2]
+		start_time, end_time = '2020-01-01T00:00', '2020-01-02T00:00'
+		ef, mdir, spr = reference_integration(boundary, start_time, end_time, inds)
+		time, freq, spec, new_mdir, new_spr, lon, lat, source = BoundaryToSpectra(boundary, chunk_size=2)(start_time, end_time, inds)
+		self.assertEqual(spec.dtype, np.float32)
+		self.assertEqual(new_mdir.dtype, np.float32)
+		self.assertFalse(np.any(np.isnan(spec)))
+		self.assertIsNone(np.testing.assert_allclose(spec, ef, rtol=1e-5))
+		self.assertIsNone(np.testing.assert_allclose(new_mdir, mdir, rtol=1e-4, atol=1e-3))
+		self.assertIsNone(np.testing.assert_allclose(new_spr, spr, rtol=1e-4, atol=1e-3))
+
+if __name__ == '__main__':
+	unittest.main()
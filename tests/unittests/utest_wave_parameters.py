@@ -0,0 +1,104 @@
+import unittest
+import sys
+sys.path.insert(0, "../../")
+import numpy as np
+import xarray as xr
+from dnora import wave_parameters as wp
+from dnora.wave_series import WaveSeries
+
+def create_boundary_dataset():
+	rng = np.random.default_rng(1)
+	freq = np.geomspace(0.04, 0.5, 20)
+	dirs = np.arange(0, 360, 15.)
+	return xr.Dataset({'spec': (['time','x','freq','dirs'], rng.random((5,3,20,24)))},
+				coords=dict(time=np.arange(5), x=np.arange(3), lon=('x', [1.,2.,3.]), lat=('x', [4.,5.,6.]), freq=freq, dirs=dirs),
+				attrs=dict(name='TestBoundary', source='test'))
+
+def create_spectra_dataset():
+	rng = np.random.default_rng(2)
+	freq = np.geomspace(0.04, 0.5, 20)
+	return xr.Dataset({'spec': (['time','x','freq'], rng.random((5,3,20))),
+				'mdir': (['time','x','freq'], rng.random((5,3,20))*360),
+				'spr': (['time','x','freq'], rng.random((5,3,20))*30)},
+				coords=dict(time=np.arange(5), x=np.arange(3), lon=('x', [1.,2.,3.]), lat=('x', [4.,5.,6.]), freq=freq),
+				attrs=dict(name='TestSpectra', source='test'))
+
+def reference_moment(spec, n):
+	moment = spec.spec
+	if 'dirs' in list(spec.coords):
+		moment = 360/len(spec.dirs)*np.pi/180*moment.sum(dim='dirs')
+	return (moment*(moment.freq**n)).integrate(coord='freq').values
+
+def reference_parameters(spec):
+	"""Wave parameters calculated directly from the spectra with xarray."""
+	m_1, m0, m1, m2 = [reference_moment(spec, n) for n in [-1, 0, 1, 2]]
+	if 'dirs' in list(spec.coords):
+		theta = np.deg2rad(spec.dirs)
+		efth = 360/len(spec.dirs)*np.pi/180*spec.spec
+		a1 = (np.cos(theta)*efth).sum(dim='dirs').integrate(coord='freq').values/m0
+		b1 = (np.sin(theta)*efth).sum(dim='dirs').integrate(coord='freq').values/m0
+		sprm = np.sqrt(2-2*np.sqrt(a1**2 + b1**2))*180/np.pi
+	else:
+		theta = np.deg2rad(spec.mdir)
+		a1 = (np.cos(theta)*spec.spec).integrate(coord='freq').values/m0
+		b1 = (np.sin(theta)*spec.spec).integrate(coord='freq').values/m0
+		sprm = ((spec.spr**2*spec.spec).integrate(coord='freq').values/m0)**0.5
+
+	return {'hs': 4*m0**0.5, 'tm01': m0/m1, 'tm_10': m_1/m0, 'tm02': (m0/m2)**0.5,
+			'fm': m1/m0, 'wm': 2*np.pi*m1/m0, 'dirm': np.mod(np.rad2deg(np.arctan2(b1, a1)), 360), 'sprm': sprm}
+
+class SpectralMoments(unittest.TestCase):
+	def test_moments(self):
+		for spec in [create_boundary_dataset(), create_spectra_dataset()]:
+			moments = wp.spectral_moments(spec, [-1, 0, 1, 2])
+			for n in [-1, 0, 1, 2]:
+				self.assertIsNone(np.testing.assert_almost_equal(moments[wp.Moment(n).name()].values, reference_moment(spec, n)))
+
+	def test_directional_moments(self):
+		spec = create_boundary_dataset()
+		moments = wp.spectral_moments(spec, [0], directional=True)
+		theta = np.deg2rad(spec.dirs)
+		efth = 360/len(spec.dirs)*np.pi/180*spec.spec
+		a1 = (np.cos(theta)*efth).sum(dim='dirs').integrate(coord='freq').values
+		b1 = (np.sin(theta)*efth).sum(dim='dirs').integrate(coord='freq').values
+		self.assertIsNone(np.testing.assert_almost_equal(moments.a1.values, a1))
+		self.assertIsNone(np.testing.assert_almost_equal(moments.b1.values, b1))
+
+	def test_nan_skipped_over_directions(self):
+		spec = create_boundary_dataset()
+		spec.spec[1, 2, 5, 3] = np.nan
+		moments = wp.spectral_moments(spec, [0, 1])
+		self.assertFalse(np.any(np.isnan(moments.m0.values)))
+		for n in [0, 1]:
+			self.assertIsNone(np.testing.assert_almost_equal(moments[wp.Moment(n).name()].values, reference_moment(spec, n)))
+
+	def test_lazy_spectra(self):
+		spec = create_boundary_dataset()
+		moments = wp.spectral_moments(spec.chunk({'time': 2}), [0, 2], directional=True)
+		self.assertIsNotNone(moments.m0.chunks)
+		reference = wp.spectral_moments(spec, [0, 2], directional=True)
+		for name in reference.data_vars:
+			self.assertIsNone(np.testing.assert_almost_equal(moments[name].values, reference[name].values))
+
+class WaveParameters(unittest.TestCase):
+	def test_hs_and_tm01(self):
+		spec = create_boundary_dataset()
+		m0, m1 = reference_moment(spec, 0), reference_moment(spec, 1)
+		self.assertIsNone(np.testing.assert_almost_equal(wp.Hs()(spec).hs.values, 4*m0**0.5))
+		self.assertIsNone(np.testing.assert_almost_equal(wp.Tm01()(spec).tm01.values, m0/m1))
+		self.assertEqual(wp.Hs()(spec).hs.attrs['unit'], 'm')
+
+	def test_chunked_same_as_individual(self):
+		parameters = [wp.Hs(), wp.Tm01(), wp.Tm_10(), wp.Tm02(), wp.Fm(), wp.Wm(), wp.Dirm(), wp.Sprm()]
+		for spec in [create_boundary_dataset(), create_spectra_dataset()]:
+			reference = reference_parameters(spec)
+			individual = xr.merge([p(spec) for p in parameters])
+			series = WaveSeries()
+			series.from_spectra(spec, parameters, chunk_size=2)
+			self.assertEqual(set(series.parameters()), set(reference.keys()))
+			for name in series.parameters():
+				self.assertIsNone(np.testing.assert_almost_equal(series(name), reference[name]))
+				self.assertIsNone(np.testing.assert_almost_equal(individual[name].values, reference[name]))
+
+if __name__ == '__main__':
+	unittest.main()
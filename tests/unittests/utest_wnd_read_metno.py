@@ -0,0 +1,90 @@
+import unittest
+import sys
+sys.path.insert(0, "../../")
+from dnora.wnd.read_metno import NORA3, run_fimex_commands
+from dnora.grd import Grid
+import numpy as np
+import pandas as pd
+import tempfile
+import os
+import stat
+
+# Stand-in for fimex: writes wind speed equal to the hour of the requested
+# start time. Fails the first time it is called for a file if the file name
+# contains 'flaky', and always fails if it contains 'broken' or a file
+# fail_HH exists for the hour HH of the start time.
+FIMEX_STUB = f"""#!{sys.executable}
+import sys, os
+import numpy as np
+import pandas as pd
+import xarray as xr
+args = dict(a.split('=', 1) for a in sys.argv[1:] if '=' in a)
+output_file = args['--output.file']
+time = pd.to_datetime([args['--extract.reduceTime.start']])
+if 'broken' in output_file or os.path.exists(f'fail_{{time[0].hour:02.0f}}'):
+    sys.exit(1)
+if 'flaky' in output_file and not os.path.exists(output_file + '.tried'):
+    open(output_file + '.tried', 'w').close()
+    sys.exit(1)
+x = np.linspace(4, 6, 5)
+y = np.linspace(59, 61, 4)
+ds = xr.Dataset(
+    data_vars=dict(
+        wind_speed=(['time', 'y', 'x'], np.full((1, 4, 5), float(time[0].hour))),
+        wind_direction=(['time', 'y', 'x'], np.full((1, 4, 5), 270.)),
+    ),
+    coords=dict(time=time, x=x, y=y),
+)
+ds.to_netcdf(output_file)
+"""
+
+class FimexStub(unittest.TestCase):
+	def setUp(self):
+		self.cwd = os.getcwd()
+		self.folder = tempfile.TemporaryDirectory()
+		os.chdir(self.folder.name)
+		self.fimex = os.path.join(self.folder.name, 'fimex_stub')
+		with open(self.fimex, 'w') as f:
+			f.write(FIMEX_STUB)
+		os.chmod(self.fimex, os.stat(self.fimex).st_mode | stat.S_IEXEC)
+
+	def tearDown(self):
+		os.chdir(self.cwd)
+		self.folder.cleanup()
+
+	def command(self, output_file, hour=0):
+		return [self.fimex, f'--extract.reduceTime.start=2020-01-01T{hour:02.0f}:00:00', f'--output.file={output_file}']
+
+	def test_retry(self):
+		run_fimex_commands([self.command('flaky.nc')], ['flaky.nc'], retries=1)
+		self.assertTrue(os.path.exists('flaky.nc'))
+
+	def test_report_failed(self):
+		files = ['ok.nc', 'broken.nc']
+		with self.assertRaises(RuntimeError):
+			run_fimex_commands([self.command(f) for f in files], files, max_workers=2, retries=1)
+		self.assertTrue(os.path.exists('ok.nc'))
+
+	def test_nora3_in_order(self):
+		grid = Grid(lon=(4.5,5.5), lat=(59.5,60.5))
+		for max_workers in [1, 4]:
+			reader = NORA3(lead_time=0, max_workers=max_workers, fimex=self.fimex)
+			wind_forcing = reader(grid, '2020-01-01 00:00', '2020-01-01 03:00', expansion_factor=1.2)
+
+			times = pd.to_datetime(wind_forcing.time.values)
+			self.assertEqual(list(times.hour), list(range(4)))
+			# Wind from west, so u positive and equal to the hour
+			self.assertIsNone(np.testing.assert_almost_equal(wind_forcing.u.values[:,0,0], np.arange(4)))
+			self.assertIsNone(np.testing.assert_almost_equal(wind_forcing.v.values, 0))
+			self.assertEqual(os.listdir('dnora_wnd_temp'), [])
+
+	def test_temporary_files_removed_on_failure(self):
+		grid = Grid(lon=(4.5,5.5), lat=(59.5,60.5))
+		open('fail_02', 'w').close()
+		reader = NORA3(lead_time=0, max_workers=2, retries=0, fimex=self.fimex)
+		with self.assertRaises(RuntimeError):
+			reader(grid, '2020-01-01 00:00', '2020-01-01 03:00', expansion_factor=1.2)
+		self.assertEqual(os.listdir('dnora_wnd_temp'), [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "../../")
+from dnora.grd import Grid
+from dnora.wnd.read_metno import MEPS, read_and_regrid
+from dnora.wnd.regrid import Projection, WindRegridder, bilinear_weights, regular_axis
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.interpolate import RegularGridInterpolator
+
+LAMBERT = {'grid_mapping_name': 'lambert_conformal_conic', 'standard_parallel': [63.3, 63.3],
+		'longitude_of_central_meridian': 15., 'latitude_of_projection_origin': 63.3, 'earth_radius': 6371000.}
+
+def create_lambert_dataset(time):
+	"""Uniform eastward wind of 10 m/s given in components relative to the grid."""
+	projection = Projection(LAMBERT)
+	x0, y0 = projection.forward(5., 60.)
+	x = x0 + np.arange(-20, 21)*2500.
+	y = y0 + np.arange(-20, 21)*2500.
+	xx, yy = np.meshgrid(x, y)
+	# Tangent cone: the grid is rotated by n*(lon-lon0) with respect to north
+	n = np.sin(np.deg2rad(63.3))
+	rho0 = projection.radius*np.cos(np.deg2rad(63.3))/n
+	angle = -np.arctan2(xx, rho0 - yy)
+	x_wind = np.broadcast_to(10*np.cos(angle), (len(time),) + xx.shape)
+	y_wind = np.broadcast_to(-10*np.sin(angle), (len(time),) + xx.shape)
+	return xr.Dataset({'x_wind_10m': (['time', 'height7', 'y', 'x'], x_wind[:, None], {'grid_mapping': 'projection_lambert'}),
+					'y_wind_10m': (['time', 'height7', 'y', 'x'], y_wind[:, None], {'grid_mapping': 'projection_lambert'}),
+					'projection_lambert': ([], 0, LAMBERT)},
+					coords={'time': time, 'height7': [10.], 'y': y, 'x': x})
+
+class BilinearWeights(unittest.TestCase):
+	def test_same_as_regular_grid_interpolator(self):
+		x = np.linspace(0, 10, 11)
+		y = np.linspace(5, -5, 21)
+		np.random.seed(3)
+		field = np.random.random((len(y), len(x)))
+		tx, ty = np.random.uniform(0, 10, 50), np.random.uniform(-5, 5, 50)
+		weights, outside = bilinear_weights(x, y, tx, ty)
+		self.assertFalse(outside.any())
+		reference = RegularGridInterpolator((y[::-1], x), field[::-1])(np.stack([ty, tx], axis=1))
+		self.assertIsNone(np.testing.assert_almost_equal(weights @ field.ravel(), reference))
+
+	def test_points_outside(self):
+		weights, outside = bilinear_weights(np.arange(3.), np.arange(3.), np.array([1., 3.]), np.array([1., 1.]))
+		self.assertIsNone(np.testing.assert_array_equal(outside, [False, True]))
+		self.assertEqual(weights[1].nnz, 0)
+
+class Projections(unittest.TestCase):
+	def test_lambert_north_angle(self):
+		projection = Projection(LAMBERT)
+		self.assertIsNone(np.testing.assert_almost_equal(projection.forward(15., 63.3), (0., 0.)))
+		angle = projection.north_angle(np.array([25.]), np.array([60.]))
+		self.assertIsNone(np.testing.assert_almost_equal(angle, -np.sin(np.deg2rad(63.3))*np.deg2rad(10.)))
+
+	def test_rotated_pole_origin(self):
+		projection = Projection({'grid_mapping_name': 'rotated_latitude_longitude', 'grid_north_pole_longitude': -162., 'grid_north_pole_latitude': 39.25})
+		self.assertIsNone(np.testing.assert_almost_equal(projection.forward(18., 50.75), (0., 0.)))
+		self.assertIsNone(np.testing.assert_almost_equal(projection.forward(18., 51.75), (0., 1.)))
+
+class NativeRegridding(unittest.TestCase):
+	def test_linear_field_is_exact(self):
+		lon, lat = np.linspace(4, 8, 9), np.linspace(59, 61, 5)
+		x, y = np.linspace(0, 10, 21), np.linspace(55, 65, 41)
+		regridder = WindRegridder.from_grids(Projection(), x, y, lon, lat)
+		self.assertEqual(regridder.window[1], slice(8, 17))
+		xx, yy = np.meshgrid(x[regridder.window[1]], y[regridder.window[0]])
+		u, v = regridder(np.stack([xx, 2*xx]), np.stack([yy, -yy]))
+		self.assertEqual(u.shape, (2, 5, 9))
+		self.assertIsNone(np.testing.assert_almost_equal(u[1], 2*lon[None, :].repeat(5, axis=0)))
+		self.assertIsNone(np.testing.assert_almost_equal(v[0], lat[:, None].repeat(9, axis=1)))
+
+	def test_rotation_and_cache(self):
+		time = pd.date_range('2020-01-01T00:00', '2020-01-01T05:00', freq='1H')
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filename = f'{tmpdir}/meps.nc'
+			create_lambert_dataset(time).to_netcdf(filename)
+			lon, lat = regular_axis(4.9, 0.02, 5.1), regular_axis(59.95, 0.01, 60.05)
+			for __ in range(2):
+				wind = read_and_regrid([filename, filename], [time[0], time[3]], [time[2], time[5]], ['x_wind_10m', 'y_wind_10m'],
+									lon, lat, components=lambda data: (data['x_wind_10m'], data['y_wind_10m']),
+									rotate=True, cache_folder=tmpdir)
+				self.assertEqual(len([f for f in os.listdir(tmpdir) if f.endswith('.npz')]), 1)
+				self.assertIsNone(np.testing.assert_array_equal(wind.time.values, time.values))
+				self.assertIsNone(np.testing.assert_almost_equal(wind.u.values, 10, decimal=2))
+				self.assertIsNone(np.testing.assert_almost_equal(wind.v.values, 0, decimal=2))
+
+class MEPSNative(unittest.TestCase):
+	def test_reader_without_fimex(self):
+		time = pd.date_range('2020-01-01T00:00', '2020-01-01T12:00', freq='1H')
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filename = f'{tmpdir}/meps.nc'
+			create_lambert_dataset(time).to_netcdf(filename)
+
+			class LocalMEPS(MEPS):
+				def get_url(self, time_stamp, prefix):
+					return filename
+
+			grid = Grid(lon=(4.95, 5.05), lat=(59.97, 60.03))
+			reader = LocalMEPS(regrid='native', weights_cache=False)
+			wind = reader(grid, '2020-01-01T00:00', '2020-01-01T06:00', expansion_factor=1.2)
+			self.assertEqual(len(wind.time), 7)
+			self.assertIsNone(np.testing.assert_almost_equal(wind.u.values, 10, decimal=2))
+			self.assertIsNone(np.testing.assert_almost_equal(wind.v.values, 0, decimal=2))
+
+	def test_unknown_option(self):
+		with self.assertRaises(ValueError):
+			MEPS(regrid='nearest')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import tempfile
+sys.path.insert(0, "../../")
+from dnora.wnd import Forcing
+from dnora.wnd.write import SWAN
+from dnora.grd import Grid
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+def reference_swan_wind(forcing, filename):
+	"""Original time step by time step writing of the SWAN wind file."""
+	with open(filename, 'w') as file_out:
+		ct = 0
+		for day in forcing.days():
+			times = forcing.times_in_day(day)
+			for n in range(len(times)):
+				time_stamp = pd.to_datetime(times[n]).strftime('%Y%m%d.%H%M%S')+'\n'
+				file_out.write(time_stamp)
+				np.savetxt(file_out, forcing.u()[ct, :, :]*1000, fmt='%i')
+				file_out.write(time_stamp)
+				np.savetxt(file_out, forcing.v()[ct, :, :]*1000, fmt='%i')
+				ct += 1
+
+def create_forcing(ny=4, nx=6):
+	grid = Grid(lon=(5,6), lat=(60,61))
+	forcing = Forcing(grid)
+	forcing.start_time = '2020-01-01T00:00'
+	forcing.end_time = '2020-01-03T23:00'
+	time = pd.date_range(forcing.start_time, forcing.end_time, freq='1H')
+	np.random.seed(5)
+	u = np.random.normal(0, 10, (len(time), ny, nx))
+	v = np.random.normal(0, 10, (len(time), ny, nx))
+	forcing.data = xr.Dataset(
+		data_vars=dict(u=(['time', 'lat', 'lon'], u), v=(['time', 'lat', 'lon'], v)),
+		coords=dict(time=time, lat=np.linspace(60,61,ny), lon=np.linspace(5,6,nx)))
+	return forcing
+
+class SWANForcingWriter(unittest.TestCase):
+	def check_identical(self, forcing, writer):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			filename = os.path.join(tmpdir, 'wind.asc')
+			writer(forcing, filename)
+			reference_file = os.path.join(tmpdir, 'reference.asc')
+			reference_swan_wind(forcing, reference_file)
+			with open(filename, 'r') as f:
+				written = f.read()
+			with open(reference_file, 'r') as f:
+				reference = f.read()
+
+		self.assertEqual(written, reference)
+
+	def test_identical_to_time_step_loop(self):
+		self.check_identical(create_forcing(), SWAN())
+
+	def test_single_row(self):
+		self.check_identical(create_forcing(ny=1, nx=5), SWAN())
+
+	def test_parallel_days(self):
+		self.check_identical(create_forcing(), SWAN(max_workers=2))
+
+if __name__ == '__main__':
+	unittest.main()